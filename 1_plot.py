@@ -3,6 +3,7 @@
 #  2025/01/06 改訂
 #  2025/01/08 再改訂
 #  2025/02/02 再々改訂（波形プロット部削除）
+#  2026/10/18 改訂（処理本体を eeg_pipeline/stages.py に移動, 図の使い回しと並列描画に対応）
 #
 #  --1000Hz, エラーありセッション--
 #  【1_epoch.pyの後に実行すること】
@@ -12,90 +13,41 @@
 # TTL線の表示はオプションで切り替え可能。
 #
 # 【処理内容】
-# 1. 統合CSV（"epoch_summary" ディレクトリ内）を読み込む
+# 1. エポックデータ（"epoch_summary/epochs.npy", なければ統合CSV）を読み込む
 # 2. 各電極ごとにオリジナル波形（-1000ms～2000ms）をプロット
 # 3. 各電極ごとにズームイン波形（-400ms～1000ms）をプロット
-# 4. プロット画像をPNG形式で保存
+# 4. プロット画像をPNG形式で保存（図は1回だけ作成し、電極・エポック範囲ごとに並列に描画）
 #
 # 【出力先】
 # - "calc/plots/{電極名}/" にPNGファイルとして保存
 #   - オリジナル波形: "epoch_{エポック番号}_original.png"
 #   - ズームイン波形: "epoch_{エポック番号}_zoomed.png"
+#   - 一覧表示（MODE が "epochs" 以外の場合）: "erp_image.png"（ERPイメージ）, "grid.png"（格子表示）
 #######################################################################################################
 
+from eeg_pipeline.dialogs import select_directory
+from eeg_pipeline.stages import run_epoch_plot
 
-
-import pandas as pd
-import matplotlib.pyplot as plt
-import os
-from tkinter import Tk
-from tkinter.filedialog import askdirectory
+# コマンドラインから実行する場合: python -m eeg_pipeline plot --root ROOT --target epochs
 
 # TTL線の表示設定
 SHOW_TTL = False  # TrueにするとTTL線が表示される
 
-# GUIを使ったディレクトリ選択関数
-def select_directory(prompt):
-    print(prompt)
-    Tk().withdraw()
-    return askdirectory(title=prompt)
-
-# 解析のルートディレクトリをユーザーに選択させる
-root_dir = select_directory("解析のルートディレクトリを選択してください")
-calc_dir = os.path.join(root_dir, "calc")
-summary_output_dir = os.path.join(calc_dir, "epoch_summary")
-
-# 電極リスト
-electrodes = ["F3", "Fz", "F4", "FCz", "Cz"]
-
-# 各電極の統合データを読み込み、波形プロットを作成
-for electrode in electrodes:
-    summary_csv_path = os.path.join(summary_output_dir, f"{electrode}_epoch_summary.csv")
-
-    if os.path.exists(summary_csv_path):
-        data = pd.read_csv(summary_csv_path)
-        time = data["TIME"]
-
-        # 各エポックのプロット
-        for i in range(1, data.shape[1]):
-            # オリジナルプロット
-            plt.figure(figsize=(10, 6))
-            plt.plot(time, data.iloc[:, i])
-            if SHOW_TTL:
-                plt.axvline(0, color='brown', linestyle='--')
-            plt.axhline(0, color='black', linestyle='--', linewidth=0.8)
-            plt.axvline(0, color='black', linestyle='--', linewidth=0.8)
-            plt.xticks(ticks=[-1000, -500, 0, 500, 1000, 1500, 2000], labels=["-1", "-0.5", "0", "0.5", "1", "1.5", "2"], fontsize=16)
-            plt.yticks(fontsize=16)
-            plt.title(f'{electrode} Epoch {i}', fontsize=20)
-            plt.xlabel('Time [s]', fontsize=20)
-            plt.ylabel('Amplitude [μV]', fontsize=20)
-            plt.xlim(-1000, 2000)
-            plt.ylim(-16, 16)
+# 出力の設定
+# "epochs": エポックごとのPNG（従来どおり）, "erp_image": ERPイメージ（エポック × 時間のヒートマップ）,
+# "grid": 全エポックの波形の格子表示, "overview": ERPイメージと格子表示（いずれも電極ごとに1枚）
+MODE = "epochs"
+SORT_BY_LABEL = False  # Trueにすると一覧表示を Correct/Error の順に並べる（log/pkl_analysis/combined_data.csv）
 
-            plot_dir = os.path.join(calc_dir, "plots", electrode)
-            os.makedirs(plot_dir, exist_ok=True)
-            plt.savefig(os.path.join(plot_dir, f'epoch_{i}_original.png'), dpi=300)
-            plt.close()
+# 出力解像度の設定（下書き用は100程度, 発表用は300）
+DPI = 300
 
-            # ズームインプロット
-            plt.figure(figsize=(10, 6))
-            plt.plot(time, data.iloc[:, i])
-            if SHOW_TTL:
-                plt.axvline(0, color='brown', linestyle='--')
-            plt.axhline(0, color='black', linestyle='--', linewidth=0.8)
-            plt.axvline(0, color='black', linestyle='--', linewidth=0.8)
-            plt.xticks(ticks=[-400, -200, 0, 200, 400, 600, 800, 1000], fontsize=16)
-            plt.yticks(fontsize=16)
-            plt.title(f'{electrode} Epoch {i}', fontsize=20)
-            plt.xlabel('Time [ms]', fontsize=20)
-            plt.ylabel('Amplitude [μV]', fontsize=20)
-            plt.xlim(-400, 1000)  # ズームイン範囲
-            plt.ylim(-16, 16)
+# 並列に描画するプロセス数の設定（None: CPU数, 1: 逐次描画）
+WORKERS = None
 
-            plt.savefig(os.path.join(plot_dir, f'epoch_{i}_zoomed.png'), dpi=300)
-            plt.close()
+# 並列描画のワーカープロセスで再実行されないように、メイン処理は __main__ の場合のみ実行する
+if __name__ == "__main__":
+    # 解析のルートディレクトリをユーザーに選択させる
+    root_dir = select_directory("解析のルートディレクトリを選択してください")
 
-        print(f"{electrode} のプロットを保存しました。")
-    else:
-        print(f"{summary_csv_path} が見つかりませんでした。")
+    run_epoch_plot(root_dir, show_ttl=SHOW_TTL, workers=WORKERS, dpi=DPI, mode=MODE, sort_by_label=SORT_BY_LABEL)
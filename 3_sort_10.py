@@ -1,86 +1,39 @@
 #############################################################################################
 #  2024/12/23 作成
 #  2025/01/15 改訂
+#  2026/10/18 改訂（処理本体を eeg_pipeline/stages.py に移動, コマンドライン実行に対応）
 #
 #  --1024Hz, エラーありセッション用--
 # 【2_baseline.pyの後に実行すること】
 #
 # 【概要】Correct試行とError試行の分類
-# エポックデータをError試行とCorrect試行に分類し、それぞれのデータを"calc/error"と"calc/correct"に保存する。
+# ベースライン補正後のエポックデータ（calc/baseline/epochs_base.npy）をError試行とCorrect試行に分類する。
+# エポックデータはコピーせず、エポックごとのラベルの索引（calc/labels/epoch_labels.npy）のみを保存し、
+# 4_colave.py などの後段は索引で選んだ試行をエポックデータから直接参照する。
 #
 # 【処理内容】
-# 1. "baseline"ディレクトリ内の各電極のエポックデータを読み込み
+# 1. "calc/baseline"のエポックデータ（epochs_base.npy）のエポック番号を読み込み
 # 2. "log/pkl_analysis/combined_data.csv"の「ErrP」ラベル（0: Correct, 1: Error）に基づいて分類
-# 3. 分類結果を"calc/error"および"calc/correct"に保存（ファイル名: "{電極名}_error.csv", "{電極名}_correct.csv"）
+# 3. エポックデータの並びに沿ったラベル番号（Correct: 0, Error: 1, 分類なし: -1）を"calc/labels"に保存
+#    （以前のバージョンが保存した"calc/correct", "calc/error"のエポックデータのコピーは削除する）
 #
 # 【出力先】
-# - Error試行: "calc/error"
-# - Correct試行: "calc/correct"
+# - ラベルの索引: "calc/labels/epoch_labels.npy", "calc/labels/epoch_labels.json"
+# - WRITE_CSV = True の場合のみ、従来形式のCSVを"calc/error", "calc/correct"に出力（ファイル名: "{電極名}_error.csv", "{電極名}_correct.csv"）
 #
 # 【事前準備】
 # - "log/pkl_analysis/combined_data.csv"をpkl_analysis.pyで作成しておくこと
 #############################################################################################
 
-import pandas as pd
-import os
-from tkinter.filedialog import askdirectory
+from eeg_pipeline.dialogs import select_directory
+from eeg_pipeline.stages import run_sort
 
-# GUIで解析のルートディレクトリを選択
-root_dir = askdirectory(title="解析のルートディレクトリを選択してください")
+# コマンドラインから実行する場合: python -m eeg_pipeline sort --root ROOT --fs 1024
 
-# ベースライン補正後のエポックデータのディレクトリ設定
-epoch_dir = os.path.join(root_dir, "calc", "baseline")
+# 従来形式のCSV出力の設定
+WRITE_CSV = False  # Trueにすると電極ごとのCSVも出力される
 
-# 出力先ディレクトリの設定
-output_error_dir = os.path.join(root_dir, "calc", "error")
-output_correct_dir = os.path.join(root_dir, "calc", "correct")
-os.makedirs(output_error_dir, exist_ok=True)
-os.makedirs(output_correct_dir, exist_ok=True)
+# 解析のルートディレクトリをユーザーに選択させる
+root_dir = select_directory("解析のルートディレクトリを選択してください")
 
-# 電極リスト
-electrodes = ["Cz", "F3", "F4", "FCz", "Fz"]
-
-# ラベル情報の読み込み
-combined_data_path = os.path.join(root_dir, "log", "pkl_analysis", "combined_data.csv")
-
-# ファイル存在チェック
-if not os.path.isfile(combined_data_path):
-    raise FileNotFoundError(f"combined_data.csv が見つかりません: {combined_data_path}")
-
-combined_df = pd.read_csv(combined_data_path)
-
-# Correct試行とError試行のエポックを分類
-correct_epochs = combined_df[combined_df["ErrP"] == 0]["Epoch"].astype(int).astype(str).tolist()
-error_epochs = combined_df[combined_df["ErrP"] == 1]["Epoch"].astype(int).astype(str).tolist()
-
-# 各電極のエポックデータを分類して保存
-for electrode in electrodes:
-    try:
-        # エポックデータの読み込み
-        electrode_file = os.path.join(epoch_dir, f"{electrode}_epoch_base.csv")
-        if not os.path.isfile(electrode_file):
-            print(f"{electrode} のエポックデータが見つかりません: {electrode_file}")
-            continue
-
-        electrode_data = pd.read_csv(electrode_file, index_col=0)
-
-        # 存在するエポック番号のみ抽出
-        valid_correct_epochs = [f"Epoch {epoch}" for epoch in correct_epochs if f"Epoch {epoch}" in electrode_data.columns]
-        valid_error_epochs = [f"Epoch {epoch}" for epoch in error_epochs if f"Epoch {epoch}" in electrode_data.columns]
-
-        # Correct試行データの抽出と保存
-        correct_data = electrode_data.loc[:, valid_correct_epochs]
-        correct_file = os.path.join(output_correct_dir, f"{electrode}_correct.csv")
-        correct_data.to_csv(correct_file, index=True, encoding='utf-8-sig')
-        print(f"{electrode} の Correct試行データを保存しました: {correct_file}")
-
-        # Error試行データの抽出と保存
-        error_data = electrode_data.loc[:, valid_error_epochs]
-        error_file = os.path.join(output_error_dir, f"{electrode}_error.csv")
-        error_data.to_csv(error_file, index=True, encoding='utf-8-sig')
-        print(f"{electrode} の Error試行データを保存しました: {error_file}")
-
-    except Exception as e:
-        print(f"{electrode} のデータ処理中にエラーが発生しました: {e}")
-
-print("すべてのエポックデータを分類して保存しました。")
+run_sort(root_dir, sfreq=1024, write_csv=WRITE_CSV)
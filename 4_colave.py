@@ -1,6 +1,7 @@
 #############################################################################################
 #  2024/12/23 作成
 #  2025/01/06 改訂
+#  2026/10/18 改訂（処理本体を eeg_pipeline/stages.py に移動, コマンドライン実行に対応）
 #
 # --Errorありなし共通, サンプリング周波数共通--
 # 【3_sort_err.pyの後に実行すること】
@@ -10,79 +11,32 @@
 # 加算平均の結果は "calc/ave" に保存し、Error試行とCorrect試行の差分波形は "calc/comp" に保存する。
 #
 # 【処理内容】
-# 1. "correct" および "error" ディレクトリ内のデータ（CSV形式）を読み込む
+# 1. 3_sort*.py のラベルの索引（calc/labels）で Correct/Error 試行を選び、calc/baseline のエポックデータを参照する
+#    （索引がない場合は "correct" および "error" ディレクトリ内のデータ（epochs_*.npy, なければCSV形式）を読み込む）
 # 2. 各電極ごとにCorrect試行とError試行の加算平均を計算し、"calc/ave" に保存
 # 3. Error試行とCorrect試行の加算平均の差分波形を "calc/comp/{電極名}/" に保存
+#    （各条件の標準偏差・標準誤差・95%信頼区間と、差分波形の標準誤差・95%信頼区間も出力）
 #
 # 【出力先】
 # - 加算平均: "calc/ave" （例: "{電極名}_correct_ave.csv", "{電極名}_error_ave.csv"）
+# - 試行数・平均・偏差平方和: "calc/ave" （"correct_accumulator.npy/.json", "error_accumulator.npy/.json"）
 # - 比較用CSV: "calc/comp/{電極名}/" （例: "{電極名}_comp.csv"）
 #
+# 【注意】
+# - UPDATE = True の場合は、前回の結果（*_accumulator）に含まれていないエポックのみを追加する
+#   （試行を追加した場合に全エポックを読み直さない）
+#
 #############################################################################################
 
-import pandas as pd
-import os
-from tkinter import Tk
-from tkinter.filedialog import askdirectory
-
-# GUIで解析のルートディレクトリを選択
-Tk().withdraw()
-root_dir = askdirectory(title="解析のルートディレクトリを選択してください")
-
-# CorrectデータとErrorデータのディレクトリ設定
-correct_dir = os.path.join(root_dir, "calc", "correct")
-error_dir = os.path.join(root_dir, "calc", "error")
-
-# 出力先ディレクトリ
-ave_output_dir = os.path.join(root_dir, "calc", "ave")
-comp_output_dir = os.path.join(root_dir, "calc", "comp")
-os.makedirs(ave_output_dir, exist_ok=True)
-os.makedirs(comp_output_dir, exist_ok=True)
-
-# 各電極の子ディレクトリ作成（比較用CSV用）
-electrodes = ["Cz", "F3", "F4", "FCz", "Fz"]
-for electrode in electrodes:
-    os.makedirs(os.path.join(comp_output_dir, electrode), exist_ok=True)
-
-# 加算平均の計算と保存
-def calculate_grand_average(input_dir, output_dir, label):
-    for file_name in os.listdir(input_dir):
-        if file_name.endswith(".csv"):
-            file_path = os.path.join(input_dir, file_name)
-            data = pd.read_csv(file_path, index_col=0)
-
-            grand_average = data.mean(axis=1)
-
-            electrode_name = file_name.split("_")[0]
-            output_file = os.path.join(output_dir, f"{electrode_name}_{label}_ave.csv")
-            grand_average.to_csv(output_file, header=["Amplitude [μV]"], index_label="Time [ms]", encoding='utf-8-sig')
-            print(f"{file_name} の加算平均を {output_file} に保存しました。")
-
-# Correct試行とError試行の加算平均を計算
-calculate_grand_average(correct_dir, ave_output_dir, "correct")
-calculate_grand_average(error_dir, ave_output_dir, "error")
-
-# 比較用CSV作成
-for electrode in electrodes:
-    correct_file = os.path.join(correct_dir, f"{electrode}_correct.csv")
-    error_file = os.path.join(error_dir, f"{electrode}_error.csv")
-    if os.path.exists(correct_file) and os.path.exists(error_file):
-        correct_data = pd.read_csv(correct_file, index_col=0)
-        error_data = pd.read_csv(error_file, index_col=0)
+from eeg_pipeline.dialogs import select_directory
+from eeg_pipeline.stages import run_colave
 
-        diff_data = error_data.mean(axis=1) - correct_data.mean(axis=1)
+# コマンドラインから実行する場合: python -m eeg_pipeline colave --root ROOT [--update]
 
-        combined_data = pd.DataFrame({
-            "Time [ms]": correct_data.index,
-            "Error Average [μV]": error_data.mean(axis=1).values,
-            "Correct Average [μV]": correct_data.mean(axis=1).values,
-            "Difference [μV]": diff_data.values
-        })
+# 前回の結果に新しいエポックのみを追加する場合は True
+UPDATE = False
 
-        output_file = os.path.join(comp_output_dir, electrode, f"{electrode}_comp.csv")
-        combined_data.to_csv(output_file, index=False, encoding='utf-8-sig')
-        print(f"{electrode} の比較用CSVを保存しました: {output_file}")
-    else:
-        print(f"{electrode} のデータが見つかりませんでした。")
+# 解析のルートディレクトリをユーザーに選択させる
+root_dir = select_directory("解析のルートディレクトリを選択してください")
 
-print("全ての加算平均と比較CSVの作成が完了しました。")
+run_colave(root_dir, update=UPDATE)
@@ -0,0 +1,45 @@
+#############################################################################################
+#  2026/10/18 作成
+#
+# --Errorありなし共通, サンプリング周波数共通--
+# 【全被験者の4_colave.pyの後に実行すること】
+#
+# 【概要】複数被験者の総加算平均（グランドアベレージ）
+# 親ディレクトリ以下の各セッションの加算平均の結果を1人ずつ読み込み、Correct試行・Error試行・差分波形の
+# 総加算平均と被験者間の標準誤差を計算するスクリプト。全被験者のデータを同時にメモリに載せることはない。
+#
+# 【処理内容】
+# 1. 親ディレクトリ以下で "calc/ave" または "calc/comp" を持つディレクトリをセッションとして検出
+# 2. 各セッションの加算平均（*_accumulator, なければエポックデータまたは比較用CSV）を読み込む
+# 3. 被験者ごとに等しい重み（WEIGHTING = "subject"）または試行数に比例した重み（"trial"）で集計
+# 4. 総加算平均と被験者間の標準誤差・95%信頼区間を保存し、波形をプロット
+#
+# 【出力先】
+# - 総加算平均: "{親ディレクトリ}/group/calc/ave" （例: "{電極名}_difference_ave.csv"）
+# - 比較用CSV: "{親ディレクトリ}/group/calc/comp/{電極名}/" （例: "{電極名}_comp.csv"）
+# - 被験者の一覧: "{親ディレクトリ}/group/calc/group/subjects.csv"
+# - プロット: "{親ディレクトリ}/group/result"
+#
+# 【注意】
+# - UPDATE = True の場合は、前回の集計に含まれていないセッションのみを加える
+#############################################################################################
+
+import os
+
+from eeg_pipeline.dialogs import select_directory
+from eeg_pipeline.group import GROUP_DIR, run_group
+from eeg_pipeline.stages import run_result_plot
+
+# コマンドラインから実行する場合: python -m eeg_pipeline group --parent PARENT [--weighting trial] [--plot]
+
+# 集計の設定
+WEIGHTING = "subject"  # "subject": 被験者ごとに等しい重み, "trial": 試行数に比例した重み
+UPDATE = False  # Trueにすると前回の集計に新しいセッションのみを追加する
+CLEAN = False  # エラーなしセッション（Correct試行のみ）の場合は True
+
+# セッションをまとめた親ディレクトリをユーザーに選択させる
+parent_dir = select_directory("セッションをまとめた親ディレクトリを選択してください")
+
+accumulators = run_group(parent_dir, weighting=WEIGHTING, update=UPDATE, clean=CLEAN)
+if accumulators is not None:
+    run_result_plot(os.path.join(parent_dir, GROUP_DIR), clean=CLEAN)
@@ -0,0 +1,6 @@
+#######################################################################################################
+#  2026/10/18 作成
+#
+# 【概要】脳波解析パイプラインの共通モジュール群
+# 番号付きスクリプト（1_epoch.py など）から共通して利用する処理をまとめたパッケージ。
+#######################################################################################################
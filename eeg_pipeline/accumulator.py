@@ -0,0 +1,150 @@
+#######################################################################################################
+#  2026/10/18 作成
+#
+# 【概要】加算平均・分散の逐次計算（Welford法）
+# 電極 × 試行の種類ごとに、試行数・平均・偏差平方和（M2）を保持する。新しいエポックの追加や
+# セッション間の合成は、追加分のデータのみで計算できる（全データを読み直さない）。
+#
+# 【処理内容】
+# 1. Accumulator.update : (電極, エポック, サンプル) のエポックをまとめて追加する
+# 2. Accumulator.merge  : 別のセッションの Accumulator を合成する
+# 3. 平均, 標準偏差（SD）, 標準誤差（SEM）, 信頼区間を求める
+# 4. save_accumulator / load_accumulator: "{パス}.npy"（平均とM2）と "{パス}.json"（ヘッダ）で保存・読み込み
+#
+# 【注意】
+# - 信頼区間は t 分布を使う（scipy がない場合は正規分布で近似する）
+#######################################################################################################
+
+import json
+import os
+from statistics import NormalDist
+
+import numpy as np
+
+# 信頼区間の初期設定
+CONFIDENCE_LEVEL = 0.95
+
+
+# 試行数・平均・偏差平方和を保持し、エポックを逐次追加するクラス
+# keys: 追加済みのエポックの識別子（同じエポックを二重に追加しないための記録）
+class Accumulator:
+    def __init__(self, electrodes, times, count=0, mean=None, m2=None, keys=None, meta=None):
+        self.electrodes = list(electrodes)
+        self.times = np.asarray(times)
+        shape = (len(self.electrodes), len(self.times))
+        self.count = int(count)
+        self.mean = np.zeros(shape) if mean is None else np.asarray(mean, dtype=float)
+        self.m2 = np.zeros(shape) if m2 is None else np.asarray(m2, dtype=float)
+        self.keys = [str(key) for key in keys or []]
+        self.meta = dict(meta or {})
+
+    # EpochSet の全エポックから作成する（識別子はエポック番号）
+    @classmethod
+    def from_epochs(cls, epoch_set, keys=None):
+        accumulator = cls(epoch_set.electrodes, epoch_set.times)
+        return accumulator.update(epoch_set.data, epoch_set.epoch_ids if keys is None else keys)
+
+    # (電極, エポック, サンプル) のエポックを追加する
+    # 追加分の平均と偏差平方和をまとめて求めてから、これまでの値と合成する
+    def update(self, data, keys=None):
+        data = np.asarray(data, dtype=float)
+        if not data.shape[1]:
+            return self
+        batch_mean = data.mean(axis=1)
+        batch_m2 = ((data - batch_mean[:, None, :]) ** 2).sum(axis=1)
+        self.combine(data.shape[1], batch_mean, batch_m2)
+        if keys is not None:
+            self.keys.extend(str(key) for key in keys)
+        return self
+
+    # 別の Accumulator（別のセッションなど）を合成する
+    def merge(self, other):
+        if other.electrodes != self.electrodes or not np.array_equal(other.times, self.times):
+            raise ValueError("電極または時間軸が異なるため、合成できません。")
+        self.combine(other.count, other.mean, other.m2)
+        self.keys.extend(other.keys)
+        return self
+
+    # 試行数・平均・偏差平方和の組を合成する（Chan らの並列版 Welford 法）
+    def combine(self, count, mean, m2):
+        if not count:
+            return
+        if not self.count:
+            self.count, self.mean, self.m2 = count, np.array(mean, dtype=float), np.array(m2, dtype=float)
+            return
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean = self.mean + delta * (count / total)
+        self.m2 = self.m2 + m2 + delta ** 2 * (self.count * count / total)
+        self.count = total
+
+    # 不偏分散（試行数が2未満の場合は NaN）
+    @property
+    def variance(self):
+        if self.count < 2:
+            return np.full(self.mean.shape, np.nan)
+        return self.m2 / (self.count - 1)
+
+    @property
+    def sd(self):
+        return np.sqrt(self.variance)
+
+    @property
+    def sem(self):
+        return self.sd / np.sqrt(self.count) if self.count else np.full(self.mean.shape, np.nan)
+
+    # 平均の信頼区間（下限, 上限）
+    def confidence_interval(self, level=CONFIDENCE_LEVEL):
+        margin = t_quantile(level, self.count - 1) * self.sem
+        return self.mean - margin, self.mean + margin
+
+
+# 両側信頼区間に対応する t 分布の分位点を求める関数（df は配列も可）
+def t_quantile(level, df):
+    probability = (1 + level) / 2
+    try:
+        from scipy.stats import t
+    except ImportError:
+        return NormalDist().inv_cdf(probability)
+    return t.ppf(probability, np.maximum(df, 1))
+
+
+# 2条件の平均の差（a - b）の標準誤差と信頼区間（Welch の方法）
+# 戻り値: (標準誤差, 下限, 上限)
+def difference_interval(a, b, level=CONFIDENCE_LEVEL):
+    var_a, var_b = a.sem ** 2, b.sem ** 2
+    sem = np.sqrt(var_a + var_b)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        df = (var_a + var_b) ** 2 / (var_a ** 2 / (a.count - 1) + var_b ** 2 / (b.count - 1))
+    margin = t_quantile(level, np.nan_to_num(df, nan=1.0)) * sem
+    difference = a.mean - b.mean
+    return sem, difference - margin, difference + margin
+
+
+# Accumulator を保存する関数
+def save_accumulator(path, accumulator):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    header = {
+        "electrodes": accumulator.electrodes,
+        "times": accumulator.times.tolist(),
+        "count": accumulator.count,
+        "keys": accumulator.keys,
+        "meta": accumulator.meta,
+    }
+    np.save(path + ".npy", np.stack([accumulator.mean, accumulator.m2]))
+    with open(path + ".json", "w", encoding="utf-8") as f:
+        json.dump(header, f, ensure_ascii=False, indent=1)
+
+
+# Accumulator を読み込む関数
+def load_accumulator(path):
+    with open(path + ".json", encoding="utf-8") as f:
+        header = json.load(f)
+    mean, m2 = np.load(path + ".npy")
+    return Accumulator(header["electrodes"], header["times"], header["count"], mean, m2, header["keys"],
+                       header.get("meta"))
+
+
+# Accumulator の保存先がすでに存在するか確認する関数
+def has_accumulator(path):
+    return os.path.isfile(path + ".npy") and os.path.isfile(path + ".json")
@@ -0,0 +1,67 @@
+#######################################################################################################
+#  2026/10/18 作成
+#
+# 【概要】ベースライン補正エンジン
+# (電極, エポック, サンプル) の配列に対して、ベースライン区間の平均値をブロードキャストで一括減算する。
+#
+# 【処理内容】
+# - mode="electrode": 電極ごとに、全エポックのベースライン区間の平均値（従来の 2_baseline.py と同じ）
+# - mode="epoch"    : 電極・エポックごとに、そのエポックのベースライン区間の平均値
+# - window          : ベースライン区間 [開始, 終了) [ms]（初期設定は -1000ms〜0ms, 例: (-200, 0)）
+#
+# 【注意】
+# - inplace=True の場合は配列を直接書き換える（エポック切り出し直後の配列に使い、コピーを作らない）
+#######################################################################################################
+
+import numpy as np
+
+from eeg_pipeline.epoching import EPOCH_START
+
+# ベースライン補正の方法
+BASELINE_MODES = ("electrode", "epoch")
+
+# ベースライン区間の初期設定 [ms]
+BASELINE_WINDOW = (EPOCH_START, 0)
+
+
+# ベースライン値を計算する関数
+# 戻り値: mode="electrode" は (電極, 1, 1), mode="epoch" は (電極, エポック, 1) の配列（そのまま減算できる形）
+def compute_baseline(data, times, mode="electrode", window=BASELINE_WINDOW):
+    if mode not in BASELINE_MODES:
+        raise ValueError(f"ベースライン補正の方法は {BASELINE_MODES} のいずれかを指定してください: {mode}")
+    times = np.asarray(times)
+    mask = (times >= window[0]) & (times < window[1])
+    if not mask.any():
+        raise ValueError(f"ベースライン区間 {window[0]}〜{window[1]}ms にサンプルがありません。")
+
+    # ベースライン区間は連続しているため、スライスで参照する（コピーしない）
+    indices = np.flatnonzero(mask)
+    baseline_data = np.asarray(data)[:, :, indices[0]:indices[-1] + 1]
+    axis = (1, 2) if mode == "electrode" else 2
+    return baseline_data.mean(axis=axis, keepdims=True)
+
+
+# ベースライン補正を行う関数
+# 戻り値: 補正後の配列と、compute_baseline の戻り値
+def apply_baseline(data, times, mode="electrode", window=BASELINE_WINDOW, inplace=False):
+    values = compute_baseline(data, times, mode, window)
+    if inplace:
+        data -= values
+        return data, values
+    return data - values, values
+
+
+# ベースライン値の一覧表を作成する関数
+# mode="electrode": 列 Electrode, Baseline Value（従来の baseline_values.csv と同じ）
+# mode="epoch"    : 列 Electrode, Epoch, Baseline Value（電極・エポックごとに1行）
+def baseline_table(values, electrodes, epoch_ids=None, mode="electrode"):
+    import pandas as pd
+
+    values = np.asarray(values)
+    if mode == "electrode":
+        return pd.DataFrame({"Electrode": list(electrodes), "Baseline Value": values.reshape(len(electrodes))})
+    n_epochs = values.shape[1]
+    epoch_ids = np.arange(n_epochs) if epoch_ids is None else np.asarray(epoch_ids)
+    return pd.DataFrame({"Electrode": np.repeat(list(electrodes), n_epochs),
+                         "Epoch": np.tile(epoch_ids, len(electrodes)),
+                         "Baseline Value": values.reshape(-1)})
@@ -0,0 +1,113 @@
+#######################################################################################################
+#  2026/10/18 作成
+#
+# 【概要】複数セッションの並列一括処理
+# 親ディレクトリ以下のセッション（被験者・計測日ごとのルートディレクトリ）を探索し、
+# 各セッションについて エポック切り出し → ベースライン補正 → 分類 → 加算平均 → プロット を
+# プロセスプールで並列に実行する。
+#
+# 【処理内容】
+# 1. "log/pkl_analysis/combined_data.csv" を持つディレクトリをセッションとして検出
+# 2. セッション内の生データとICA処理済みデータをファイル名のパターンで特定
+# 3. 各セッションを別プロセスで実行（1セッションの失敗は他のセッションに影響しない）
+# 4. セッションごとの処理時間をまとめた表を表示し、CSVに保存
+#
+# 【出力先】
+# - 各セッションの実行ログ: "{セッション}/calc/batch_run.log"
+# - 処理時間の一覧: "{親ディレクトリ}/batch_summary.csv"
+#######################################################################################################
+
+import contextlib
+import glob
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from eeg_pipeline import stages
+
+# 生データとICA処理済みデータのファイル名パターンの初期設定
+RAW_PATTERN = "*raw*.csv"
+ICA_PATTERN = "*ICA*.csv"
+
+
+# パターンに一致するファイルを1つだけ探す関数（0_before_10.py の出力は除外）
+def find_single_file(session_dir, pattern):
+    matches = [f for f in sorted(glob.glob(os.path.join(session_dir, pattern))) if not f.endswith("_1ms.csv")]
+    if len(matches) != 1:
+        raise FileNotFoundError(f"{session_dir} に {pattern} に一致するファイルが {len(matches)} 個あります。")
+    return matches[0]
+
+
+# 親ディレクトリ以下のセッションを検出する関数
+def discover_sessions(parent_dir, clean=False):
+    sessions = []
+    for dir_path, dir_names, _ in os.walk(parent_dir):
+        if os.path.isfile(stages.label_file_path(dir_path, clean)):
+            sessions.append(dir_path)
+            dir_names.clear()  # セッション内部は探索しない
+        else:
+            dir_names.sort()
+    return sessions
+
+
+# 1セッション分の処理（別プロセスで実行）
+def run_session(session_dir, raw_pattern=RAW_PATTERN, ica_pattern=ICA_PATTERN, **options):
+    result = {"session": session_dir, "status": "ok", "error": "", "total [s]": 0.0}
+    start = time.perf_counter()
+
+    log_path = os.path.join(session_dir, "calc", "batch_run.log")
+    os.makedirs(os.path.dirname(log_path), exist_ok=True)
+    with open(log_path, "w", encoding="utf-8") as log_file, contextlib.redirect_stdout(log_file):
+        try:
+            raw_data_file = find_single_file(session_dir, raw_pattern)
+            ica_data_file = find_single_file(session_dir, ica_pattern)
+            timings = stages.run_all(session_dir, raw_data_file, ica_data_file, **options)
+            result.update({f"{name} [s]": elapsed for name, elapsed in timings.items()})
+        except Exception as e:
+            traceback.print_exc(file=log_file)
+            result.update({"status": "failed", "error": f"{type(e).__name__}: {e}"})
+
+    result["total [s]"] = time.perf_counter() - start
+    return result
+
+
+# 複数セッションをプロセスプールで並列処理する関数
+def run_batch(parent_dir, workers=None, clean=False, raw_pattern=RAW_PATTERN, ica_pattern=ICA_PATTERN, **options):
+    sessions = discover_sessions(parent_dir, clean)
+    if not sessions:
+        print(f"{parent_dir} にセッションが見つかりませんでした。")
+        return pd.DataFrame()
+    print(f"{len(sessions)} 個のセッションを検出しました。")
+
+    # セッション単位で並列化しているため、エポック波形は各セッション内で逐次描画する
+    options.setdefault("plot_workers", 1)
+
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(run_session, session, raw_pattern, ica_pattern, clean=clean, **options): session
+                   for session in sessions}
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                # ワーカープロセス自体の異常終了など
+                result = {"session": futures[future], "status": "failed", "error": f"{type(e).__name__}: {e}",
+                          "total [s]": float("nan")}
+            results.append(result)
+            print(f"[{result['status']}] {result['session']}")
+
+    # セッションごとの処理時間の一覧
+    summary = pd.DataFrame(results).sort_values("session").reset_index(drop=True)
+    stage_columns = [c for c in summary.columns if c.endswith("[s]") and c != "total [s]"]
+    summary = summary[["session", "status"] + stage_columns + ["total [s]", "error"]]
+    summary["session"] = [os.path.relpath(session, parent_dir) for session in summary["session"]]
+    with pd.option_context("display.width", 200, "display.max_columns", None, "display.float_format", "{:.2f}".format):
+        print(summary.to_string(index=False))
+
+    summary_path = os.path.join(parent_dir, "batch_summary.csv")
+    summary.to_csv(summary_path, index=False, encoding='utf-8-sig')
+    print(f"処理時間の一覧を {summary_path} に保存しました。")
+    return summary
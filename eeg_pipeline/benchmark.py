@@ -0,0 +1,309 @@
+#######################################################################################################
+#  2026/10/18 作成
+#
+# 【概要】合成データによる各処理段階の処理時間の計測（ベンチマーク）
+# 実データを使わずに、DAQ Master の生データ（"Event Time" 列にTTL時刻）、ICA処理済みデータ、
+# ラベルファイル（combined_data.csv）を乱数で作成し、エポック切り出し → ベースライン補正 → 分類 →
+# 加算平均 → 1ms間隔への補間 → プロット の各段階の処理時間をデータの規模ごとに計測する。
+# 結果はJSONに保存し、前回の結果と比較できる（変更で速くなったか・遅くなったかの確認用）。
+#
+# 【処理内容】
+# 1. make_session : 合成セッション（計測時間, チャンネル数, サンプリング周波数, TTLの数, エラー率を指定）を作成
+# 2. time_stage   : 1段階を指定回数実行し、各回の処理時間 [s] を計測
+# 3. run_benchmark: 規模ごとに 1., 2. を実行し、結果をJSONに保存する
+# 4. compare_results: 前回の結果（JSON）と段階ごとの処理時間（最小値）の比を表示
+#
+# 【出力先】
+# - 計測結果: "{出力先}/benchmark_{日時}.json"
+# - 合成データ: 一時ディレクトリ（keep_data=True の場合は "{出力先}/data/{規模名}"）
+#
+# 【注意】
+# - 各段階の表示（print）は計測中は表示しない（出力の量で処理時間が変わらないように）
+# - 指定しなかった段階でも、指定した段階の入力を作成する段階（colave に対する epoch, baseline, sort など）は
+#   計測せずに実行する
+# - 繰り返し計測では、毎回TTLの索引のキャッシュ（"*_events.json"）を削除してから切り出す
+# - 同じ乱数のシードでは同じ合成データになる（異なる環境・変更前後で同じデータを比較できる）
+# - 生データの "Event Time" 列には、試行のTTLの前に試行以外のイベント（計測開始の合図など）を入れる
+#   （実データと同じく、計測中は stages.TTL_ROWS で試行のTTLの行範囲を指定する）
+#######################################################################################################
+
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from eeg_pipeline import stages
+from eeg_pipeline.epoching import EPOCH_START, EPOCH_END
+from eeg_pipeline.events import EVENT_COLUMN, event_cache_path
+
+# データの規模の初期設定（規模名: 計測時間 [s], TTLの数）
+SCALES = {
+    "small": {"duration": 60, "n_ttls": 15},
+    "medium": {"duration": 600, "n_ttls": 150},
+    "large": {"duration": 1800, "n_ttls": 450},
+}
+
+# 計測する段階（実行順）と、各段階の入力を作成する段階
+BENCH_STAGES = ("epoch", "baseline", "sort", "colave", "resample", "epoch_plot", "result_plot")
+STAGE_INPUTS = {"baseline": "epoch", "sort": "baseline", "colave": "sort", "epoch_plot": "epoch",
+                "result_plot": "colave"}
+
+# 合成データの初期設定
+N_CHANNELS = 8       # ICA処理済みデータのチャンネル数（先頭の5チャンネルが ELECTRODES）
+ERROR_RATE = 0.2     # Error試行の割合
+NOISE_UV = 10.0      # 背景脳波（白色雑音）の標準偏差 [μV]
+ALPHA_UV = 5.0       # α波（10Hz）の振幅 [μV]
+SEED = 0
+WRITE_ROWS = 100000  # CSVに1回で書き出す行数
+LEAD_EVENTS = 5      # 試行のTTLの前にある試行以外のイベントの数（生データの0〜4行目）
+
+# 生データ（DAQ Master）の列（10列目が "Event Time"）
+RAW_COLUMNS = ["Time"] + [f"Ch{i}" for i in range(1, 9)] + [EVENT_COLUMN, "Trigger", "Marker"]
+
+# Error試行の波形（ErrP）: (潜時 [ms], 振幅 [μV], 幅 [ms]) のガウス波形の和
+ERRP_COMPONENTS = ((250, -8.0, 40), (350, 10.0, 60))
+
+
+# TTL時刻 [ms] を作成する関数（エポック範囲が記録内に収まるように、ほぼ等間隔に配置して揺らぎを加える）
+def make_ttl_times_ms(duration, n_ttls, rng):
+    first, last = -EPOCH_START + 1000, duration * 1000 - EPOCH_END - 1000
+    if n_ttls < 1 or last <= first:
+        raise ValueError(f"計測時間 {duration}秒 では TTL を {n_ttls} 個配置できません。")
+    times = np.linspace(first, last, n_ttls)
+    spacing = (last - first) / max(n_ttls - 1, 1)
+    jitter = rng.uniform(-0.2, 0.2, n_ttls) * min(spacing, 1000)
+    return np.round(np.clip(times + jitter, first, last))
+
+
+# 合成した連続データ (サンプル, チャンネル) のうち、時刻 times_ms の部分を作成する関数
+# 背景脳波（白色雑音 + α波）に、Error試行のTTLの後のみ ErrP の波形を加える
+def synthesize_chunk(times_ms, n_channels, ttl_times_ms, errp, rng):
+    data = rng.normal(0.0, NOISE_UV, (len(times_ms), n_channels))
+    phases = np.arange(n_channels) * 0.7
+    data += ALPHA_UV * np.sin(2 * np.pi * 10 * times_ms[:, None] / 1000 + phases)
+    n_electrodes = min(n_channels, len(stages.ELECTRODES))
+    for ttl_time in ttl_times_ms[errp.astype(bool)]:
+        latency = times_ms - ttl_time
+        in_range = (latency > -200) & (latency < 800)
+        if not in_range.any():
+            continue
+        wave = sum(amplitude * np.exp(-0.5 * ((latency[in_range] - peak) / width) ** 2)
+                   for peak, amplitude, width in ERRP_COMPONENTS)
+        data[in_range, :n_electrodes] += wave[:, None]
+    return data
+
+
+# ICA処理済みデータのCSVを作成する関数（1000Hz: ヘッダなし, 1列目が Time [s] / 1024Hz: ヘッダあり）
+def write_ica_csv(path, duration, sfreq, n_channels, ttl_times_ms, errp, rng):
+    n_samples = int(round(duration * sfreq))
+    names = ["Time"] + stages.ELECTRODES[:n_channels] + [f"Ch{i}" for i in range(6, n_channels + 1)]
+    with open(path, "w", newline="") as f:
+        if sfreq == 1024:
+            f.write(",".join(names) + "\n")
+        for start in range(0, n_samples, WRITE_ROWS):
+            times_s = np.arange(start, min(start + WRITE_ROWS, n_samples)) / sfreq
+            data = synthesize_chunk(times_s * 1000, n_channels, ttl_times_ms, errp, rng)
+            np.savetxt(f, np.column_stack([times_s, data]), fmt="%.6f", delimiter=",")
+    return n_samples
+
+
+# 生データ（DAQ Master形式）のCSVを作成する関数
+# 各行は1msごとのサンプル、"Event Time" 列は試行以外のイベント（first_row 個, 最初の試行より前の時刻）の後に
+# TTL時刻 [s] を並べる（実データと同じ配置）
+def write_raw_csv(path, duration, ttl_times_ms, rng, first_row=LEAD_EVENTS):
+    n_samples = int(duration * 1000)
+    events = np.full(n_samples, np.nan)
+    events[:first_row] = np.linspace(0, ttl_times_ms[0] / 1000, first_row, endpoint=False)
+    events[first_row:first_row + len(ttl_times_ms)] = ttl_times_ms / 1000
+    with open(path, "w", newline="") as f:
+        f.write(",".join(RAW_COLUMNS) + "\n")
+        for start in range(0, n_samples, WRITE_ROWS):
+            stop = min(start + WRITE_ROWS, n_samples)
+            frame = pd.DataFrame(rng.normal(0.0, NOISE_UV, (stop - start, 8)), columns=RAW_COLUMNS[1:9])
+            frame.insert(0, "Time", np.arange(start, stop) / 1000)
+            frame[EVENT_COLUMN] = events[start:stop]
+            frame["Trigger"] = 0
+            frame["Marker"] = 0
+            frame.to_csv(f, header=False, index=False, float_format="%.6f")
+
+
+# 合成セッションを作成する関数
+# 戻り値: {"root", "raw", "ica", "ica_1024"（resample 用, 作成した場合のみ）, "n_samples", "n_ttls", "n_errors",
+#          "ttl_rows"（試行のTTLの行範囲, stages.TTL_ROWS に指定する）}
+def make_session(root_dir, duration=60, sfreq=1000, n_channels=N_CHANNELS, n_ttls=15, error_rate=ERROR_RATE,
+                 seed=SEED, with_1024=False):
+    if n_channels < len(stages.ELECTRODES):
+        raise ValueError(f"チャンネル数は {len(stages.ELECTRODES)} 以上にしてください（電極: {stages.ELECTRODES}）。")
+    if sfreq not in (1000, 1024):
+        raise ValueError("サンプリング周波数は 1000 または 1024 [Hz] にしてください。")
+    os.makedirs(root_dir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+
+    ttl_times_ms = make_ttl_times_ms(duration, n_ttls, rng)
+    errp = (rng.random(n_ttls) < error_rate).astype(np.int8)
+
+    session = {"root": root_dir, "raw": os.path.join(root_dir, "raw.csv"), "ica": os.path.join(root_dir, "ICA.csv")}
+    write_raw_csv(session["raw"], duration, ttl_times_ms, rng)
+    session["n_samples"] = write_ica_csv(session["ica"], duration, sfreq, n_channels, ttl_times_ms, errp, rng)
+    if with_1024:
+        if sfreq == 1024:
+            session["ica_1024"] = session["ica"]
+        else:
+            session["ica_1024"] = os.path.join(root_dir, "ICA_1024.csv")
+            write_ica_csv(session["ica_1024"], duration, 1024, n_channels, ttl_times_ms, errp, rng)
+
+    # ラベルファイル（1000Hz版のエポック番号は0始まり, 1024Hz版は1始まり）
+    first_id = 1 if sfreq == 1024 else 0
+    label_path = stages.label_file_path(root_dir)
+    os.makedirs(os.path.dirname(label_path), exist_ok=True)
+    pd.DataFrame({"Epoch": np.arange(first_id, first_id + n_ttls), "ErrP": errp}).to_csv(label_path, index=False)
+
+    session.update(n_ttls=n_ttls, n_errors=int(errp.sum()), ttl_rows=slice(LEAD_EVENTS, LEAD_EVENTS + n_ttls))
+    return session
+
+
+# 計測中のみ stages.TTL_ROWS を変更する（終了後は元の設定に戻す）
+@contextlib.contextmanager
+def ttl_rows(rows):
+    previous, stages.TTL_ROWS = stages.TTL_ROWS, rows
+    try:
+        yield
+    finally:
+        stages.TTL_ROWS = previous
+
+
+# 1段階を repeat 回実行し、各回の処理時間 [s] を返す関数（prepare は計測の前に毎回呼び出す）
+def time_stage(func, repeat=1, prepare=None, quiet=True):
+    durations = []
+    for _ in range(repeat):
+        if prepare is not None:
+            prepare()
+        output = io.StringIO() if quiet else sys.stdout
+        with contextlib.redirect_stdout(output):
+            start = time.perf_counter()
+            func()
+            durations.append(time.perf_counter() - start)
+    return durations
+
+
+# 計測する段階と、その入力を作成するために計測せずに実行する段階を求める関数
+# 戻り値: 実行順の段階名のリスト
+def required_stages(bench_stages):
+    required = set(bench_stages)
+    for name in bench_stages:
+        while name in STAGE_INPUTS:
+            name = STAGE_INPUTS[name]
+            required.add(name)
+    return [name for name in BENCH_STAGES if name in required]
+
+
+# 合成セッションで実行する段階の一覧を作成する関数（実行順）
+# 戻り値: [(段階名, 実行する関数, 計測前に呼び出す関数)]
+def stage_jobs(session, sfreq, bench_stages, plot_workers, dpi):
+    root = session["root"]
+
+    def clear_event_cache():
+        cache_path = event_cache_path(session["raw"])
+        if os.path.isfile(cache_path):
+            os.remove(cache_path)
+
+    jobs = {
+        "epoch": (lambda: stages.run_epoch(root, session["raw"], session["ica"], sfreq=sfreq), clear_event_cache),
+        "baseline": (lambda: stages.run_baseline(root), None),
+        "sort": (lambda: stages.run_sort(root, sfreq=sfreq), None),
+        "colave": (lambda: stages.run_colave(root), None),
+        "resample": (lambda: stages.run_before(session["ica_1024"], os.path.join(root, "ICA_1024_1ms")), None),
+        "epoch_plot": (lambda: stages.run_epoch_plot(root, workers=plot_workers, dpi=dpi), None),
+        "result_plot": (lambda: stages.run_result_plot(root), None),
+    }
+    return [(name,) + jobs[name] for name in required_stages(bench_stages)]
+
+
+# 規模ごとに合成セッションを作成して各段階の処理時間を計測し、結果をJSONに保存する関数
+# scales: 規模名のリスト（SCALES）または {規模名: {"duration", "n_ttls"}}, repeat: 各段階の繰り返し回数
+# 戻り値: 計測結果の辞書（"results" は 規模 × 段階 ごとの処理時間）
+def run_benchmark(output_dir, scales=("small", "medium"), sfreq=1000, n_channels=N_CHANNELS, error_rate=ERROR_RATE,
+                  repeat=1, bench_stages=BENCH_STAGES, plot_workers=None, dpi=100, seed=SEED, keep_data=False,
+                  compare=None):
+    unknown = [name for name in bench_stages if name not in BENCH_STAGES]
+    if unknown:
+        raise ValueError(f"不明な段階です: {unknown}（{', '.join(BENCH_STAGES)} から選択してください）。")
+    if not isinstance(scales, dict):
+        scales = {name: SCALES[name] for name in scales}
+    os.makedirs(output_dir, exist_ok=True)
+    created = datetime.now()
+    print(f"▶ ベンチマークを開始します（規模: {', '.join(scales)}, 段階: {', '.join(bench_stages)}, 各 {repeat} 回）。")
+
+    results = []
+    for scale, params in scales.items():
+        data_dir = os.path.join(output_dir, "data", scale) if keep_data else tempfile.mkdtemp(prefix="eeg_bench_")
+        try:
+            start = time.perf_counter()
+            session = make_session(data_dir, sfreq=sfreq, n_channels=n_channels, error_rate=error_rate, seed=seed,
+                                   with_1024="resample" in bench_stages, **params)
+            print(f"合成データ {scale}（{params['duration']}秒, {session['n_samples']} サンプル × {n_channels} チャンネル, "
+                  f"TTL {session['n_ttls']} 個, Error {session['n_errors']} 試行）を作成しました"
+                  f"（{time.perf_counter() - start:.1f}秒）。")
+
+            with ttl_rows(session["ttl_rows"]):
+                for name, func, prepare in stage_jobs(session, sfreq, bench_stages, plot_workers, dpi):
+                    if name not in bench_stages:
+                        # 後の段階の入力を作成するのみ（計測しない）
+                        time_stage(func, prepare=prepare)
+                        continue
+                    durations = time_stage(func, repeat=repeat, prepare=prepare)
+                    results.append({"scale": scale, "stage": name, "duration": params["duration"],
+                                    "n_samples": session["n_samples"], "n_epochs": session["n_ttls"],
+                                    "times": [round(d, 4) for d in durations], "min": round(min(durations), 4),
+                                    "median": round(float(np.median(durations)), 4)})
+                    print(f"  {name:<12} {min(durations):8.3f}秒（最小）  "
+                          f"{float(np.median(durations)):8.3f}秒（中央値）")
+        finally:
+            if not keep_data:
+                shutil.rmtree(data_dir, ignore_errors=True)
+
+    report = {
+        "created": created.isoformat(timespec="seconds"),
+        "environment": {"python": platform.python_version(), "numpy": np.__version__, "pandas": pd.__version__,
+                        "platform": platform.platform(), "processor": platform.processor(),
+                        "cpu_count": os.cpu_count()},
+        "params": {"sfreq": sfreq, "n_channels": n_channels, "error_rate": error_rate, "repeat": repeat,
+                   "plot_workers": plot_workers, "dpi": dpi, "seed": seed, "scales": scales},
+        "results": results,
+    }
+    output_path = os.path.join(output_dir, f"benchmark_{created.strftime('%Y%m%d_%H%M%S')}.json")
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=1)
+    print(f"🎉 計測結果を {output_path} に保存しました。")
+
+    if compare:
+        compare_results(compare, report)
+    return report
+
+
+# 前回の計測結果と段階ごとの処理時間（最小値）を比較して表示する関数
+# previous, current: 計測結果のJSONのパスまたは run_benchmark の戻り値
+# 戻り値: 列 "scale", "stage", "previous [s]", "current [s]", "ratio"（current / previous, 1未満は高速化）の DataFrame
+def compare_results(previous, current):
+    reports = []
+    for report in (previous, current):
+        if isinstance(report, str):
+            with open(report, encoding="utf-8") as f:
+                report = json.load(f)
+        reports.append(pd.DataFrame(report["results"]).set_index(["scale", "stage"])["min"])
+    table = pd.concat(reports, axis=1, keys=["previous [s]", "current [s]"], join="inner").reset_index()
+    if table.empty:
+        print("⚠ 比較できる規模・段階の組み合わせがありません。")
+        return table
+    table["ratio"] = (table["current [s]"] / table["previous [s]"]).round(3)
+    print("\n" + table.to_string(index=False))
+    return table
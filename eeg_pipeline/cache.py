@@ -0,0 +1,144 @@
+#######################################################################################################
+#  2026/10/18 作成
+#
+# 【概要】処理段階のキャッシュ（入力ファイルの内容ハッシュによる再実行の省略）
+# 各処理段階の実行後に、入力ファイルのハッシュ（SHA-256）、パラメータ、出力ファイルの一覧を
+# マニフェスト（calc/manifests/{段階名}.json）に記録する。次回の実行時に入力・パラメータが同じで、
+# 出力も変更されていなければ、その段階の処理を省略する。
+#
+# 【処理内容】
+# 1. file_digest : ファイルの内容のハッシュを求める（ディレクトリは含まれる全ファイルをまとめる）
+# 2. StageCache  : マニフェストの読み書きと、処理を省略できるかの判定
+# 3. run_cached  : 処理を省略できなければ実行し、マニフェストを記録する
+#
+# 【注意】
+# - サイズと更新時刻が前回と同じ入力ファイルは、記録済みのハッシュを再利用する（再計算しない）
+# - 上流の段階を再実行しても出力の内容が同じであれば、下流の段階は省略される
+#######################################################################################################
+
+import hashlib
+import json
+import os
+
+# マニフェストの保存先（calc/ 以下）
+MANIFEST_DIR = "manifests"
+
+# ハッシュ計算時に1回に読み込むバイト数
+BLOCK_SIZE = 1 << 20
+
+
+# ファイルの内容の SHA-256 を求める関数
+def file_digest(file_path, block_size=BLOCK_SIZE):
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# パス（ファイルまたはディレクトリ）に含まれるファイルの一覧を返す関数
+def list_files(path):
+    if os.path.isfile(path):
+        return [path]
+    files = []
+    for current_dir, dir_names, file_names in os.walk(path):
+        dir_names.sort()
+        files.extend(os.path.join(current_dir, file_name) for file_name in sorted(file_names))
+    return files
+
+
+# 各ファイルのサイズと更新時刻（出力が変更されていないかの判定に使用）
+def file_stats(path):
+    return {os.path.relpath(file, path) if file != path else os.path.basename(path):
+            [os.path.getsize(file), os.stat(file).st_mtime_ns] for file in list_files(path)}
+
+
+# 処理段階ごとのマニフェストを管理するクラス
+# inputs / outputs: ファイルまたはディレクトリのパスのリスト, params: JSONに変換できるパラメータ
+class StageCache:
+    def __init__(self, root_dir, stage, inputs, outputs, params):
+        self.root_dir = root_dir
+        self.stage = stage
+        self.inputs = [path for path in inputs if path]
+        self.outputs = [path for path in outputs if path]
+        self.params = json.loads(json.dumps(params))  # タプルなどをJSONと同じ形に揃える
+        self.manifest_path = os.path.join(root_dir, "calc", MANIFEST_DIR, f"{stage}.json")
+        self.previous = self.load()
+        self._input_digests = None
+
+    # マニフェスト内のパスは、ルートディレクトリ以下であれば相対パスで記録する
+    def key(self, path):
+        relative = os.path.relpath(os.path.abspath(path), os.path.abspath(self.root_dir))
+        return path if relative.startswith("..") else relative.replace(os.sep, "/")
+
+    def load(self):
+        if not os.path.isfile(self.manifest_path):
+            return None
+        try:
+            with open(self.manifest_path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    # 入力ファイルごとの [サイズ, 更新時刻, ハッシュ]（前回とサイズ・更新時刻が同じファイルはハッシュを再利用）
+    def input_digests(self):
+        if self._input_digests is not None:
+            return self._input_digests
+        previous = (self.previous or {}).get("inputs", {})
+        digests = {}
+        for path in self.inputs:
+            if not os.path.exists(path):
+                digests[self.key(path)] = None
+                continue
+            for file in list_files(path):
+                size, mtime = os.path.getsize(file), os.stat(file).st_mtime_ns
+                recorded = previous.get(self.key(file))
+                if recorded and recorded[:2] == [size, mtime]:
+                    digests[self.key(file)] = recorded
+                else:
+                    digests[self.key(file)] = [size, mtime, file_digest(file)]
+        self._input_digests = digests
+        return digests
+
+    # 入力の内容・パラメータ・出力がすべて前回と同じであれば True
+    def is_fresh(self):
+        if self.previous is None or self.previous.get("params") != self.params:
+            return False
+        previous_inputs = self.previous.get("inputs", {})
+        current_inputs = self.input_digests()
+        if set(previous_inputs) != set(current_inputs):
+            return False
+        for key, current in current_inputs.items():
+            recorded = previous_inputs[key]
+            if (current is None) != (recorded is None) or (current and current[2] != recorded[2]):
+                return False
+        return self.previous.get("outputs") == self.output_stats()
+
+    # 出力ごとのファイルのサイズと更新時刻（存在しない出力は None）
+    def output_stats(self):
+        return {self.key(path): file_stats(path) if os.path.exists(path) else None for path in self.outputs}
+
+    # 処理の実行後に、入力・パラメータ・出力をマニフェストに記録する
+    def record(self):
+        self._input_digests = None  # 処理中に入力が更新された場合に備えて再計算する
+        manifest = {
+            "stage": self.stage,
+            "params": self.params,
+            "inputs": self.input_digests(),
+            "outputs": self.output_stats(),
+        }
+        os.makedirs(os.path.dirname(self.manifest_path), exist_ok=True)
+        with open(self.manifest_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=1)
+
+
+# 入力・パラメータ・出力が前回と同じであれば処理を省略し、そうでなければ実行してマニフェストを記録する関数
+# 戻り値: (処理の戻り値（省略時は None）, 省略したかどうか)
+def run_cached(root_dir, stage, func, inputs, outputs, params, *args, force=False, **kwargs):
+    cache = StageCache(root_dir, stage, inputs, outputs, params)
+    if not force and cache.is_fresh():
+        print(f"⏭ {stage}: 入力とパラメータが前回と同じため、処理を省略しました。")
+        return None, True
+    result = func(*args, **kwargs)
+    cache.record()
+    return result, False
@@ -0,0 +1,448 @@
+#######################################################################################################
+#  2026/10/18 作成
+#
+# 【概要】解析パイプラインのコマンドライン実行
+# GUI（tkinter）を使わずに各処理段階を実行する。ヘッドレス環境や複数セッションの一括処理用。
+#
+# 【使い方】
+#   python -m eeg_pipeline before   --ica ICA.csv
+#   python -m eeg_pipeline filter   --ica ICA.csv [--band 2 40 --band 2 10] [--mode zero_phase|causal]
+#   python -m eeg_pipeline labels   --root ROOT [--log-dir LOG] [--key error] [--clean]
+#   python -m eeg_pipeline epoch    --root ROOT --raw RAW.csv --ica ICA.csv [--clean] [--fs 1024]
+#   python -m eeg_pipeline baseline --root ROOT
+#   python -m eeg_pipeline sort     --root ROOT [--clean]
+#   python -m eeg_pipeline colave   --root ROOT [--update]
+#   python -m eeg_pipeline spectrum --root ROOT [--fmax 40]
+#   python -m eeg_pipeline ersp     --root ROOT [--fmin 4 --fmax 8] [--decim 4]
+#   python -m eeg_pipeline stats    --root ROOT [--permutations 1000] [--seed 0]
+#   python -m eeg_pipeline plot     --root ROOT --target epochs|results [--clean]
+#   python -m eeg_pipeline run-all  --root ROOT --raw RAW.csv --ica ICA.csv [--clean] [--fs 1024]
+#   python -m eeg_pipeline multi    --root ROOT --raw RAW.csv --ica ICA.csv [--band 2 40 --band 2 10] [--workers 2]
+#   python -m eeg_pipeline batch    --parent PARENT [--workers 4] [--raw-pattern "*raw*.csv"]
+#   python -m eeg_pipeline group    --parent PARENT [--weighting subject|trial] [--update]
+#   python -m eeg_pipeline realtime --root ROOT --raw RAW.csv --ica ICA.csv [--source socket --port 5005]
+#   python -m eeg_pipeline serve    --raw RAW.csv --ica ICA.csv [--port 5005]
+#   python -m eeg_pipeline benchmark [--scale small medium large] [--repeat 3] [--compare PREVIOUS.json]
+#
+# 【注意】
+# - --gui を指定した場合のみ、未指定のパスをGUIの選択ダイアログで選ぶ（tkinter が必要）
+# - --trace / --profile を指定すると、処理時間・資源使用量のトレースと cProfile の結果を calc/profile に保存する
+# - 各処理段階のモジュール（pandas などを読み込む）は、実行するサブコマンドの分のみ読み込む
+#######################################################################################################
+
+import argparse
+import os
+import sys
+
+import numpy as np
+
+# 引数の既定値に使う定数（numpy のみを読み込むモジュールから）
+from eeg_pipeline.baseline import BASELINE_MODES, BASELINE_WINDOW
+from eeg_pipeline.dialogs import select_directory, select_file
+from eeg_pipeline.filtering import FILTER_BANDS, FILTER_MODES, FILTER_ORDER, band_name
+from eeg_pipeline.permutation import N_PERMUTATIONS, CLUSTER_ALPHA, ALPHA, SEED
+from eeg_pipeline.plotting import EPOCH_PLOT_DPI
+from eeg_pipeline.profiling import PROFILE_DIR, Profiler
+from eeg_pipeline.realtime import BLOCK_SIZE, HOST, PORT
+from eeg_pipeline.spectral import WINDOW_LENGTH, OVERLAP, QUANTITIES, WAVELET_FREQS, N_CYCLES
+from eeg_pipeline.streaming import CHUNK_SIZE
+
+# 各パス引数に対応するGUIの案内文
+PROMPTS = {
+    "root": "解析のルートディレクトリを選択してください",
+    "raw": "生データ（.csv）のファイルを選択してください。",
+    "ica": "ICA処理済みデータ（.csv）のファイルを選択してください。",
+    "parent": "セッションをまとめた親ディレクトリを選択してください",
+}
+
+
+# 未指定のパスを --gui 指定時のみ選択ダイアログで補う関数
+def resolve_paths(args, parser, names):
+    for name in names:
+        if getattr(args, name):
+            continue
+        if not args.gui:
+            parser.error(f"--{name} を指定してください（GUIで選択する場合は --gui）。")
+        select = select_directory if name in ("root", "parent") else select_file
+        setattr(args, name, select(PROMPTS[name]))
+
+
+# 引数の解析器を作成する関数
+# command を指定した場合は、既定値に処理段階のモジュールの定数を使うサブコマンドのうち、そのサブコマンドの引数のみを追加する
+# （None の場合はすべて追加する）
+def build_parser(command=None):
+    parser = argparse.ArgumentParser(prog="python -m eeg_pipeline", description="脳波データのエポック解析パイプライン")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    # 共通オプション
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--gui", action="store_true", help="未指定のパスをGUIの選択ダイアログで選ぶ")
+    common.add_argument("--root", help="解析のルートディレクトリ")
+    common.add_argument("--clean", action="store_true", help="エラーなしセッション（*_clean.py 相当）")
+    common.add_argument("--fs", type=int, choices=[1000, 1024], default=1000,
+                        help="計測のサンプリング周波数（1024: 2-10Hzフィルタ版）")
+    common.add_argument("--write-csv", action="store_true", help="従来形式の電極ごとのCSVも出力する")
+    common.add_argument("--show-ttl", action="store_true", help="プロットにTTL線を表示する")
+    common.add_argument("--trace", action="store_true",
+                        help="段階ごとの処理時間・CPU時間・ピークRSS・読み書き量・件数を calc/profile/trace_*.json に保存する")
+    common.add_argument("--profile", action="store_true", help="段階ごとの cProfile の結果を calc/profile/{段階名}.prof に保存する")
+
+    data_files = argparse.ArgumentParser(add_help=False)
+    data_files.add_argument("--raw", help="生データ（DAQ Master, .csv）")
+    data_files.add_argument("--ica", help="ICA処理済みデータ（.csv）")
+    data_files.add_argument("--stream", action="store_true", help="ICA処理済みデータをチャンク単位で読み込む（省メモリ）")
+    data_files.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="ストリーミング時に1回に読み込む行数")
+
+    baseline_options = argparse.ArgumentParser(add_help=False)
+    baseline_options.add_argument("--baseline-mode", choices=list(BASELINE_MODES), default="electrode",
+                                  help="electrode: 電極ごとに全エポックの平均（従来）, epoch: エポックごとの平均")
+    baseline_options.add_argument("--baseline-window", type=float, nargs=2, metavar=("START", "END"),
+                                  default=list(BASELINE_WINDOW), help="ベースライン区間 [ms]（例: -200 0）")
+
+    plot_options = argparse.ArgumentParser(add_help=False)
+    plot_options.add_argument("--dpi", type=int, default=EPOCH_PLOT_DPI,
+                              help="エポック波形の解像度（下書きは100程度, 発表用は300）")
+    plot_options.add_argument("--plot-workers", type=int, default=None,
+                              help="エポック波形を描画する並列プロセス数（省略時はCPU数, 1で逐次描画）")
+
+    before = subparsers.add_parser("before", parents=[common], help="1024Hzデータ全体を1ms間隔に補間（0_before_10.py, 任意）")
+    before.add_argument("--ica", help="ICA処理済みデータ（.csv）")
+    before.add_argument("--output", help="出力先（拡張子なし, 省略時は *_1ms）")
+    before.add_argument("--method", choices=["linear", "polyphase"], default="linear",
+                        help="linear: 線形補間, polyphase: アンチエイリアスフィルタ付き再サンプリング")
+    before.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="1回に読み込む行数")
+
+    filter_parser = subparsers.add_parser("filter", parents=[common],
+                                          help="連続データのバンドパスフィルタ（複数帯域を1回の読み込みで出力）")
+    filter_parser.add_argument("--ica", help="ICA処理済みデータ（.csv）")
+    filter_parser.add_argument("--band", type=float, nargs=2, action="append", metavar=("LOW", "HIGH"),
+                               help="帯域 [Hz]（複数指定可, 省略時は 2-40Hz と 2-10Hz）")
+    filter_parser.add_argument("--mode", choices=list(FILTER_MODES), default="zero_phase",
+                               help="zero_phase: ゼロ位相フィルタ（オフライン用）, causal: チャンクごとの因果的フィルタ（省メモリ）")
+    filter_parser.add_argument("--order", type=int, default=FILTER_ORDER, help="バターワースフィルタの次数")
+    filter_parser.add_argument("--output", help="出力先の接頭辞（省略時はICAデータと同じ場所・名前）")
+    filter_parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="1回に読み込む行数")
+
+    labels_parser = subparsers.add_parser("labels", parents=[common],
+                                          help="ログ（.pkl）からラベル表（combined_data.csv）を作成")
+    if command in (None, "labels"):
+        from eeg_pipeline.labels import ERROR_KEYS
+
+        labels_parser.add_argument("--log-dir", help=".pkl のディレクトリ（省略時は ROOT/log）")
+        labels_parser.add_argument("--key", default=None,
+                                   help=f"エラーの有無の項目名（大文字・小文字は区別しない, 見つからない .pkl は省略する, "
+                                        f"省略時は {', '.join(ERROR_KEYS)} の順に探す）")
+        labels_parser.add_argument("--first-epoch", type=int, default=None,
+                                   help="最初の試行のエポック番号（省略時は 1000Hz: 0, 1024Hz: 1）")
+        labels_parser.add_argument("--workers", type=int, default=None,
+                                   help="並列プロセス数（省略時はCPU数, 1で逐次読み込み）")
+        labels_parser.add_argument("--force", action="store_true",
+                                   help="キャッシュを使わずにすべての .pkl を読み込む（labels で作成していない combined_data.csv は .bak に退避して作り直す）")
+
+    subparsers.add_parser("epoch", parents=[common, data_files], help="エポックの切り出し（1_epoch*.py）")
+    subparsers.add_parser("baseline", parents=[common, baseline_options], help="ベースライン補正（2_baseline.py）")
+    subparsers.add_parser("sort", parents=[common], help="Correct/Error試行の分類（3_sort*.py）")
+    colave = subparsers.add_parser("colave", parents=[common], help="加算平均と差分波形の計算（4_colave.py）")
+    colave.add_argument("--update", action="store_true",
+                        help="保存済みの加算平均（calc/ave/*_accumulator）に、新しいエポックのみを追加する")
+
+    spectrum = subparsers.add_parser("spectrum", parents=[common],
+                                     help="全電極・全エポックの短時間フーリエ変換（eeg_analyze.m のスペクトログラム）")
+    spectrum.add_argument("--window", type=int, default=WINDOW_LENGTH,
+                          help="窓長 [サンプル]（eeg_analyze.m は1024, 1000Hzのエポックでは刺激前の1秒に収まらないため初期設定は512）")
+    spectrum.add_argument("--overlap", type=int, default=OVERLAP, help="窓の重なり [サンプル]")
+    spectrum.add_argument("--nfft", type=int, default=None, help="FFT点数（省略時は窓長）")
+    spectrum.add_argument("--quantity", choices=list(QUANTITIES), default="magnitude",
+                          help="magnitude: abs(S)（eeg_analyze.m と同じ）, power: abs(S)^2")
+    spectrum.add_argument("--baseline-window", type=float, nargs=2, default=list(BASELINE_WINDOW),
+                          metavar=("START", "END"), help="ベースライン区間 [ms]（窓全体がこの区間に収まるフレームの平均を減算）")
+    spectrum.add_argument("--no-baseline", action="store_true", help="ベースライン補正をしない")
+    spectrum.add_argument("--fmax", type=float, default=None, help="保存する最大周波数 [Hz]（省略時は全周波数）")
+
+    multi_parser = subparsers.add_parser("multi", parents=[common, baseline_options],
+                                         help="1回の読み込みで複数のフィルタ帯域 × 条件セットの加算平均を計算")
+    if command in (None, "multi"):
+        from eeg_pipeline.multi import CONDITION_SETS
+
+        multi_parser.add_argument("--raw", help="生データ（DAQ Master, .csv）")
+        multi_parser.add_argument("--ica", help="ICA処理済みデータ（.csv）")
+        multi_parser.add_argument("--band", type=float, nargs=2, action="append", metavar=("LOW", "HIGH"),
+                                  help="帯域 [Hz]（複数指定可, 省略時は 2-40Hz と 2-10Hz）")
+        multi_parser.add_argument("--unfiltered", action="store_true",
+                                  help="フィルタなしの分岐（calc/multi/unfiltered）も出力する")
+        multi_parser.add_argument("--conditions", nargs="+", choices=list(CONDITION_SETS), default=None,
+                                  help="条件セット（error: log/pkl_analysis, clean: log/pkl_analysis_noerror, "
+                                       "省略時はすべて, --clean の場合は clean のみ）")
+        multi_parser.add_argument("--order", type=int, default=FILTER_ORDER, help="バターワースフィルタの次数")
+        multi_parser.add_argument("--workers", type=int, default=None,
+                                  help="並列プロセス数（省略時はCPU数, 1で逐次実行）")
+
+    ersp = subparsers.add_parser("ersp", parents=[common],
+                                 help="Correct/Error試行の ERSP と ITC（Morletウェーブレット）")
+    ersp.add_argument("--fmin", type=float, default=WAVELET_FREQS[0], help="最小周波数 [Hz]")
+    ersp.add_argument("--fmax", type=float, default=WAVELET_FREQS[-1], help="最大周波数 [Hz]")
+    ersp.add_argument("--fstep", type=float, default=1.0, help="周波数の間隔 [Hz]")
+    ersp.add_argument("--cycles", type=float, default=N_CYCLES, help="ウェーブレットの周期数")
+    ersp.add_argument("--baseline-window", type=float, nargs=2, default=list(BASELINE_WINDOW),
+                      metavar=("START", "END"), help="ベースライン区間 [ms]")
+    ersp.add_argument("--decim", type=int, default=1, help="時間方向の間引き（4で4サンプルごとに保存）")
+
+    stats = subparsers.add_parser("stats", parents=[common], help="Error試行とCorrect試行の差のクラスタベース置換検定")
+    stats.add_argument("--permutations", type=int, default=N_PERMUTATIONS, help="置換の回数")
+    stats.add_argument("--cluster-alpha", type=float, default=CLUSTER_ALPHA,
+                       help="クラスタを作る点の閾値（t 検定の有意水準）")
+    stats.add_argument("--alpha", type=float, default=ALPHA, help="クラスタの有意水準")
+    stats.add_argument("--tail", type=int, choices=[0, 1, -1], default=0,
+                       help="0: 両側, 1: Error > Correct, -1: Error < Correct")
+    stats.add_argument("--seed", type=int, default=SEED, help="乱数のシード（同じ値で同じ結果）")
+    stats.add_argument("--workers", type=int, default=None, help="並列プロセス数（省略時はCPU数, 1で逐次計算）")
+
+    plot = subparsers.add_parser("plot", parents=[common, plot_options], help="波形のプロット（1_plot.py, 5_plot*.py）")
+    plot.add_argument("--target", choices=["epochs", "results"], default="results",
+                      help="epochs: 各エポック波形, results: 加算平均波形")
+    plot.add_argument("--mode", choices=["epochs", "erp_image", "grid", "overview"], default="epochs",
+                      help="--target epochs の出力（epochs: エポックごとのPNG, erp_image / grid / overview: 電極ごとに1枚）")
+    plot.add_argument("--sort-by-label", action="store_true", help="一覧表示をCorrect/Errorのラベル順に並べる")
+
+    run_all = subparsers.add_parser("run-all", parents=[common, data_files, plot_options, baseline_options], help="一連の処理をまとめて実行")
+    run_all.add_argument("--no-epoch-plots", action="store_true", help="各エポック波形のプロットを省略する")
+    run_all.add_argument("--force", action="store_true", help="入力が前回と同じ段階も省略せずに実行する")
+    run_all.add_argument("--no-cache", action="store_true", help="キャッシュ（calc/manifests）を使わない")
+    run_all.add_argument("--fused", action="store_true",
+                         help="エポック切り出し〜加算平均をメモリ上でまとめて実行（中間データを保存しない）")
+    run_all.add_argument("--write-intermediates", action="store_true", help="--fused でも中間データを保存する")
+
+    batch_parser = subparsers.add_parser("batch", parents=[common, plot_options, baseline_options], help="複数セッションを並列に一括処理")
+    if command in (None, "batch"):
+        from eeg_pipeline.batch import RAW_PATTERN, ICA_PATTERN
+
+        batch_parser.add_argument("--parent", help="セッションのディレクトリを含む親ディレクトリ")
+        batch_parser.add_argument("--workers", type=int, default=None, help="並列プロセス数（省略時はCPU数）")
+        batch_parser.add_argument("--raw-pattern", default=RAW_PATTERN, help="生データのファイル名パターン")
+        batch_parser.add_argument("--ica-pattern", default=ICA_PATTERN, help="ICA処理済みデータのファイル名パターン")
+        batch_parser.add_argument("--no-epoch-plots", action="store_true", help="各エポック波形のプロットを省略する")
+        batch_parser.add_argument("--force", action="store_true", help="入力が前回と同じ段階も省略せずに実行する")
+        batch_parser.add_argument("--no-cache", action="store_true", help="キャッシュ（calc/manifests）を使わない")
+        batch_parser.add_argument("--fused", action="store_true",
+                                  help="エポック切り出し〜加算平均をメモリ上でまとめて実行（中間データを保存しない）")
+        batch_parser.add_argument("--write-intermediates", action="store_true", help="--fused でも中間データを保存する")
+        batch_parser.add_argument("--stream", action="store_true", help="ICA処理済みデータをチャンク単位で読み込む（省メモリ）")
+        batch_parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="ストリーミング時に1回に読み込む行数")
+
+    group_parser = subparsers.add_parser("group", parents=[common], help="複数被験者の総加算平均（6_group.py）")
+    if command in (None, "group"):
+        from eeg_pipeline.group import WEIGHTINGS, SOURCES
+
+        group_parser.add_argument("--parent", help="セッションのディレクトリを含む親ディレクトリ")
+        group_parser.add_argument("--output", help="出力先（省略時は {親ディレクトリ}/group）")
+        group_parser.add_argument("--weighting", choices=list(WEIGHTINGS), default="subject",
+                                  help="subject: 被験者ごとに等しい重み, trial: 試行数に比例した重み")
+        group_parser.add_argument("--source", choices=list(SOURCES), default="auto",
+                                  help="各セッションの読み込み元（auto: *_accumulator → エポックデータ → 比較用CSV）")
+        group_parser.add_argument("--update", action="store_true", help="前回の集計に含まれていないセッションのみを加える")
+        group_parser.add_argument("--plot", action="store_true", help="総加算平均の波形もプロットする")
+
+    # リアルタイム解析（計測中のデータ、または記録済みデータの再生）
+    replay_options = argparse.ArgumentParser(add_help=False)
+    replay_options.add_argument("--raw", help="生データ（DAQ Master, .csv）")
+    replay_options.add_argument("--ica", help="ICA処理済みデータ（.csv）")
+    replay_options.add_argument("--host", default=HOST, help="ソケット通信のホスト")
+    replay_options.add_argument("--port", type=int, default=PORT, help="ソケット通信のポート番号")
+    replay_options.add_argument("--block-size", type=int, default=BLOCK_SIZE, help="1回に受け渡すサンプル数")
+    replay_options.add_argument("--realtime", action="store_true", help="記録済みデータを計測と同じ速さで再生する")
+    replay_options.add_argument("--speed", type=float, default=1.0, help="--realtime の再生速度（倍）")
+
+    realtime_parser = subparsers.add_parser("realtime", parents=[common, replay_options],
+                                            help="エポックを逐次切り出し、加算平均をリアルタイムに更新")
+    realtime_parser.add_argument("--source", choices=["replay", "socket"], default="replay",
+                                 help="replay: --ica のデータを再生, socket: --host:--port から受信")
+    realtime_parser.add_argument("--baseline-window", type=float, nargs=2, metavar=("START", "END"),
+                                 default=list(BASELINE_WINDOW), help="ベースライン区間 [ms]（エポックごとに補正）")
+    subparsers.add_parser("serve", parents=[common, replay_options],
+                          help="記録済みデータをソケットで送信（計測装置の代わり, realtime --source socket の動作確認用）")
+
+    benchmark_parser = subparsers.add_parser("benchmark", parents=[common],
+                                             help="合成データで各処理段階の処理時間を計測（結果をJSONに保存）")
+    if command in (None, "benchmark"):
+        from eeg_pipeline import benchmark
+
+        benchmark_parser.add_argument("--output", default="benchmarks", help="計測結果の保存先ディレクトリ")
+        benchmark_parser.add_argument("--scale", nargs="+", choices=list(benchmark.SCALES), default=["small", "medium"],
+                                      help="データの規模（" + ", ".join(f"{name}: {params['duration']}秒・TTL {params['n_ttls']} 個"
+                                                                   for name, params in benchmark.SCALES.items()) + "）")
+        benchmark_parser.add_argument("--duration", type=float, default=None,
+                                      help="計測時間 [s]（指定時は --scale の代わりにこの規模のみ計測）")
+        benchmark_parser.add_argument("--ttls", type=int, default=None, help="--duration 指定時のTTLの数（省略時は4秒に1個）")
+        benchmark_parser.add_argument("--channels", type=int, default=benchmark.N_CHANNELS, help="ICA処理済みデータのチャンネル数")
+        benchmark_parser.add_argument("--error-rate", type=float, default=benchmark.ERROR_RATE, help="Error試行の割合")
+        benchmark_parser.add_argument("--stages", nargs="+", choices=list(benchmark.BENCH_STAGES),
+                                      default=list(benchmark.BENCH_STAGES), help="計測する段階")
+        benchmark_parser.add_argument("--repeat", type=int, default=1, help="各段階の繰り返し回数（最小値と中央値を記録）")
+        benchmark_parser.add_argument("--plot-workers", type=int, default=None,
+                                      help="エポック波形を描画する並列プロセス数（省略時はCPU数, 1で逐次描画）")
+        benchmark_parser.add_argument("--dpi", type=int, default=100, help="エポック波形の解像度")
+        benchmark_parser.add_argument("--seed", type=int, default=benchmark.SEED, help="合成データの乱数のシード")
+        benchmark_parser.add_argument("--keep-data", action="store_true", help="合成データを {--output}/data に残す")
+        benchmark_parser.add_argument("--compare", help="比較する前回の計測結果（benchmark_*.json）")
+
+    return parser
+
+
+# 引数のうち最初の位置引数（サブコマンド名）を返す関数（ない場合は空文字列）
+def find_command(argv):
+    return next((arg for arg in argv if not arg.startswith("-")), "")
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    parser = build_parser(find_command(argv))
+    args = parser.parse_args(argv)
+    if args.command in ("run-all", "batch") or not (args.trace or args.profile):
+        # run-all / batch は段階ごとに計測する（stages.run_all）
+        return run_command(args, parser)
+
+    # 単独の段階はコマンド全体を1段階として計測する（--root がないコマンドはカレントディレクトリの profile に保存）
+    profile_dir = os.path.join(args.root, "calc", PROFILE_DIR) if args.root else PROFILE_DIR
+    profiler = Profiler(profile_dir if args.profile else None)
+    with profiler.stage(args.command):
+        status = run_command(args, parser)
+    profiler.report()
+    if args.trace:
+        profiler.save(profile_dir, info={"command": args.command, "argv": argv})
+    return status
+
+
+# サブコマンドを実行する関数（戻り値: 終了コード）
+def run_command(args, parser):
+    if args.command == "before":
+        from eeg_pipeline import stages
+        resolve_paths(args, parser, ["ica"])
+        stages.run_before(args.ica, args.output, method=args.method, chunk_size=args.chunk_size,
+                          write_csv=args.write_csv)
+    elif args.command == "filter":
+        from eeg_pipeline import stages
+        resolve_paths(args, parser, ["ica"])
+        bands = FILTER_BANDS
+        if args.band:
+            bands = {band_name(band): tuple(band) for band in args.band}
+        stages.run_filter(args.ica, bands=bands, mode=args.mode, clean=args.clean, sfreq=args.fs, order=args.order,
+                          chunk_size=args.chunk_size, output_prefix=args.output)
+    elif args.command == "labels":
+        from eeg_pipeline import labels
+        resolve_paths(args, parser, ["root"])
+        first_epoch = args.first_epoch if args.first_epoch is not None else (1 if args.fs == 1024 else 0)
+        labels.run_labels(args.root, log_dir=args.log_dir, clean=args.clean, key=args.key, first_epoch=first_epoch,
+                          workers=args.workers, force=args.force)
+    elif args.command == "epoch":
+        from eeg_pipeline import stages
+        resolve_paths(args, parser, ["root", "raw", "ica"])
+        stages.run_epoch(args.root, args.raw, args.ica, clean=args.clean, sfreq=args.fs, write_csv=args.write_csv,
+                         stream=args.stream, chunk_size=args.chunk_size)
+    elif args.command == "baseline":
+        from eeg_pipeline import stages
+        resolve_paths(args, parser, ["root"])
+        stages.run_baseline(args.root, write_csv=args.write_csv, mode=args.baseline_mode,
+                            window=tuple(args.baseline_window))
+    elif args.command == "sort":
+        from eeg_pipeline import stages
+        resolve_paths(args, parser, ["root"])
+        stages.run_sort(args.root, clean=args.clean, sfreq=args.fs, write_csv=args.write_csv)
+    elif args.command == "colave":
+        from eeg_pipeline import stages
+        resolve_paths(args, parser, ["root"])
+        stages.run_colave(args.root, update=args.update)
+    elif args.command == "spectrum":
+        from eeg_pipeline import stages
+        resolve_paths(args, parser, ["root"])
+        stages.run_spectrum(args.root, window_length=args.window, overlap=args.overlap, nfft=args.nfft,
+                            quantity=args.quantity,
+                            baseline_window=None if args.no_baseline else tuple(args.baseline_window), fmax=args.fmax)
+    elif args.command == "multi":
+        from eeg_pipeline import multi
+        resolve_paths(args, parser, ["root", "raw", "ica"])
+        bands = FILTER_BANDS
+        if args.band:
+            bands = {band_name(band): tuple(band) for band in args.band}
+        if args.unfiltered:
+            bands = dict(bands, unfiltered=None)
+        condition_sets = args.conditions or (["clean"] if args.clean else list(multi.CONDITION_SETS))
+        multi.run_multi(args.root, args.raw, args.ica, bands=bands, condition_sets=condition_sets, sfreq=args.fs,
+                        order=args.order, baseline_mode=args.baseline_mode,
+                        baseline_window=tuple(args.baseline_window), workers=args.workers)
+    elif args.command == "ersp":
+        from eeg_pipeline import stages
+        resolve_paths(args, parser, ["root"])
+        freqs = np.arange(args.fmin, args.fmax + args.fstep / 2, args.fstep)
+        stages.run_ersp(args.root, freqs=freqs, n_cycles=args.cycles, baseline_window=tuple(args.baseline_window),
+                        decim=args.decim)
+    elif args.command == "stats":
+        from eeg_pipeline import stages
+        resolve_paths(args, parser, ["root"])
+        stages.run_stats(args.root, n_permutations=args.permutations, cluster_alpha=args.cluster_alpha,
+                         alpha=args.alpha, tail=args.tail, seed=args.seed, workers=args.workers)
+    elif args.command == "plot":
+        from eeg_pipeline import stages
+        resolve_paths(args, parser, ["root"])
+        if args.target == "epochs":
+            stages.run_epoch_plot(args.root, show_ttl=args.show_ttl, workers=args.plot_workers, dpi=args.dpi,
+                                  mode=args.mode, sort_by_label=args.sort_by_label, clean=args.clean)
+        else:
+            stages.run_result_plot(args.root, clean=args.clean, show_ttl=args.show_ttl)
+    elif args.command == "run-all":
+        from eeg_pipeline import stages
+        resolve_paths(args, parser, ["root", "raw", "ica"])
+        stages.run_all(args.root, args.raw, args.ica, clean=args.clean, sfreq=args.fs, write_csv=args.write_csv,
+                       epoch_plots=not args.no_epoch_plots, show_ttl=args.show_ttl, stream=args.stream,
+                       chunk_size=args.chunk_size, plot_workers=args.plot_workers, dpi=args.dpi,
+                       use_cache=not args.no_cache, force=args.force, fused=args.fused,
+                       write_intermediates=args.write_intermediates, baseline_mode=args.baseline_mode,
+                       baseline_window=tuple(args.baseline_window), trace=args.trace, profile=args.profile)
+    elif args.command == "batch":
+        from eeg_pipeline import batch
+        resolve_paths(args, parser, ["parent"])
+        summary = batch.run_batch(args.parent, workers=args.workers, clean=args.clean, raw_pattern=args.raw_pattern,
+                                  ica_pattern=args.ica_pattern, sfreq=args.fs, write_csv=args.write_csv,
+                                  epoch_plots=not args.no_epoch_plots, show_ttl=args.show_ttl, stream=args.stream,
+                                  chunk_size=args.chunk_size, plot_workers=args.plot_workers or 1, dpi=args.dpi,
+                                  use_cache=not args.no_cache, force=args.force, fused=args.fused,
+                                  write_intermediates=args.write_intermediates, baseline_mode=args.baseline_mode,
+                                  baseline_window=tuple(args.baseline_window), trace=args.trace,
+                                  profile=args.profile)
+        return int((summary.get("status") == "failed").any()) if len(summary) else 1
+    elif args.command == "group":
+        from eeg_pipeline import group, stages
+        resolve_paths(args, parser, ["parent"])
+        accumulators = group.run_group(args.parent, args.output, weighting=args.weighting, source=args.source,
+                                       update=args.update, clean=args.clean)
+        if accumulators is None:
+            return 1
+        if args.plot:
+            stages.run_result_plot(args.output or os.path.join(args.parent, group.GROUP_DIR), clean=args.clean,
+                                   show_ttl=args.show_ttl)
+    elif args.command == "realtime":
+        from eeg_pipeline import stages
+        resolve_paths(args, parser, ["root"] + (["raw", "ica"] if args.source == "replay" else []))
+        stages.run_realtime(args.root, args.raw, args.ica, clean=args.clean, sfreq=args.fs, source=args.source,
+                            host=args.host, port=args.port, block_size=args.block_size, realtime=args.realtime,
+                            speed=args.speed, baseline_window=tuple(args.baseline_window))
+    elif args.command == "serve":
+        from eeg_pipeline import realtime, stages
+        resolve_paths(args, parser, ["raw", "ica"])
+        source, _ = stages.replay_source(args.raw, args.ica, clean=args.clean, sfreq=args.fs,
+                                         block_size=args.block_size, realtime=args.realtime, speed=args.speed)
+        realtime.serve_replay(source, args.host, args.port)
+    elif args.command == "benchmark":
+        from eeg_pipeline import benchmark
+        scales = args.scale
+        if args.duration is not None:
+            scales = {f"{args.duration:g}s": {"duration": args.duration,
+                                               "n_ttls": args.ttls or max(int(args.duration // 4), 1)}}
+        benchmark.run_benchmark(args.output, scales=scales, sfreq=args.fs, n_channels=args.channels,
+                                error_rate=args.error_rate, repeat=args.repeat, bench_stages=args.stages,
+                                plot_workers=args.plot_workers, dpi=args.dpi, seed=args.seed, keep_data=args.keep_data,
+                                compare=args.compare)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
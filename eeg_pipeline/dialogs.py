@@ -0,0 +1,27 @@
+#######################################################################################################
+#  2026/10/18 作成
+#
+# 【概要】GUIによるファイル・ディレクトリ選択
+# tkinter は選択ダイアログを実際に表示するときにのみ読み込む。
+# コマンドライン（python -m eeg_pipeline）から実行する場合は tkinter を必要としない。
+#######################################################################################################
+
+
+# GUIを使ったディレクトリ選択関数
+def select_directory(prompt):
+    from tkinter import Tk
+    from tkinter.filedialog import askdirectory
+
+    print(prompt)
+    Tk().withdraw()
+    return askdirectory(title=prompt)
+
+
+# GUIを使ったファイル選択関数
+def select_file(prompt):
+    from tkinter import Tk
+    from tkinter.filedialog import askopenfilename
+
+    print(prompt)
+    Tk().withdraw()
+    return askopenfilename(title=prompt)
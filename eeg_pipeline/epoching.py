@@ -0,0 +1,114 @@
+#######################################################################################################
+#  2026/10/18 作成
+#
+# 【概要】エポック切り出しエンジン
+# TTL信号の時刻を時間軸上のサンプル番号に一括変換（searchsorted）し、
+# 全電極・全エポックを1回のインデックス参照で (電極, エポック, サンプル) の配列として切り出す。
+#
+# 【処理内容】
+# 1. find_nearest_indices: 各TTL時刻に最も近いサンプル番号をまとめて求める
+# 2. extract_epochs: ストライドビューから全エポックを一括で取り出す
+# 3. extract_epochs_resampled: 任意のサンプリング周波数のデータから、エポック範囲のみを
+#    1ms間隔の時間軸に補間して切り出す（連続データ全体を補間しない）
+#
+# 【注意】
+# - 時間軸は単調増加であること
+# - 切り出し範囲（-1000ms〜+2000ms）がデータ範囲外となるTTLは除外する
+#######################################################################################################
+
+from math import ceil
+
+import numpy as np
+
+# エポック範囲の初期設定 [サンプル]（1000Hzでは [ms] と同じ）
+EPOCH_START = -1000
+EPOCH_END = 2000
+
+
+# 各イベント時刻に最も近いサンプル番号を求める関数
+# tolerance を指定した場合、最近傍サンプルとの差がそれ未満のイベントのみ有効とする
+def find_nearest_indices(time_axis, event_times, tolerance=None):
+    time_axis = np.asarray(time_axis, dtype=float)
+    event_times = np.atleast_1d(np.asarray(event_times, dtype=float))
+
+    if len(time_axis) < 2:
+        raise ValueError("時間軸のサンプル数が不足しています。")
+
+    # 右隣のサンプルを二分探索で求め、左隣と比較して近い方を採用
+    right = np.clip(np.searchsorted(time_axis, event_times), 1, len(time_axis) - 1)
+    left = right - 1
+    use_left = (event_times - time_axis[left]) <= (time_axis[right] - event_times)
+    indices = np.where(use_left, left, right).astype(np.intp)
+
+    # 欠損値（NaN）や時間軸から大きく外れたイベントは無効とする
+    valid = np.isfinite(event_times)
+    if tolerance is not None:
+        valid &= np.abs(time_axis[indices] - event_times) < tolerance
+
+    return indices, valid
+
+
+# 全電極のエポックを一括で切り出す関数
+# data: (電極, サンプル) の配列
+# 戻り値: (電極, エポック, サンプル) の配列と、各TTLが採用されたかを示すマスク
+def extract_epochs(data, indices, epoch_start=EPOCH_START, epoch_end=EPOCH_END, valid=None):
+    data = np.asarray(data)
+    indices = np.asarray(indices, dtype=np.intp)
+    num_samples = epoch_end - epoch_start
+
+    # 切り出し範囲がデータ内に収まるTTLのみ採用
+    starts = indices + epoch_start
+    kept = (starts >= 0) & (starts + num_samples <= data.shape[-1])
+    if valid is not None:
+        kept &= np.asarray(valid, dtype=bool)
+
+    # 長さ num_samples の窓のストライドビューから、開始位置で一括取得
+    # （インデックス参照の結果はエポックが外側の並びになるため、保存時と同じ (電極, エポック, サンプル) 順に揃える）
+    windows = np.lib.stride_tricks.sliding_window_view(data, num_samples, axis=-1)
+    epochs = np.ascontiguousarray(windows[:, starts[kept], :])
+
+    return epochs, kept
+
+
+# 線形補間を全チャンネル一括で行う関数
+# time_axis: 元の時間軸, data: (チャンネル, サンプル), new_time: 補間先の時間（任意の形状）
+# 戻り値: (チャンネル, *new_time.shape) の配列
+def linear_interp(time_axis, data, new_time):
+    time_axis = np.asarray(time_axis, dtype=float)
+    idx = np.clip(np.searchsorted(time_axis, new_time, side="right") - 1, 0, len(time_axis) - 2)
+    weight = (new_time - time_axis[idx]) / (time_axis[idx + 1] - time_axis[idx])
+    return data[:, idx] * (1 - weight) + data[:, idx + 1] * weight
+
+
+# 各イベント時刻に最も近い格子点（時間軸の先頭から step 間隔）の番号を求める関数
+# 格子は np.arange(先頭の時刻, 最後の時刻, step) と同じ点（0_before_10.py の補間先と同じ）
+# 戻り値: 格子点の番号、有効なイベントのマスク、格子点の数
+def grid_event_indices(t0, t_last, event_times, step=1.0):
+    event_times = np.atleast_1d(np.asarray(event_times, dtype=float))
+    n_grid = int(ceil((t_last - t0) / step))
+
+    valid = np.isfinite(event_times)
+    indices = np.zeros(len(event_times), dtype=np.intp)
+    indices[valid] = np.clip(np.rint((event_times[valid] - t0) / step), 0, n_grid - 1)
+    # 格子の範囲外のイベントは、最近傍の格子点との差が step 以上になるため無効とする
+    valid &= np.abs(t0 + indices * step - event_times) < step
+
+    return indices, valid, n_grid
+
+
+# エポック範囲のみを step 間隔の時間軸に補間して切り出す関数
+# time_axis_ms: 元データの時間軸 [ms], data: (電極, サンプル)
+# 戻り値: (電極, エポック, サンプル) の配列と、各TTLが採用されたかを示すマスク
+def extract_epochs_resampled(data, time_axis_ms, event_times_ms, epoch_start=EPOCH_START, epoch_end=EPOCH_END,
+                             step=1.0):
+    time_axis_ms = np.asarray(time_axis_ms, dtype=float)
+    indices, valid, n_grid = grid_event_indices(time_axis_ms[0], time_axis_ms[-1], event_times_ms, step)
+
+    # 切り出し範囲が格子内に収まるTTLのみ採用
+    kept = valid & (indices + epoch_start >= 0) & (indices + epoch_end <= n_grid)
+
+    # (エポック, サンプル) の補間先の時刻をまとめて求め、1回の補間で全エポックを取得
+    epoch_times = time_axis_ms[0] + (indices[kept, None] + np.arange(epoch_start, epoch_end)) * step
+    epochs = linear_interp(time_axis_ms, np.asarray(data, dtype=float), epoch_times)
+
+    return epochs, kept
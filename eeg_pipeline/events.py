@@ -0,0 +1,135 @@
+#######################################################################################################
+#  2026/10/18 作成
+#
+# 【概要】TTL信号（イベント）の索引
+# 生データ（DAQ Master, .csv）から "Event Time" の列のみを読み込み、値のある行をTTLとして自動検出する
+# （セッションごとに TTL の行範囲（従来の iloc[5:61, 9]）を書き換える必要がない）。
+# 検出したTTLは、生データの行番号・時間軸上のサンプル番号（searchsorted）・エポック範囲がデータ内に収まるかの
+# 判定をまとめたイベント表にする。
+#
+# 【処理内容】
+# 1. read_event_times: "Event Time" の列のみを読み込み、数値の入っている行とその時刻 [ms] を返す
+# 2. load_event_times: 1. の結果を生データごとにキャッシュする（"{生データ名}_events.json"）
+# 3. index_events    : TTL時刻を時間軸上のサンプル番号に変換し、有効なTTLを判定したイベント表を作成
+# 4. load_event_table: 3. のイベント表を 2. と同じファイルにキャッシュする（TTL・時間軸・エポック範囲が同じ場合に再利用）
+#
+# 【注意】
+# - "Event Time" という列名がない場合は、10列目（列番号9）を使う
+# - キャッシュは生データのサイズと更新時刻が変わると作り直す
+# - 試行以外のイベント（計測開始の合図など）も値があればTTLとして検出する。エポック番号は検出したTTLの順番で
+#   付けるため、その場合は stages.TTL_ROWS で行範囲を指定する（ラベルの試行数と一致しない場合はエラー）
+#######################################################################################################
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from eeg_pipeline.epoching import EPOCH_START, EPOCH_END, find_nearest_indices
+
+# TTLの列の初期設定（列名, 列名がない場合の列番号）
+EVENT_COLUMN = "Event Time"
+EVENT_COLUMN_INDEX = 9
+
+# 生データの文字コード
+RAW_ENCODING = "windows-1252"
+
+# イベント表の列の型（キャッシュから読み込む場合に揃える）
+EVENT_TABLE_DTYPES = {"Row": np.intp, "Time [ms]": float, "Sample": np.intp, "Matched": bool, "Valid": bool}
+
+
+# 生データからTTLの列のみを読み込む関数
+# 戻り値: (TTLのある行の番号（ヘッダを除いた0始まり, 従来の iloc の行番号と同じ）, TTL時刻 [ms])
+def read_event_times(raw_data_file, column=EVENT_COLUMN):
+    header = pd.read_csv(raw_data_file, nrows=0, encoding=RAW_ENCODING).columns
+    name = column if column in header else header[EVENT_COLUMN_INDEX]
+    values = pd.read_csv(raw_data_file, usecols=[name], encoding=RAW_ENCODING)[name]
+
+    times = pd.to_numeric(values, errors="coerce").to_numpy(dtype=float)
+    rows = np.flatnonzero(np.isfinite(times))
+    return rows, times[rows] * 1000  # [s] → [ms]に変換
+
+
+# キャッシュの保存先
+def event_cache_path(raw_data_file):
+    return os.path.splitext(raw_data_file)[0] + "_events.json"
+
+
+# キャッシュを読み込む関数（ない場合は空の辞書）
+def read_event_cache(raw_data_file):
+    cache_path = event_cache_path(raw_data_file)
+    if not os.path.isfile(cache_path):
+        return {}
+    with open(cache_path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+# キャッシュを保存する関数（保存できない場合は警告のみ）
+def write_event_cache(raw_data_file, cache):
+    try:
+        with open(event_cache_path(raw_data_file), "w", encoding="utf-8") as f:
+            json.dump(cache, f, indent=1)
+    except OSError as e:
+        print(f"⚠ TTLの索引を保存できませんでした: {e}")
+
+
+# TTLの行と時刻を読み込む関数（生データごとにキャッシュする）
+# 戻り値: (TTLのある行の番号, TTL時刻 [ms])
+def load_event_times(raw_data_file, column=EVENT_COLUMN, use_cache=True):
+    stat = os.stat(raw_data_file)
+    source = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "column": column}
+
+    if use_cache:
+        cache = read_event_cache(raw_data_file)
+        if cache.get("source") == source:
+            return np.asarray(cache["rows"], dtype=np.intp), np.asarray(cache["times_ms"], dtype=float)
+
+    rows, times_ms = read_event_times(raw_data_file, column)
+    if len(rows):
+        print(f"TTL信号を {len(rows)} 個検出しました（{rows[0]}〜{rows[-1]}行目）。")
+    else:
+        print(f"⚠ {raw_data_file} の {column} 列にTTL信号が見つかりません。")
+    if use_cache:
+        write_event_cache(raw_data_file, {"source": source, "rows": rows.tolist(), "times_ms": times_ms.tolist()})
+    return rows, times_ms
+
+
+# TTL時刻を時間軸上のサンプル番号に変換し、イベント表を作成する関数
+# Matched: 時刻が数値で、最も近いサンプルとの差が tolerance 未満（指定時）
+# Valid  : Matched かつエポック範囲がデータ内に収まる（切り出すTTL）
+# 戻り値: 列 "Row", "Time [ms]", "Sample", "Matched", "Valid" の DataFrame（TTLの順）
+def index_events(event_times_ms, time_axis_ms, rows=None, epoch_start=EPOCH_START, epoch_end=EPOCH_END,
+                 tolerance=None):
+    event_times_ms = np.asarray(event_times_ms, dtype=float)
+    indices, valid = find_nearest_indices(time_axis_ms, event_times_ms, tolerance=tolerance)
+    in_bounds = (indices + epoch_start >= 0) & (indices + epoch_end <= len(time_axis_ms))
+    return pd.DataFrame({
+        "Row": np.arange(len(event_times_ms)) if rows is None else rows,
+        "Time [ms]": event_times_ms,
+        "Sample": indices,
+        "Matched": valid,
+        "Valid": valid & in_bounds,
+    })
+
+
+# イベント表を作成する関数（load_event_times と同じファイルにキャッシュする）
+# TTLの行・時刻、時間軸（サンプル数と先頭・末尾の時刻）、エポック範囲、tolerance が前回と同じ場合はキャッシュを使う
+# 戻り値: index_events と同じ列の DataFrame
+def load_event_table(raw_data_file, event_times_ms, time_axis_ms, rows, epoch_start=EPOCH_START, epoch_end=EPOCH_END,
+                     tolerance=None, use_cache=True):
+    time_axis_ms = np.asarray(time_axis_ms, dtype=float)
+    key = {"rows": np.asarray(rows).tolist(), "times_ms": np.asarray(event_times_ms, dtype=float).tolist(),
+           "axis": [len(time_axis_ms), float(time_axis_ms[0]), float(time_axis_ms[-1])],
+           "epoch": [int(epoch_start), int(epoch_end)], "tolerance": tolerance}
+
+    cache = read_event_cache(raw_data_file) if use_cache else {}
+    table = cache.get("table")
+    if table is not None and table["key"] == key:
+        return pd.DataFrame(table["columns"]).astype(EVENT_TABLE_DTYPES)
+
+    events = index_events(event_times_ms, time_axis_ms, rows, epoch_start, epoch_end, tolerance)
+    if use_cache and "source" in cache:
+        cache["table"] = {"key": key, "columns": {name: events[name].tolist() for name in events}}
+        write_event_cache(raw_data_file, cache)
+    return events
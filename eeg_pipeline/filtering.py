@@ -0,0 +1,79 @@
+#######################################################################################################
+#  2026/10/18 作成
+#
+# 【概要】連続データのバンドパスフィルタ（2-40Hz版 / 2-10Hz版などの帯域を選択）
+# 全チャンネルを (チャンネル, サンプル) の配列のまま、2次セクション（SOS）形式のバターワース型
+# バンドパスフィルタで処理する。複数の帯域をまとめて指定でき、データの読み込みは1回で済む。
+#
+# 【処理内容】
+# 1. design_bandpass: 帯域 (下限, 上限) [Hz] のSOS係数を作成
+# 2. FilterBank.process : チャンクごとの因果的フィルタ（チャンク間でフィルタの内部状態を引き継ぐ, ストリーミング用）
+# 3. FilterBank.filtfilt: 前後方向のゼロ位相フィルタ（オフライン用, 位相のずれがない）
+#
+# 【注意】
+# - scipy が必要
+# - 因果的フィルタはチャンクに分けても一括処理と同じ結果になるが、位相（潜時）がずれる
+# - ゼロ位相フィルタは記録全体を1回読み込んでから処理する（使用メモリは記録の長さに比例する）
+#######################################################################################################
+
+import numpy as np
+
+# フィルタの初期設定（帯域名: (下限, 上限) [Hz]）
+FILTER_BANDS = {"2-40Hz": (2.0, 40.0), "2-10Hz": (2.0, 10.0)}
+FILTER_ORDER = 4  # バターワースフィルタの次数（ゼロ位相フィルタでは実質2倍）
+FILTER_MODES = ("zero_phase", "causal")
+
+
+# scipy.signal を読み込む関数（scipy がない場合はインストール方法を示して終了する）
+def require_signal():
+    try:
+        from scipy import signal
+    except ImportError as e:
+        raise ImportError("バンドパスフィルタには scipy が必要です（pip install scipy）。") from e
+    return signal
+
+
+# 帯域の名前（例: (2.0, 10.0) → "2-10Hz"）
+def band_name(band):
+    return f"{band[0]:g}-{band[1]:g}Hz"
+
+
+# バンドパスフィルタのSOS係数を作成する関数
+def design_bandpass(band, sfreq, order=FILTER_ORDER):
+    signal = require_signal()
+    low, high = band
+    if not 0 < low < high < sfreq / 2:
+        raise ValueError(f"帯域 {band_name(band)} はサンプリング周波数 {sfreq}Hz に対して設定できません。")
+    return signal.butter(order, [low, high], btype="bandpass", fs=sfreq, output="sos")
+
+
+# 複数の帯域のバンドパスフィルタをまとめて適用するクラス
+# bands: {帯域名: (下限, 上限) [Hz]}
+class FilterBank:
+    def __init__(self, bands, sfreq, order=FILTER_ORDER):
+        self.signal = require_signal()
+        self.sos = {name: design_bandpass(band, sfreq, order) for name, band in bands.items()}
+        self.states = {}  # 帯域ごとのフィルタの内部状態 (セクション, チャンネル, 2)
+
+    # チャンク (チャンネル, サンプル) に因果的フィルタを適用し、{帯域名: フィルタ後のデータ} を返す
+    # 最初のチャンクでは、先頭のサンプルの値が続いていた場合の定常状態から始める（立ち上がりの過渡応答を抑える）
+    def process(self, data):
+        data = np.asarray(data, dtype=float)
+        filtered = {}
+        for name, sos in self.sos.items():
+            if name not in self.states:
+                if not data.shape[1]:
+                    filtered[name] = data.copy()
+                    continue
+                self.states[name] = self.signal.sosfilt_zi(sos)[:, None, :] * data[None, :, :1]
+            filtered[name], self.states[name] = self.signal.sosfilt(sos, data, axis=1, zi=self.states[name])
+        return filtered
+
+    # 記録全体 (チャンネル, サンプル) にゼロ位相フィルタを適用し、{帯域名: フィルタ後のデータ} を返す
+    def filtfilt(self, data):
+        data = np.asarray(data, dtype=float)
+        return {name: self.signal.sosfiltfilt(sos, data, axis=1) for name, sos in self.sos.items()}
+
+    # 内部状態を消去する（別の記録を処理する前に呼び出す）
+    def reset(self):
+        self.states = {}
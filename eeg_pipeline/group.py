@@ -0,0 +1,291 @@
+#######################################################################################################
+#  2026/10/18 作成
+#
+# 【概要】複数被験者の総加算平均（グランドアベレージ）
+# 親ディレクトリ以下のセッションを順に読み込み、各被験者のCorrect/Error試行と差分波形を
+# ディスク上（memmap）の集計値に1人ずつ加える。全被験者のデータを同時にメモリに載せることはない。
+#
+# 【処理内容】
+# 1. "calc/ave" または "calc/comp" を持つディレクトリをセッションとして検出
+# 2. 各セッションの波形を読み込む（*_accumulator → エポックデータ → 比較用CSV の順に探す）
+# 3. GroupAccumulator に重み付きで加える（weighting="subject": 被験者ごとに等しい重み,
+#    "trial": 試行数に比例した重み）
+# 4. 総加算平均と被験者間の標準誤差・信頼区間を保存
+#
+# 【出力先】
+# - 総加算平均: "{出力先}/calc/ave/{電極名}_{correct,error,difference}_ave.csv"
+# - 比較用CSV: "{出力先}/calc/comp/{電極名}/{電極名}_comp.csv"（5_plot.py で出力先をルートとしてプロットできる）
+# - 集計値: "{出力先}/calc/group/{correct,error,difference}_group.npy/.json"
+# - 被験者の一覧: "{出力先}/calc/group/subjects.csv"
+#
+# 【注意】
+# - 差分波形は被験者ごとに Error - Correct を求めてから集計する（被験者間の標準誤差は対応のある比較）
+# - weighting="trial" の差分波形の重みは n_error * n_correct / (n_error + n_correct)
+# - weighting="trial" には試行数が必要なため、比較用CSVしかないセッションは使えない
+#######################################################################################################
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+from numpy.lib.format import open_memmap
+
+from eeg_pipeline import stages
+from eeg_pipeline.accumulator import CONFIDENCE_LEVEL, Accumulator, has_accumulator, load_accumulator, t_quantile
+
+# 出力先の初期設定（親ディレクトリ以下）
+GROUP_DIR = "group"
+
+# 集計する波形と重み付けの方法
+CONDITIONS = ("correct", "error", "difference")
+WEIGHTINGS = ("subject", "trial")
+SOURCES = ("auto", "accumulator", "epochs", "comp")
+
+
+# 被験者ごとの波形を重み付きで逐次加えるクラス（West の重み付き Welford 法）
+# 平均と偏差平方和は memmap（"{パス}.npy"）上で更新し、重みの合計などはヘッダ（"{パス}.json"）に保存する
+# update=True で既存の集計値の電極・時間軸・重み付けが同じ場合は、その続きから加える
+class GroupAccumulator:
+    def __init__(self, path, electrodes, times, weighting="subject", update=False):
+        self.path = path
+        header = {"electrodes": list(electrodes), "times": np.asarray(times, dtype=float).tolist(),
+                  "weighting": weighting, "weight_sum": 0.0, "weight_sq_sum": 0.0, "subjects": []}
+        previous = self.load_header() if update else None
+        if previous is not None and all(previous[key] == header[key] for key in ("electrodes", "times", "weighting")):
+            self.header = previous
+            self.arrays = np.load(path + ".npy", mmap_mode="r+")
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self.header = header
+            self.arrays = open_memmap(path + ".npy", mode="w+", dtype=np.float64,
+                                      shape=(2, len(header["electrodes"]), len(header["times"])))
+        self.mean, self.m2 = self.arrays[0], self.arrays[1]
+
+    def load_header(self):
+        if not os.path.isfile(self.path + ".json") or not os.path.isfile(self.path + ".npy"):
+            return None
+        with open(self.path + ".json", encoding="utf-8") as f:
+            return json.load(f)
+
+    @property
+    def electrodes(self):
+        return self.header["electrodes"]
+
+    @property
+    def times(self):
+        return np.asarray(self.header["times"])
+
+    @property
+    def subjects(self):
+        return self.header["subjects"]
+
+    # 1被験者分の (電極, サンプル) の波形を加える
+    def add(self, subject, wave, weight=1.0):
+        weight_sum = self.header["weight_sum"] + weight
+        delta = wave - self.mean
+        self.mean += delta * (weight / weight_sum)
+        self.m2 += weight * delta * (wave - self.mean)
+        self.header["weight_sum"] = weight_sum
+        self.header["weight_sq_sum"] += weight ** 2
+        self.header["subjects"].append(subject)
+
+    # memmap の内容とヘッダを書き出す
+    def flush(self):
+        self.arrays.flush()
+        with open(self.path + ".json", "w", encoding="utf-8") as f:
+            json.dump(self.header, f, ensure_ascii=False, indent=1)
+
+    # 被験者間の分散（重みを信頼度として扱う不偏推定, 被験者が2人未満の場合は NaN）
+    @property
+    def variance(self):
+        weight_sum, weight_sq_sum = self.header["weight_sum"], self.header["weight_sq_sum"]
+        if len(self.subjects) < 2:
+            return np.full(self.mean.shape, np.nan)
+        return self.m2 / (weight_sum - weight_sq_sum / weight_sum)
+
+    # 総加算平均の標準誤差（被験者間）
+    @property
+    def sem(self):
+        weight_sum, weight_sq_sum = self.header["weight_sum"], self.header["weight_sq_sum"]
+        return np.sqrt(self.variance * weight_sq_sum) / weight_sum if weight_sum else np.full(self.mean.shape, np.nan)
+
+    def confidence_interval(self, level=CONFIDENCE_LEVEL):
+        margin = t_quantile(level, len(self.subjects) - 1) * self.sem
+        return self.mean - margin, self.mean + margin
+
+
+# 親ディレクトリ以下で、加算平均の結果（calc/ave または calc/comp）を持つセッションを検出する関数
+def discover_results(parent_dir, exclude=None):
+    exclude = os.path.abspath(exclude) if exclude else None
+    sessions = []
+    for dir_path, dir_names, _ in os.walk(parent_dir):
+        if exclude and os.path.abspath(dir_path) == exclude:
+            dir_names.clear()
+            continue
+        calc_dir = os.path.join(dir_path, "calc")
+        if os.path.isdir(os.path.join(calc_dir, "ave")) or os.path.isdir(os.path.join(calc_dir, "comp")):
+            sessions.append(dir_path)
+            dir_names.clear()  # セッション内部は探索しない
+        else:
+            dir_names.sort()
+    return sessions
+
+
+# 1セッション分の試行の種類ごとの (電極, 時間軸, 平均波形, 試行数) を読み込む関数
+# 試行数が分からない場合（比較用CSVのみ）は None
+def load_subject_waves(session_dir, source="auto"):
+    calc_dir = os.path.join(session_dir, "calc")
+    waves = {}
+    # ラベルの索引（または従来のエポックデータ）は Accumulator がない場合のみ読み込む
+    label_sets = {}
+    if source == "epochs" or (source == "auto" and not all(
+            has_accumulator(os.path.join(calc_dir, "ave", stages.ACCUMULATOR_NAME.format(label)))
+            for label in ("correct", "error"))):
+        label_sets = stages.load_label_sets(session_dir)
+    for label in ("correct", "error"):
+        accumulator_path = os.path.join(calc_dir, "ave", stages.ACCUMULATOR_NAME.format(label))
+        if source in ("auto", "accumulator") and has_accumulator(accumulator_path):
+            accumulator = load_accumulator(accumulator_path)
+        elif label in label_sets:
+            accumulator = Accumulator.from_epochs(label_sets[label])
+        else:
+            continue
+        waves[label] = (accumulator.electrodes, accumulator.times, accumulator.mean, accumulator.count)
+    if waves or source not in ("auto", "comp"):
+        return waves
+
+    # 比較用CSVから読み込む（試行数は分からない）
+    frames = {}
+    for electrode in stages.ELECTRODES:
+        file_path = os.path.join(calc_dir, "comp", electrode, f"{electrode}_comp.csv")
+        if os.path.isfile(file_path):
+            frames[electrode] = pd.read_csv(file_path)
+    if frames:
+        electrodes = list(frames)
+        times = next(iter(frames.values()))["Time [ms]"].to_numpy(dtype=float)
+        for label, column in [("correct", "Correct Average [μV]"), ("error", "Error Average [μV]")]:
+            mean = np.stack([frames[electrode][column].to_numpy(dtype=float) for electrode in electrodes])
+            waves[label] = (electrodes, times, mean, None)
+    return waves
+
+
+# 複数セッションの総加算平均を計算する関数
+# weighting: "subject"（被験者ごとに等しい重み）または "trial"（試行数に比例した重み）
+# source: 各セッションの読み込み元（"auto" は *_accumulator → エポックデータ → 比較用CSV の順に探す）
+# update=True の場合は、前回の集計値に含まれていないセッションのみを加える
+def run_group(parent_dir, output_dir=None, weighting="subject", source="auto", update=False, clean=False,
+              level=CONFIDENCE_LEVEL):
+    if weighting not in WEIGHTINGS:
+        raise ValueError(f"重み付けの方法は {WEIGHTINGS} のいずれかを指定してください: {weighting}")
+    if source not in SOURCES:
+        raise ValueError(f"読み込み元は {SOURCES} のいずれかを指定してください: {source}")
+    output_dir = output_dir or os.path.join(parent_dir, GROUP_DIR)
+    group_dir = os.path.join(output_dir, "calc", "group")
+    sessions = discover_results(parent_dir, exclude=output_dir)
+    if not sessions:
+        print(f"{parent_dir} 以下に加算平均の結果（calc/ave, calc/comp）が見つかりませんでした。")
+        return None
+    print(f"{len(sessions)} セッションを集計します（重み付け: {weighting}）。")
+
+    conditions = ("correct",) if clean else CONDITIONS
+    accumulators = {}
+    rows = []
+    for session_dir in sessions:
+        subject = os.path.relpath(session_dir, parent_dir)
+        waves = load_subject_waves(session_dir, source)
+        if "correct" not in waves or (not clean and "error" not in waves):
+            print(f"⚠ {subject}: 加算平均の結果が揃っていないため除外しました。")
+            continue
+        electrodes, times, correct_mean, n_correct = waves["correct"]
+        _, _, error_mean, n_error = waves.get("error", (None, None, None, None))
+        if weighting == "trial" and (n_correct is None or (not clean and n_error is None)):
+            print(f"⚠ {subject}: 試行数が分からない（比較用CSVのみ）ため除外しました。")
+            continue
+
+        subject_waves = {"correct": (correct_mean, n_correct)}
+        if not clean:
+            subject_waves["error"] = (error_mean, n_error)
+            difference_weight = n_error * n_correct / (n_error + n_correct) if weighting == "trial" else None
+            subject_waves["difference"] = (np.asarray(error_mean) - np.asarray(correct_mean), difference_weight)
+
+        # 最初のセッションの電極・時間軸で集計値を作成する
+        if not accumulators:
+            accumulators = {condition: GroupAccumulator(os.path.join(group_dir, f"{condition}_group"), electrodes,
+                                                        times, weighting, update)
+                            for condition in conditions}
+        reference = accumulators["correct"]
+        if (list(electrodes) != reference.electrodes or len(times) != len(reference.times)
+                or not np.allclose(times, reference.times)):
+            print(f"⚠ {subject}: 電極または時間軸が他のセッションと異なるため除外しました。")
+            continue
+        if subject in reference.subjects:
+            print(f"{subject}: 集計済みのため省略しました。")
+            continue
+
+        for condition in conditions:
+            wave, weight = subject_waves[condition]
+            accumulators[condition].add(subject, np.asarray(wave, dtype=float),
+                                        1.0 if weighting == "subject" else float(weight))
+        rows.append({"Subject": subject, "Correct Trials": n_correct, "Error Trials": n_error})
+        print(f"✅ {subject} を集計しました。")
+
+    if not accumulators or not accumulators["correct"].subjects:
+        print("集計できるセッションがありませんでした。")
+        return None
+    for accumulator in accumulators.values():
+        accumulator.flush()
+
+    write_group_averages(output_dir, accumulators, level)
+
+    # 被験者の一覧（update=True の場合は前回の一覧に追加する）
+    subjects_path = os.path.join(group_dir, "subjects.csv")
+    subjects = pd.DataFrame(rows, columns=["Subject", "Correct Trials", "Error Trials"])
+    if update and os.path.isfile(subjects_path):
+        previous = pd.read_csv(subjects_path)
+        subjects = pd.concat([previous[previous["Subject"].isin(accumulators["correct"].subjects)], subjects])
+    subjects.to_csv(subjects_path, index=False, encoding='utf-8-sig')
+    print(f"🎉 {len(accumulators['correct'].subjects)} 人の総加算平均を {output_dir} に保存しました。")
+    return accumulators
+
+
+# 総加算平均（calc/ave）と比較用CSV（calc/comp）を保存する関数
+def write_group_averages(output_dir, accumulators, level=CONFIDENCE_LEVEL):
+    ave_output_dir = os.path.join(output_dir, "calc", "ave")
+    comp_output_dir = os.path.join(output_dir, "calc", "comp")
+    os.makedirs(ave_output_dir, exist_ok=True)
+
+    reference = accumulators["correct"]
+    time_index = pd.Index(reference.times, name="Time [ms]")
+    for condition, accumulator in accumulators.items():
+        for i, electrode in enumerate(accumulator.electrodes):
+            output_file = os.path.join(ave_output_dir, f"{electrode}_{condition}_ave.csv")
+            pd.Series(accumulator.mean[i], index=time_index).to_csv(
+                output_file, header=["Amplitude [μV]"], index_label="Time [ms]", encoding='utf-8-sig')
+
+    if "error" not in accumulators:
+        print("Error試行がないため、比較用CSVは作成しませんでした。")
+        return
+
+    # 比較用CSV（各セッションの calc/comp と同じ列名, 標準誤差と信頼区間は被験者間）
+    columns = {"correct": "Correct", "error": "Error", "difference": "Difference"}
+    intervals = {condition: accumulators[condition].confidence_interval(level) for condition in columns}
+    for i, electrode in enumerate(reference.electrodes):
+        combined_data = pd.DataFrame({
+            "Time [ms]": time_index,
+            "Error Average [μV]": accumulators["error"].mean[i],
+            "Correct Average [μV]": accumulators["correct"].mean[i],
+            "Difference [μV]": accumulators["difference"].mean[i],
+        })
+        for condition, name in columns.items():
+            lower, upper = intervals[condition]
+            combined_data[f"{name} SEM [μV]"] = accumulators[condition].sem[i]
+            combined_data[f"{name} CI Lower [μV]"] = lower[i]
+            combined_data[f"{name} CI Upper [μV]"] = upper[i]
+        combined_data["Subjects"] = len(reference.subjects)
+
+        output_dir_electrode = os.path.join(comp_output_dir, electrode)
+        os.makedirs(output_dir_electrode, exist_ok=True)
+        output_file = os.path.join(output_dir_electrode, f"{electrode}_comp.csv")
+        combined_data.to_csv(output_file, index=False, encoding='utf-8-sig')
+        print(f"{electrode} の総加算平均の比較用CSVを保存しました: {output_file}")
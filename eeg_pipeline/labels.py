@@ -0,0 +1,223 @@
+#######################################################################################################
+#  2026/10/18 作成
+#
+# 【概要】ロボット迷路課題（bigmaze）のログ（.pkl）からラベル表（combined_data.csv）を作成
+# pkl_read.py のようにログをテキストに書き出して手作業で combined_data.csv を作る代わりに、
+# ログディレクトリ内の .pkl をプロセスプールで並列に読み込み、試行ごとのエラーの有無を
+# 型付きの列（Epoch: int, ErrP: int8, ...）の表に直接まとめる。
+#
+# 【処理内容】
+# 1. trial_records: pickle の内容（試行の辞書のリスト, 列ごとのリストの辞書, 1試行の辞書, DataFrame, 0/1 のリスト）を
+#    試行ごとの記録のリストにそろえる
+# 2. read_log     : 1つの .pkl から試行ごとのエラーの有無を取り出す（別プロセスで実行）
+# 3. run_labels   : ファイル名順に試行を並べてエポック番号を付け、ラベル表を保存する
+#
+# 【出力先】
+# - "{ルート}/log/pkl_analysis/combined_data.csv"（エラーなしセッションは pkl_analysis_noerror）
+# - 型付きの表: 同じディレクトリの "labels.npz"（pyarrow がある場合は "labels.parquet" も）
+# - キャッシュ: 同じディレクトリの "label_cache.json"（.pkl ごとのサイズ・更新時刻と読み込み結果）
+#
+# 【注意】
+# - エラーの有無の項目は ERROR_KEYS の順に探す（大文字・小文字は区別しない）。key で指定も可
+#   （key を指定した場合はその項目のみを探し、見つからない .pkl は ERROR_KEYS を使わずに省略する）
+# - エラーの有無の項目がない .pkl（地図・設定など）は省略する
+# - 試行ごとのログ（例: 2024_12_18_15_32_24_1_A_A.pkl, {"ErrP": 1, "map": [...], ...}）は1ファイル1試行とする
+# - エラーの有無の値は真偽値・0/1 の数値・"0"/"1"/"True"/"False" の文字列のみ受け付ける（それ以外は ValueError）
+# - combined_data.csv が labels で作成したものでない（手作業で作成・編集した）場合は上書きしない。
+#   force=True（--force）の場合は "combined_data.csv.{日時}.bak" に退避してから作成する
+# - サイズと更新時刻が前回と同じ .pkl は読み込まない（すべて同じ場合はラベル表も作り直さない）
+#######################################################################################################
+
+import json
+import os
+import pickle
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from eeg_pipeline.stages import label_file_path
+
+# エラーの有無を表す項目名の候補（先に見つかったものを使う）
+ERROR_KEYS = ("ErrP", "error", "is_error", "err", "mistake", "failure")
+
+# 試行の記録のリストが入っている項目名の候補（pickle の内容が辞書の場合）
+TRIAL_KEYS = ("trials", "trial", "log", "logs", "records", "data")
+
+# エラーの有無の値として受け付ける文字列（大文字・小文字は区別しない）
+FLAG_STRINGS = {"0": 0, "1": 1, "false": 0, "true": 1}
+
+# ラベル表・キャッシュのファイル名（combined_data.csv と同じディレクトリ）
+LABEL_TABLE = "labels"
+LABEL_CACHE = "label_cache.json"
+
+
+# 辞書のキーから候補の項目名を探す関数（大文字・小文字は区別しない）
+def find_key(keys, candidates):
+    lower = {str(key).lower(): key for key in keys}
+    for candidate in candidates:
+        if candidate.lower() in lower:
+            return lower[candidate.lower()]
+    return None
+
+
+# エラーの有無の項目名を探す関数（key を指定した場合はその項目のみ, 省略時は ERROR_KEYS の順）
+def find_error_key(keys, key=None):
+    return find_key(keys, ERROR_KEYS if key is None else (key,))
+
+
+# エラーの有無の値を 0/1 に変換する関数
+# 真偽値・0/1 の数値・FLAG_STRINGS の文字列のみ受け付け、それ以外（None, 2, "yes" など）は ValueError
+def parse_flag(value):
+    if isinstance(value, (bool, np.bool_)):
+        return int(value)
+    if isinstance(value, (int, float, np.integer, np.floating)) and value in (0, 1):
+        return int(value)
+    if isinstance(value, str) and value.strip().lower() in FLAG_STRINGS:
+        return FLAG_STRINGS[value.strip().lower()]
+    raise ValueError(f"エラーの有無の値 {value!r} を 0/1 として解釈できません。")
+
+
+# pickle の内容を試行ごとの記録のリストにそろえる関数
+# 戻り値: 辞書のリスト、または 0/1 の値のリスト（試行の記録として解釈できない場合は None）
+def trial_records(data, key=None):
+    if isinstance(data, pd.DataFrame):
+        return data.to_dict("records")
+    if isinstance(data, dict):
+        error_key = find_error_key(data.keys(), key)
+        if error_key is not None:
+            # 列ごとのリストの辞書（{"error": [0, 1, ...], ...}）
+            if isinstance(data[error_key], (list, tuple, np.ndarray)):
+                return [{error_key: value} for value in data[error_key]]
+            # 1試行の記録（試行ごとのログ, {"ErrP": 1, "map": [...], ...}）
+            return [data]
+        # 試行の記録のリストを含む辞書（{"trials": [...], ...}）
+        trial_key = find_key(data.keys(), TRIAL_KEYS)
+        return None if trial_key is None else trial_records(data[trial_key], key)
+    if isinstance(data, (list, tuple)) and data:
+        if all(isinstance(item, dict) for item in data):
+            return list(data)
+        if all(isinstance(item, (bool, int, np.bool_, np.integer)) for item in data):
+            return list(data)
+    return None
+
+
+# 1つの .pkl から試行ごとのエラーの有無を取り出す関数（別プロセスで実行）
+# 戻り値: {"file", "key", "errp": [0/1, ...]}（エラーの有無の項目がない場合は "errp" が None）
+def read_log(pkl_path, key=None):
+    with open(pkl_path, "rb") as f:
+        records = trial_records(pickle.load(f), key)
+
+    result = {"file": os.path.basename(pkl_path), "key": None, "errp": None}
+    if not records:
+        return result
+    try:
+        if not isinstance(records[0], dict):
+            result.update(key="(list)", errp=[parse_flag(value) for value in records])
+            return result
+
+        error_key = find_error_key(records[0].keys(), key)
+        if error_key is not None:
+            result.update(key=str(error_key), errp=[parse_flag(record.get(error_key)) for record in records])
+    except ValueError as error:
+        raise ValueError(f"{pkl_path}: {error}") from error
+    return result
+
+
+# ファイルのサイズと更新時刻（キャッシュとの比較用）
+def file_stat(path):
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+# ラベル表を保存する関数（CSV と型付きの npz, pyarrow がある場合は Parquet も）
+def save_label_table(table, output_dir):
+    os.makedirs(output_dir, exist_ok=True)
+    table.to_csv(os.path.join(output_dir, "combined_data.csv"), index=False)
+    # 文字列の列は固定長の文字列型にする（allow_pickle なしで読み込めるように）
+    arrays = {column: table[column].to_numpy() for column in table}
+    arrays = {column: array.astype(str) if array.dtype == object else array for column, array in arrays.items()}
+    np.savez(os.path.join(output_dir, LABEL_TABLE + ".npz"), **arrays)
+    try:
+        table.to_parquet(os.path.join(output_dir, LABEL_TABLE + ".parquet"), index=False)
+    except ImportError:
+        pass
+
+
+# ログディレクトリの .pkl からラベル表（Epoch, ErrP, File, Trial）を作成する関数
+# log_dir: .pkl のディレクトリ（省略時は "{ルート}/log"）, first_epoch: 最初の試行のエポック番号
+# （1000Hz版は0, 1024Hz版は1, エポックデータのエポック番号と同じ）, workers=1 の場合は逐次読み込む
+def run_labels(root_dir, log_dir=None, clean=False, key=None, first_epoch=0, workers=None, force=False):
+    start = time.perf_counter()
+    log_dir = log_dir or os.path.join(root_dir, "log")
+    label_path = label_file_path(root_dir, clean)
+    output_dir = os.path.dirname(label_path)
+    cache_path = os.path.join(output_dir, LABEL_CACHE)
+
+    pkl_files = sorted(f for f in os.listdir(log_dir) if f.endswith(".pkl"))
+    if not pkl_files:
+        raise FileNotFoundError(f"{log_dir} に .pkl ファイルが見つかりません。")
+
+    # サイズと更新時刻が前回と同じ .pkl は、キャッシュの読み込み結果を使う（force=True の場合はすべて読み込む）
+    cache = {}
+    if os.path.isfile(cache_path):
+        with open(cache_path, encoding="utf-8") as f:
+            cache = json.load(f)
+    params = {"key": key, "first_epoch": first_epoch}
+    stats = {pkl_file: file_stat(os.path.join(log_dir, pkl_file)) for pkl_file in pkl_files}
+    entries = cache.get("files", {}) if cache.get("params") == params and not force else {}
+    changed = [f for f in pkl_files if f not in entries or entries[f]["stat"] != stats[f]]
+
+    # 既存の combined_data.csv が前回 labels で保存したものと同じかどうか（サイズと更新時刻で判定）
+    generated = os.path.isfile(label_path) and cache.get("table") == file_stat(label_path)
+    if not changed and set(entries) == set(pkl_files) and generated:
+        print(f"✅ ログは前回から変更されていないため、{label_path} をそのまま使います。")
+        return pd.read_csv(label_path)
+
+    # 手作業で作成・編集した combined_data.csv は、force=True の場合のみ（保存の直前に退避して）作り直す
+    if os.path.isfile(label_path) and not generated and not force:
+        raise FileExistsError(f"{label_path} は labels で作成したものではないため上書きしません"
+                              f"（退避して作り直す場合は --force を指定してください）。")
+
+    # 変更された .pkl のみを並列に読み込む
+    paths = [os.path.join(log_dir, f) for f in changed]
+    if workers == 1:
+        results = [read_log(path, key) for path in paths]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(read_log, paths, [key] * len(paths)))
+    entries = {f: entries[f] for f in pkl_files if f in entries and f not in changed}
+    for pkl_file, result in zip(changed, results):
+        entries[pkl_file] = {"stat": stats[pkl_file], "key": result["key"], "errp": result["errp"]}
+
+    # ファイル名順に試行を並べ、エポック番号を付ける
+    files, trials, errp = [], [], []
+    for pkl_file in pkl_files:
+        entry = entries[pkl_file]
+        if entry["errp"] is None:
+            print(f"⚠ {pkl_file} にエラーの有無の項目が見つからないため省略します。")
+            continue
+        files.extend([pkl_file] * len(entry["errp"]))
+        trials.extend(range(len(entry["errp"])))
+        errp.extend(entry["errp"])
+    if not errp:
+        raise ValueError(f"{log_dir} の .pkl からエラーの有無を取り出せませんでした（項目名は key で指定できます）。")
+
+    table = pd.DataFrame({
+        "Epoch": np.arange(first_epoch, first_epoch + len(errp), dtype=np.int64),
+        "ErrP": np.asarray(errp, dtype=np.int8),
+        "File": files,
+        "Trial": np.asarray(trials, dtype=np.int64),
+    })
+    if os.path.isfile(label_path) and not generated:
+        backup_path = f"{label_path}.{time.strftime('%Y%m%d_%H%M%S')}.bak"
+        os.replace(label_path, backup_path)
+        print(f"⚠ 既存の {label_path} を {backup_path} に退避しました。")
+    save_label_table(table, output_dir)
+    with open(cache_path, "w", encoding="utf-8") as f:
+        json.dump({"params": params, "files": entries, "table": file_stat(label_path)}, f, ensure_ascii=False, indent=1)
+
+    print(f"✅ {len(changed)} 個の .pkl を読み込み、{len(table)} 試行（Error {int(table['ErrP'].sum())} 試行）の"
+          f"ラベル表を {label_path} に保存しました（{time.perf_counter() - start:.2f}秒）。")
+    return table
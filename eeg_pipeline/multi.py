@@ -0,0 +1,194 @@
+#######################################################################################################
+#  2026/10/18 作成
+#
+# 【概要】複数のフィルタ帯域 × 複数の条件セットの一括解析
+# 2-40Hz版と2-10Hz版、エラーありセッションとエラーなし（clean）の出力を作るために、同じ生データと
+# ICA処理済みデータを何度も読み込まないよう、セッションを1回だけ読み込み、帯域ごとの分岐を
+# プロセスプールで並列に実行する。
+#
+# 【処理内容】
+# 1. load_session: TTL時刻と全電極の連続データ (電極, サンプル) を読み込む（1回のみ, 条件セットごとの列をまとめて読み込む）
+# 2. run_branch  : 1帯域分の処理（ゼロ位相フィルタ → エポック切り出し → ベースライン補正
+#                  → 条件セットごとに電極の列を選んでベースライン補正し、Correct/Error 試行を加算平均）
+# 3. run_multi   : 帯域ごとの分岐を並列に実行し、処理時間の一覧を表示する
+#
+# 【出力先】
+# - "{ルート}/calc/multi/{帯域名}/{条件セット}/ave, comp"（calc/ave, calc/comp と同じ形式）
+# - ベースライン値: "{ルート}/calc/multi/{帯域名}/{条件セット}/baseline/baseline_values.csv"
+#
+# 【注意】
+# - 条件セット "error" は log/pkl_analysis、"clean" は log/pkl_analysis_noerror のラベルを使う
+#   （ラベルファイルがない条件セットは省略する）
+# - 1000HzのICA処理済みデータ（CSV）では、"error" は stages.ICA_COLUMNS、"clean" は stages.ICA_COLUMNS_CLEAN の列を
+#   電極として使う（run-all / run-all --clean と同じ結果）。列名のあるデータ（1024Hz, 1ms間隔の連続データ）は共通
+# - 帯域に None を指定するとフィルタをかけない（従来の解析と同じ結果）
+# - フィルタは切り出し前の連続データ全体にかける（エポックの端の過渡応答を避けるため）
+#######################################################################################################
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from eeg_pipeline import stages
+from eeg_pipeline.baseline import BASELINE_WINDOW
+from eeg_pipeline.epoching import EPOCH_START, EPOCH_END, extract_epochs, extract_epochs_resampled
+from eeg_pipeline.events import load_event_table
+from eeg_pipeline.filtering import FILTER_BANDS, FILTER_ORDER, FilterBank
+from eeg_pipeline.profiling import count
+from eeg_pipeline.store import EpochSet, continuous_path, load_continuous
+
+# 条件セットの初期設定（条件セット名: clean の指定, stages.load_label_groups・電極の列番号を参照）
+CONDITION_SETS = {"error": False, "clean": True}
+
+# 出力先（calc 以下）
+MULTI_DIR = "multi"
+
+# プロセスプールの各プロセスで共有するセッションのデータ（initializer で設定）
+_shared = {}
+
+
+# セッションの生データとICA処理済みデータを読み込む関数
+# condition_sets: 条件セット名のリスト（1000HzのCSVでは、条件セットごとの電極の列をまとめて読み込む）
+# 戻り値: {"ttl": TTL時刻 [ms], "ttl_rows": TTLの行番号, "events": イベント表（native の場合は None）,
+#          "data": (列, サンプル), "layouts": {条件セット名: ELECTRODES の順の data の行番号},
+#          "times": 時間軸 [ms], "sfreq": データのサンプリング周波数,
+#          "native": 1ms間隔でない（エポック範囲のみ補間する）, "first_id", "meta"}
+def load_session(raw_data_file, ica_data_file, condition_sets=tuple(CONDITION_SETS), sfreq=1000):
+    store_path = continuous_path(ica_data_file)
+    ttl_rows, ttl_times_ms = stages.load_ttl_events(raw_data_file)
+
+    if store_path is not None:
+        # 0_before_10.py / filter の出力（1ms間隔の連続データ）
+        continuous_set = load_continuous(store_path)
+        rows = [continuous_set.channels.index(electrode) for electrode in stages.ELECTRODES]
+        data = np.asarray(continuous_set.data[rows])
+        times, data_sfreq = continuous_set.times_ms, continuous_set.sfreq
+        layouts = {condition_set: tuple(range(len(rows))) for condition_set in condition_sets}
+    elif sfreq == 1024:
+        # 1列目: Time [s], 2列目以降: 各電極（ヘッダあり）
+        ica_data = pd.read_csv(ica_data_file, header=0)
+        times = np.round(ica_data.iloc[:, 0].to_numpy(dtype=float) * 1000, decimals=6)
+        data = ica_data[stages.ELECTRODES].to_numpy(dtype=float).T
+        data_sfreq = 1000 / float(np.median(np.diff(times[:1000])))
+        layouts = {condition_set: tuple(range(len(stages.ELECTRODES))) for condition_set in condition_sets}
+    else:
+        # 1行目 = 1[ms], 2行目 = 2[ms], ... の時間軸（ヘッダなし）
+        # 条件セットごとの電極の列番号（エラーあり: ICA_COLUMNS, エラーなし: ICA_COLUMNS_CLEAN）
+        set_columns = {}
+        for condition_set in condition_sets:
+            columns = stages.ICA_COLUMNS_CLEAN if CONDITION_SETS[condition_set] else stages.ICA_COLUMNS
+            set_columns[condition_set] = [columns[electrode] for electrode in stages.ELECTRODES]
+        used_columns = sorted({column for columns in set_columns.values() for column in columns})
+        ica_data = pd.read_csv(ica_data_file, header=None, usecols=used_columns)
+        data = ica_data[used_columns].to_numpy(dtype=float).T
+        layouts = {condition_set: tuple(used_columns.index(column) for column in columns)
+                   for condition_set, columns in set_columns.items()}
+        times, data_sfreq = np.arange(1, data.shape[1] + 1, dtype=float), 1000.0
+    count(samples=data.shape[1])
+    print("✅ 生データとICA処理済みデータが正常に読み込まれました。")
+
+    if sfreq == 1024:
+        ttl_times_ms = np.round(ttl_times_ms, decimals=6)
+        first_id, meta = 1, {"column_format": "Epoch {}", "time_column": "Time [ms]"}
+    else:
+        ttl_times_ms = np.round(ttl_times_ms)
+        first_id, meta = 0, {"column_format": "{}", "time_column": "TIME"}
+    # 1000Hzデータ（CSV）の時間軸は行番号のため、最も近いサンプルとの差を制限しない
+    # イベント表は全帯域で共通のため、ここで1回だけ作成する
+    tolerance = None if sfreq == 1000 and store_path is None else 1
+    native = not np.isclose(data_sfreq, 1000.0)
+    events = None if native else load_event_table(raw_data_file, ttl_times_ms, times, ttl_rows, tolerance=tolerance)
+    return {"ttl": ttl_times_ms, "ttl_rows": ttl_rows, "events": events, "data": np.ascontiguousarray(data),
+            "layouts": layouts, "times": times, "sfreq": data_sfreq, "native": native, "first_id": first_id, "meta": meta}
+
+
+# プロセスプールの各プロセスにセッションのデータを設定する関数
+def init_shared(session, root_dir, label_groups, order, baseline_mode, baseline_window):
+    _shared.update(session=session, root_dir=root_dir, label_groups=label_groups, order=order,
+                   baseline_mode=baseline_mode, baseline_window=baseline_window)
+
+
+# 1帯域分の処理（別プロセスで実行）
+# エポックは全列まとめて切り出し、条件セットごとの電極の列を選んでベースライン補正する（同じ列の条件セットは1回のみ）
+# 戻り値: {"band", 条件セットごとの試行数, "time [s]"}
+def run_branch(name, band):
+    session, root_dir = _shared["session"], _shared["root_dir"]
+    start = time.perf_counter()
+    band_dir = os.path.join(root_dir, "calc", MULTI_DIR, name)
+
+    data = session["data"]
+    if band is not None:
+        data = FilterBank({name: band}, session["sfreq"], _shared["order"]).filtfilt(data)[name]
+
+    if session["native"]:
+        epochs, kept = extract_epochs_resampled(data, session["times"], session["ttl"], EPOCH_START, EPOCH_END)
+    else:
+        events = session["events"]
+        epochs, kept = extract_epochs(data, events["Sample"].to_numpy(), EPOCH_START, EPOCH_END,
+                                      valid=events["Valid"].to_numpy())
+    # エポック番号はTTLの順番から付ける（stages.extract_epoch_set と同じ）
+    epoch_ids = session["first_id"] + np.flatnonzero(kept)
+    meta = dict(session["meta"], band=None if band is None else list(band),
+                ttl_rows=session["ttl_rows"][kept].tolist())
+
+    result = {"band": name}
+    corrected = {}
+    for condition_set, groups in _shared["label_groups"].items():
+        layout = session["layouts"][condition_set]
+        if layout not in corrected:
+            epoch_set = EpochSet(epochs[list(layout)], stages.ELECTRODES, np.arange(EPOCH_START, EPOCH_END), 1000,
+                                 epoch_ids=epoch_ids, meta=meta)
+            corrected[layout] = stages.baseline_correct(epoch_set, _shared["baseline_mode"],
+                                                        _shared["baseline_window"], inplace=True)
+        corrected_set, table = corrected[layout]
+        stages.save_baseline_values(os.path.join(band_dir, condition_set, "baseline"), table)
+        label_sets = {label: corrected_set.view(label_ids) for label, label_ids in groups.items()}
+        stages.write_averages(root_dir, stages.compute_accumulators(label_sets),
+                              output_dir=os.path.join(band_dir, condition_set))
+        for label, label_set in label_sets.items():
+            result[f"{condition_set} {label}"] = label_set.n_epochs
+    result["time [s]"] = round(time.perf_counter() - start, 2)
+    return result
+
+
+# 複数の帯域 × 条件セットの一括解析
+# bands: {帯域名: (下限, 上限) [Hz] または None（フィルタなし）}, condition_sets: 条件セット名のリスト
+# 電極の列は条件セットごとに選ぶ（"clean" は run-all --clean と同じ ICA_COLUMNS_CLEAN）
+# workers=1 の場合はプロセスプールを使わずに順に実行する
+def run_multi(root_dir, raw_data_file, ica_data_file, bands=FILTER_BANDS, condition_sets=tuple(CONDITION_SETS),
+              sfreq=1000, order=FILTER_ORDER, baseline_mode="electrode",
+              baseline_window=BASELINE_WINDOW, workers=None):
+    start_time = time.perf_counter()
+
+    # 条件セットごとのラベル（ラベルファイルがない条件セットは省略）
+    label_groups = {}
+    for condition_set in condition_sets:
+        label_path = stages.label_file_path(root_dir, CONDITION_SETS[condition_set])
+        if not os.path.isfile(label_path):
+            print(f"⚠ {label_path} が見つからないため、条件セット {condition_set} を省略します。")
+            continue
+        label_groups[condition_set] = stages.load_label_groups(root_dir, CONDITION_SETS[condition_set])
+    if not label_groups:
+        raise FileNotFoundError(f"{root_dir}/log に combined_data.csv が見つかりません。")
+
+    session = load_session(raw_data_file, ica_data_file, condition_sets=tuple(label_groups), sfreq=sfreq)
+    for condition_set in label_groups:
+        stages.check_ttl_count(session["ttl_rows"], stages.label_file_path(root_dir, CONDITION_SETS[condition_set]))
+    print(f"▶ {len(bands)} 帯域 × {len(label_groups)} 条件セットの解析を開始します。")
+
+    shared = (session, root_dir, label_groups, order, baseline_mode, baseline_window)
+    if workers == 1:
+        init_shared(*shared)
+        results = [run_branch(name, band) for name, band in bands.items()]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_shared, initargs=shared) as executor:
+            results = list(executor.map(run_branch, bands.keys(), bands.values()))
+
+    summary = pd.DataFrame(results)
+    count(epochs=sum(result[column] for result in results for column in result if column not in ("band", "time [s]")))
+    print("\n" + summary.to_string(index=False))
+    print(f"🎉 すべての帯域の解析が完了しました（{time.perf_counter() - start_time:.1f}秒）。")
+    return summary
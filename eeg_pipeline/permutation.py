@@ -0,0 +1,174 @@
+#######################################################################################################
+#  2026/10/18 作成
+#
+# 【概要】クラスタベースの置換検定（Error試行 vs Correct試行）
+# (電極, エポック, サンプル) の配列に対して、試行のラベルを入れ替えた置換を多数作り、各置換の t 値を
+# 行列演算でまとめて計算する。閾値を超えた (電極 × 時間) の隣接点をクラスタとし、クラスタ内の
+# t 値の合計（クラスタ質量）の最大値の分布から、観測されたクラスタの p 値を求める。
+#
+# 【処理内容】
+# 1. t_values      : 置換ごとの Error 試行のマスク (置換, エポック) から、全置換の t 値を一括計算
+# 2. find_clusters : 時間方向と隣接電極（ELECTRODE_NEIGHBORS）でつながった点をクラスタにまとめる
+# 3. cluster_test  : 置換をブロックに分け、プロセスプールで並列に計算する
+#
+# 【注意】
+# - scipy が必要
+# - t 値は等分散を仮定した2標本 t 検定（自由度: 試行数 - 2）
+# - 置換ブロックごとの乱数は seed から生成するため、並列数を変えても結果は同じ
+#######################################################################################################
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# 置換検定の初期設定
+N_PERMUTATIONS = 1000
+PERMUTATION_BLOCK = 100  # 1回の行列演算でまとめて計算する置換の数
+CLUSTER_ALPHA = 0.05  # クラスタを作る点の閾値（t 検定の有意水準）
+ALPHA = 0.05  # クラスタの有意水準（置換分布から求めたクラスタの p 値と比較する）
+SEED = 0
+
+# 隣接する電極（同じ時刻の隣接電極の点は同じクラスタになる）
+ELECTRODE_NEIGHBORS = {
+    "F3": ["Fz", "FCz"],
+    "Fz": ["F3", "F4", "FCz"],
+    "F4": ["Fz", "FCz"],
+    "FCz": ["F3", "Fz", "F4", "Cz"],
+    "Cz": ["FCz"],
+}
+
+# プロセスプールの各プロセスで共有するデータ（initializer で設定）
+_shared = {}
+
+
+# scipy がない場合はインストール方法を示して終了する
+def require_scipy():
+    try:
+        import scipy.sparse
+        import scipy.stats
+    except ImportError as e:
+        raise ImportError("クラスタベースの置換検定には scipy が必要です（pip install scipy）。") from e
+
+
+# 全置換の t 値を一括計算する関数
+# data: (エポック, 電極×時間) の配列, masks: (置換, エポック) の Error 試行のマスク
+# 戻り値: (置換, 電極×時間) の t 値
+def t_values(data, masks, n_error):
+    n_epochs = data.shape[0]
+    n_correct = n_epochs - n_error
+    masks = masks.astype(float)
+
+    # 各置換の Error 試行の和と二乗和は行列積で、Correct 試行は全体との差で求める
+    sum_error = masks @ data
+    square_error = masks @ (data ** 2)
+    sum_correct = data.sum(axis=0) - sum_error
+    square_correct = (data ** 2).sum(axis=0) - square_error
+
+    pooled = ((square_error - sum_error ** 2 / n_error) + (square_correct - sum_correct ** 2 / n_correct)) / (n_epochs - 2)
+    return (sum_error / n_error - sum_correct / n_correct) / np.sqrt(pooled * (1 / n_error + 1 / n_correct))
+
+
+# (電極 × 時間) の点の隣接行列を作成する関数（時間方向の前後と、同じ時刻の隣接電極）
+def build_adjacency(electrodes, n_times, neighbors=ELECTRODE_NEIGHBORS):
+    from scipy import sparse
+
+    index = np.arange(len(electrodes) * n_times).reshape(len(electrodes), n_times)
+    rows, cols = [index[:, :-1].ravel()], [index[:, 1:].ravel()]
+    for i, electrode in enumerate(electrodes):
+        for neighbor in neighbors.get(electrode, []):
+            if neighbor in electrodes and electrodes.index(neighbor) > i:
+                rows.append(index[i])
+                cols.append(index[electrodes.index(neighbor)])
+    rows, cols = np.concatenate(rows), np.concatenate(cols)
+    size = index.size
+    return sparse.coo_matrix((np.ones(len(rows), dtype=bool), (rows, cols)), shape=(size, size)).tocsr()
+
+
+# 閾値を超えた点をクラスタにまとめる関数
+# tail: 0（両側）, 1（Error > Correct のみ）, -1（Error < Correct のみ）
+# 戻り値: [(クラスタの点の番号, クラスタ質量), ...]
+def find_clusters(t, threshold, adjacency, tail=0):
+    from scipy.sparse.csgraph import connected_components
+
+    clusters = []
+    for sign in (1, -1):
+        if tail and sign != tail:
+            continue
+        nodes = np.flatnonzero(sign * t > threshold)
+        if not len(nodes):
+            continue
+        n_clusters, labels = connected_components(adjacency[nodes][:, nodes], directed=False)
+        masses = np.bincount(labels, weights=t[nodes], minlength=n_clusters)
+        clusters.extend((nodes[labels == k], masses[k]) for k in range(n_clusters))
+    return clusters
+
+
+# クラスタ質量の絶対値の最大値（クラスタがなければ0）
+def max_cluster_mass(t, threshold, adjacency, tail=0):
+    return max((abs(mass) for _, mass in find_clusters(t, threshold, adjacency, tail)), default=0.0)
+
+
+# プロセスプールの各プロセスにデータを設定する関数
+def init_shared(data, n_error, threshold, adjacency, tail):
+    _shared.update(data=data, n_error=n_error, threshold=threshold, adjacency=adjacency, tail=tail)
+
+
+# 1ブロック分の置換を行い、各置換のクラスタ質量の最大値を返す関数
+def permutation_block(seed, n_permutations):
+    data, n_error = _shared["data"], _shared["n_error"]
+    rng = np.random.default_rng(seed)
+    order = rng.random((n_permutations, data.shape[0])).argsort(axis=1)
+    masks = np.zeros((n_permutations, data.shape[0]), dtype=bool)
+    np.put_along_axis(masks, order[:, :n_error], True, axis=1)
+
+    t = t_values(data, masks, n_error)
+    return np.array([max_cluster_mass(row, _shared["threshold"], _shared["adjacency"], _shared["tail"]) for row in t])
+
+
+# Error 試行と Correct 試行の (電極, エポック, サンプル) の配列からクラスタベースの置換検定を行う関数
+# workers=1 の場合はプロセスプールを使わずに順に計算する
+# 戻り値: {"t": (電極, サンプル) の t 値, "threshold": 閾値,
+#          "clusters": [{"sign", "mask": (電極, サンプル), "mass", "p"}, ...], "null": 置換ごとの最大クラスタ質量}
+def cluster_test(error, correct, electrodes, n_permutations=N_PERMUTATIONS, cluster_alpha=CLUSTER_ALPHA, tail=0,
+                 seed=SEED, workers=None, block_size=PERMUTATION_BLOCK, neighbors=ELECTRODE_NEIGHBORS):
+    require_scipy()
+    from scipy import stats
+
+    error, correct = np.asarray(error, dtype=float), np.asarray(correct, dtype=float)
+    n_electrodes, n_error, n_times = error.shape
+    n_epochs = n_error + correct.shape[1]
+    if n_error < 2 or correct.shape[1] < 2:
+        raise ValueError("置換検定には Error 試行と Correct 試行がそれぞれ2試行以上必要です。")
+
+    # (エポック, 電極×時間) の配列にまとめ、数値誤差を抑えるため全体の平均を引いておく
+    data = np.concatenate([error, correct], axis=1).transpose(1, 0, 2).reshape(n_epochs, n_electrodes * n_times)
+    data = data - data.mean(axis=0)
+    threshold = stats.t.ppf(1 - cluster_alpha / 2 if tail == 0 else 1 - cluster_alpha, n_epochs - 2)
+    adjacency = build_adjacency(list(electrodes), n_times, neighbors)
+
+    # 観測データの t 値とクラスタ
+    observed = np.zeros((1, n_epochs), dtype=bool)
+    observed[0, :n_error] = True
+    t_observed = t_values(data, observed, n_error)[0]
+    clusters = find_clusters(t_observed, threshold, adjacency, tail)
+
+    # 置換をブロックに分け、ブロックごとに独立した乱数で計算する
+    sizes = [min(block_size, n_permutations - start) for start in range(0, n_permutations, block_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    shared = (data, n_error, threshold, adjacency, tail)
+    if workers == 1:
+        init_shared(*shared)
+        blocks = [permutation_block(block_seed, size) for block_seed, size in zip(seeds, sizes)]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_shared, initargs=shared) as executor:
+            blocks = list(executor.map(permutation_block, seeds, sizes))
+    null = np.concatenate(blocks) if blocks else np.empty(0)
+
+    results = []
+    for nodes, mass in sorted(clusters, key=lambda cluster: -abs(cluster[1])):
+        mask = np.zeros(n_electrodes * n_times, dtype=bool)
+        mask[nodes] = True
+        p = (np.count_nonzero(null >= abs(mass)) + 1) / (len(null) + 1)
+        results.append({"sign": int(np.sign(mass)), "mask": mask.reshape(n_electrodes, n_times), "mass": mass, "p": p})
+
+    return {"t": t_observed.reshape(n_electrodes, n_times), "threshold": threshold, "clusters": results, "null": null}
@@ -0,0 +1,251 @@
+#######################################################################################################
+#  2026/10/18 作成
+#
+# 【概要】エポック波形プロットの並列描画（1_plot.py）
+# 従来はエポックごとに図を2枚ずつ作り直していたが、図と軸を1回だけ作成し、
+# エポックごとに線のデータとタイトル・表示範囲のみを更新して保存する。
+# 電極・エポック範囲ごとの描画をプロセスプール（Aggバックエンド）に分配する。
+#
+# 【処理内容】
+# 1. EpochFigure      : 図と軸を1回だけ作成し、オリジナル波形とズームイン波形を同じ図で描き分ける
+# 2. render_epochs    : 1つの電極のエポック範囲を描画する（ワーカープロセスで実行）
+# 3. plot_epochs      : 全電極のエポックを分割してプロセスプールで描画する
+# 4. render_erp_image : 1つの電極の全エポックを（エポック × 時間）のヒートマップ1枚に描画する
+# 5. render_epoch_grid: 1つの電極の全エポックを小さな波形の格子として1つの LineCollection で描画する
+# 6. plot_epoch_overviews: 電極ごとに 4, 5 をプロセスプールで描画する
+#
+# 【注意】
+# - dpi は下書き用（例: 100）と発表用（300, 従来どおり）で切り替える
+# - labels（エポック番号 → 0: Correct, 1: Error）を指定すると、ラベル順に並べて色分けする
+#######################################################################################################
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from eeg_pipeline.profiling import count
+
+# 振幅の表示範囲 [μV]（各エポックのプロットの縦軸, ERPイメージの色の範囲, 格子表示のセルの高さで共通）
+AMPLITUDE_LIMIT = 16
+
+# ラベルごとの表示名と色（ERPイメージの区切り, 格子表示の線の色）
+LABEL_NAMES = {0: "Correct", 1: "Error"}
+LABEL_COLORS = {0: "tab:blue", 1: "tab:red", None: "tab:gray"}
+
+# 出力解像度の初期設定（従来と同じ）
+EPOCH_PLOT_DPI = 300
+
+# 1つのワーカーに割り当てるエポック数
+EPOCHS_PER_TASK = 16
+
+# 波形の表示設定（オリジナル波形, ズームイン波形）
+VIEWS = {
+    "original": {"xlim": (-1000, 2000), "xticks": [-1000, -500, 0, 500, 1000, 1500, 2000],
+                 "xticklabels": ["-1", "-0.5", "0", "0.5", "1", "1.5", "2"], "xlabel": "Time [s]"},
+    "zoomed": {"xlim": (-400, 1000), "xticks": [-400, -200, 0, 200, 400, 600, 800, 1000],
+               "xticklabels": None, "xlabel": "Time [ms]"},
+}
+
+
+# 図と軸を1回だけ作成し、エポックごとに線のデータのみを更新して保存するクラス
+class EpochFigure:
+    def __init__(self, time, show_ttl=False, dpi=EPOCH_PLOT_DPI):
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+        from matplotlib.ticker import ScalarFormatter
+
+        self.plt = plt
+        self.scalar_formatter = ScalarFormatter
+        self.dpi = dpi
+        self.figure, self.ax = plt.subplots(figsize=(10, 6))
+        (self.line,) = self.ax.plot(time, np.zeros(len(time)))
+        if show_ttl:
+            self.ax.axvline(0, color='brown', linestyle='--')
+        self.ax.axhline(0, color='black', linestyle='--', linewidth=0.8)
+        self.ax.axvline(0, color='black', linestyle='--', linewidth=0.8)
+        self.ax.tick_params(labelsize=16)
+        self.ax.set_ylabel('Amplitude [μV]', fontsize=20)
+        self.ax.set_ylim(-AMPLITUDE_LIMIT, AMPLITUDE_LIMIT)
+
+    # 1エポックのオリジナル波形とズームイン波形を保存する
+    def render(self, epoch, title, plot_dir, index):
+        self.line.set_ydata(epoch)
+        self.ax.set_title(title, fontsize=20)
+        for view_name, view in VIEWS.items():
+            self.ax.set_xlim(*view["xlim"])
+            if view["xticklabels"] is None:
+                self.ax.set_xticks(view["xticks"])
+                self.ax.xaxis.set_major_formatter(self.scalar_formatter())
+            else:
+                self.ax.set_xticks(view["xticks"], labels=view["xticklabels"])
+            self.ax.set_xlabel(view["xlabel"], fontsize=20)
+            self.figure.savefig(os.path.join(plot_dir, f'epoch_{index}_{view_name}.png'), dpi=self.dpi)
+
+    def close(self):
+        self.plt.close(self.figure)
+
+
+# 1つの電極のエポック範囲を描画する関数（ワーカープロセスで実行）
+# first_index: epoch_data[0] のエポック番号（1始まり）
+def render_epochs(electrode, time, epoch_data, first_index, plot_dir, show_ttl=False, dpi=EPOCH_PLOT_DPI):
+    figure = EpochFigure(time, show_ttl, dpi)
+    try:
+        for offset, epoch in enumerate(epoch_data):
+            index = first_index + offset
+            figure.render(epoch, f'{electrode} Epoch {index}', plot_dir, index)
+    finally:
+        figure.close()
+    return electrode, len(epoch_data)
+
+
+# 全電極のエポックを EPOCHS_PER_TASK 個ずつに分割して描画する関数
+# jobs: [(電極名, 時間軸, (エポック, サンプル) の配列, 出力ディレクトリ), ...]
+# workers=1 の場合はプロセスプールを使わずに順に描画する
+def plot_epochs(jobs, workers=None, show_ttl=False, dpi=EPOCH_PLOT_DPI, epochs_per_task=EPOCHS_PER_TASK):
+    tasks = []
+    for electrode, time, epoch_data, plot_dir in jobs:
+        os.makedirs(plot_dir, exist_ok=True)
+        time = np.asarray(time)
+        for start in range(0, len(epoch_data), epochs_per_task):
+            chunk = np.asarray(epoch_data[start:start + epochs_per_task])
+            tasks.append((electrode, time, chunk, start + 1, plot_dir, show_ttl, dpi))
+
+    rendered = {electrode: 0 for electrode, *_ in jobs}
+    if workers == 1:
+        results = [render_epochs(*task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(render_epochs, *zip(*tasks))) if tasks else []
+    for electrode, n_epochs in results:
+        rendered[electrode] += n_epochs
+    count(figures=sum(rendered.values()) * len(VIEWS))
+
+    for electrode, n_epochs in rendered.items():
+        print(f"{electrode} のプロットを保存しました。（{n_epochs} エポック）")
+    return rendered
+
+
+# エポックをラベル順（Correct → Error → ラベルなし）に並べ替える関数
+# 戻り値: 並べ替えの順番と、並べ替え後の各エポックのラベル（ラベルなしは None）
+def order_by_label(epoch_ids, labels=None):
+    if not labels:
+        return np.arange(len(epoch_ids)), [None] * len(epoch_ids)
+    epoch_labels = [labels.get(int(epoch_id)) for epoch_id in epoch_ids]
+    rank = [len(LABEL_NAMES) if label is None else label for label in epoch_labels]
+    order = np.argsort(rank, kind="stable")
+    return order, [epoch_labels[i] for i in order]
+
+
+# 1つの電極の全エポックを（エポック × 時間）のヒートマップとして描画する関数
+def render_erp_image(electrode, time, epoch_data, epoch_ids, output_file, labels=None, dpi=EPOCH_PLOT_DPI):
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    time = np.asarray(time)
+    order, sorted_labels = order_by_label(epoch_ids, labels)
+    n_epochs = len(order)
+
+    figure, ax = plt.subplots(figsize=(10, 6))
+    image = ax.imshow(np.asarray(epoch_data)[order], aspect="auto", cmap="RdBu_r", interpolation="nearest",
+                      vmin=-AMPLITUDE_LIMIT, vmax=AMPLITUDE_LIMIT, extent=(time[0], time[-1], n_epochs, 0))
+    ax.axvline(0, color='black', linestyle='--', linewidth=0.8)
+
+    # ラベルの境界線と各ラベルの名前
+    if labels:
+        boundaries = [i for i in range(1, n_epochs) if sorted_labels[i] != sorted_labels[i - 1]]
+        for boundary in boundaries:
+            ax.axhline(boundary, color='black', linewidth=1.5)
+        for start, stop in zip([0] + boundaries, boundaries + [n_epochs]):
+            name = LABEL_NAMES.get(sorted_labels[start], "No label")
+            ax.text(1.01, 1 - (start + stop) / 2 / n_epochs, f"{name}\n({stop - start})", transform=ax.transAxes,
+                    va="center", fontsize=12)
+
+    ax.set_xticks([-1000, -500, 0, 500, 1000, 1500, 2000], labels=["-1", "-0.5", "0", "0.5", "1", "1.5", "2"])
+    ax.tick_params(labelsize=16)
+    ax.set_title(f'{electrode} ERP image ({n_epochs} epochs)', fontsize=20)
+    ax.set_xlabel('Time [s]', fontsize=20)
+    ax.set_ylabel('Epoch', fontsize=20)
+    colorbar = figure.colorbar(image, ax=ax, pad=0.14 if labels else 0.02)
+    colorbar.set_label('Amplitude [μV]', fontsize=16)
+    figure.savefig(output_file, dpi=dpi)
+    plt.close(figure)
+
+
+# 1つの電極の全エポックを小さな波形の格子として描画する関数
+# 全エポックの線分を1つの LineCollection にまとめ、1回の描画で済ませる
+def render_epoch_grid(electrode, time, epoch_data, epoch_ids, output_file, labels=None, dpi=EPOCH_PLOT_DPI):
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    from matplotlib.collections import LineCollection
+    from matplotlib.lines import Line2D
+
+    time = np.asarray(time, dtype=float)
+    order, sorted_labels = order_by_label(epoch_ids, labels)
+    n_epochs = len(order)
+    n_cols = max(int(np.ceil(np.sqrt(n_epochs))), 1)
+    n_rows = max(int(np.ceil(n_epochs / n_cols)), 1)
+
+    # 各セルを 0.9 × 0.9 の領域とし、時間軸と振幅（±AMPLITUDE_LIMIT）をセル内の座標に変換
+    rows, cols = np.divmod(np.arange(n_epochs), n_cols)
+    x = (time - time[0]) / (time[-1] - time[0]) * 0.9
+    y = np.clip(np.asarray(epoch_data, dtype=float)[order], -AMPLITUDE_LIMIT, AMPLITUDE_LIMIT)
+    y = y / AMPLITUDE_LIMIT * 0.45
+    segments = np.empty((n_epochs, len(time), 2))
+    segments[:, :, 0] = cols[:, None] + x
+    segments[:, :, 1] = -rows[:, None] + y
+
+    # 0μVの線とTTL（0ms）の線も各セル分をまとめて描画
+    zero_x = (0 - time[0]) / (time[-1] - time[0]) * 0.9
+    guides = [[(col, -row), (col + 0.9, -row)] for row, col in zip(rows, cols)]
+    guides += [[(col + zero_x, -row - 0.45), (col + zero_x, -row + 0.45)] for row, col in zip(rows, cols)]
+
+    figure, ax = plt.subplots(figsize=(max(n_cols * 1.6, 6), max(n_rows * 1.1, 4)))
+    ax.add_collection(LineCollection(guides, colors='black', linewidths=0.4, linestyles='--'))
+    ax.add_collection(LineCollection(segments, colors=[LABEL_COLORS.get(label) for label in sorted_labels],
+                                     linewidths=0.6))
+    for i, (row, col) in enumerate(zip(rows, cols)):
+        ax.text(col, -row + 0.47, str(epoch_ids[order[i]]), fontsize=8, va="bottom")
+
+    ax.set_xlim(-0.05, n_cols)
+    ax.set_ylim(-n_rows + 0.45, 0.6)
+    ax.axis("off")
+    ax.set_title(f'{electrode} Epochs (-1 s to 2 s, ±{AMPLITUDE_LIMIT} μV)', fontsize=14)
+    if labels:
+        handles = [Line2D([], [], color=LABEL_COLORS[label], label=name) for label, name in LABEL_NAMES.items()]
+        ax.legend(handles=handles, loc="lower right", bbox_to_anchor=(1, 1), ncol=len(handles), frameon=False)
+    figure.savefig(output_file, dpi=dpi, bbox_inches="tight")
+    plt.close(figure)
+
+
+# 1つの電極の一覧表示（ERPイメージ, 格子表示）を描画する関数（ワーカープロセスで実行）
+def render_overviews(electrode, time, epoch_data, epoch_ids, plot_dir, modes, labels=None, dpi=EPOCH_PLOT_DPI):
+    renderers = {"erp_image": render_erp_image, "grid": render_epoch_grid}
+    for mode in modes:
+        renderers[mode](electrode, time, epoch_data, epoch_ids, os.path.join(plot_dir, f"{mode}.png"), labels, dpi)
+    return electrode
+
+
+# 電極ごとの一覧表示をプロセスプールで描画する関数
+# jobs: [(電極名, 時間軸, (エポック, サンプル) の配列, エポック番号, 出力ディレクトリ), ...]
+# modes: "erp_image"（ERPイメージ）と "grid"（格子表示）のうち描画するもの
+def plot_epoch_overviews(jobs, modes=("erp_image", "grid"), labels=None, workers=None, dpi=EPOCH_PLOT_DPI):
+    tasks = []
+    for electrode, time, epoch_data, epoch_ids, plot_dir in jobs:
+        os.makedirs(plot_dir, exist_ok=True)
+        tasks.append((electrode, np.asarray(time), np.asarray(epoch_data), list(epoch_ids), plot_dir, tuple(modes),
+                      labels, dpi))
+
+    if workers == 1 or len(tasks) <= 1:
+        done = [render_overviews(*task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            done = list(executor.map(render_overviews, *zip(*tasks)))
+
+    count(figures=len(done) * len(modes))
+    for electrode in done:
+        print(f"{electrode} の一覧プロット（{', '.join(modes)}）を保存しました。")
+    return done
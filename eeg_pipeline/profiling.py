@@ -0,0 +1,190 @@
+#######################################################################################################
+#  2026/10/18 作成
+#
+# 【概要】処理段階ごとの処理時間・資源使用量の計測
+# セッションの処理が遅い場合に、CSVの読み込み・エポックの切り出し・プロットのどこに時間がかかっているかを
+# 調べるため、各処理段階の 経過時間・CPU時間・最大メモリ使用量（ピークRSS）・読み書きしたバイト数・
+# 処理した件数（サンプル数, エポック数, 図の枚数）を共通の方法で記録する。
+#
+# 【処理内容】
+# 1. Profiler.stage: with 文の中の処理を1段階として計測する（profile_dir 指定時は cProfile も実行）
+# 2. count         : 実行中の段階に処理した件数を加える（各処理段階の関数から呼び出す, 計測中でなければ何もしない）
+# 3. Profiler.report / save: 段階ごとの一覧を表示する / JSONのトレースとして保存する
+#
+# 【出力先】
+# - トレース: "{ルート}/calc/profile/trace_{日時}.json"（run-all --trace など）
+# - cProfile: "{ルート}/calc/profile/{段階名}.prof"（--profile, snakeviz や pstats で表示）
+#
+# 【注意】
+# - 読み書きしたバイト数は Linux（/proc/self/io）または psutil がある場合のみ記録する（それ以外は None）
+# - ピークRSSは Linux では段階ごとの最大値（/proc/self/clear_refs で段階の開始時にリセット）、
+#   それ以外ではプロセス開始からの最大値を記録する（peak_rss_scope: "stage" / "process"）
+# - プロセスプール（並列描画など）のCPU時間と読み書きしたバイト数（Linux）は、終了した子プロセスの分を含む
+#   （処理した件数は親プロセスで数える）
+#######################################################################################################
+
+import contextlib
+import cProfile
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# トレースと cProfile の出力先（calc/ 以下）
+PROFILE_DIR = "profile"
+
+# 実行中の段階の記録（入れ子の場合は最も内側の段階に件数を加える）
+_active = []
+
+
+# psutil の Process を返す関数（psutil がない場合は None）
+def psutil_process():
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process()
+
+
+# 実行中の段階に処理した件数を加える関数（例: count(samples=100000, epochs=56)）
+def count(**items):
+    if not _active:
+        return
+    totals = _active[-1]["items"]
+    for name, value in items.items():
+        totals[name] = totals.get(name, 0) + int(value)
+
+
+# これまでに読み書きしたバイト数 (読み込み, 書き込み) を返す関数（取得できない場合は (None, None)）
+# Linux ではページキャッシュからの読み込みを含む（rchar, wchar）
+def io_bytes():
+    try:
+        with open("/proc/self/io") as f:
+            fields = dict(line.split(":") for line in f if ":" in line)
+        return int(fields["rchar"]), int(fields["wchar"])
+    except (OSError, KeyError, ValueError):
+        pass
+    process = psutil_process()
+    if process is not None and hasattr(process, "io_counters"):
+        counters = process.io_counters()
+        return counters.read_bytes, counters.write_bytes
+    return None, None
+
+
+# ピークRSSをリセットする関数（Linux のみ, リセットできた場合は True）
+def reset_peak_rss():
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+# ピークRSS [バイト] を返す関数（取得できない場合は None）
+def peak_rss():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    if resource is not None:
+        # ru_maxrss の単位は macOS ではバイト、それ以外では KB
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+    process = psutil_process()
+    if process is not None:
+        return getattr(process.memory_info(), "peak_wset", None)
+    return None
+
+
+# 自プロセスと終了した子プロセスのCPU時間の合計 [s]
+def cpu_seconds():
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+
+# 処理段階ごとの計測結果をまとめるクラス
+# profile_dir を指定した場合は、各段階を cProfile でも計測して "{profile_dir}/{段階名}.prof" に保存する
+class Profiler:
+    def __init__(self, profile_dir=None):
+        self.profile_dir = profile_dir
+        self.created = datetime.now()
+        self.records = []
+
+    # with 文の中の処理を1段階として計測する（記録の辞書を返すので、"cached" などの項目を追加できる）
+    @contextlib.contextmanager
+    def stage(self, name):
+        record = {"stage": name, "items": {}}
+        scope = "stage" if reset_peak_rss() else "process"
+        read_start, write_start = io_bytes()
+        cpu_start = cpu_seconds()
+        profiler = cProfile.Profile() if self.profile_dir else None
+        _active.append(record)
+        wall_start = time.perf_counter()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield record
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            wall = time.perf_counter() - wall_start
+            _active.remove(record)
+            read_end, write_end = io_bytes()
+            peak = peak_rss()
+            record.update({
+                "wall [s]": round(wall, 4),
+                "cpu [s]": round(cpu_seconds() - cpu_start, 4),
+                "peak_rss [MB]": None if peak is None else round(peak / 2 ** 20, 1),
+                "peak_rss_scope": scope,
+                "read [MB]": None if read_start is None else round((read_end - read_start) / 2 ** 20, 2),
+                "written [MB]": None if write_start is None else round((write_end - write_start) / 2 ** 20, 2),
+            })
+            if profiler is not None:
+                os.makedirs(self.profile_dir, exist_ok=True)
+                record["profile"] = os.path.join(self.profile_dir, f"{name}.prof")
+                profiler.dump_stats(record["profile"])
+            self.records.append(record)
+
+    # 段階ごとの一覧（1段階1行, 件数は列 "samples", "epochs", "figures" など）
+    def summary(self):
+        import pandas as pd
+
+        rows = []
+        for record in self.records:
+            row = {key: value for key, value in record.items() if key not in ("items", "profile")}
+            row.update(record["items"])
+            rows.append(row)
+        summary = pd.DataFrame(rows)
+        items = sorted({name for record in self.records for name in record["items"]})
+        summary[items] = summary[items].astype("Int64")  # 件数のない段階があっても整数で表示する
+        return summary
+
+    # 段階ごとの一覧を表示する
+    def report(self):
+        if not self.records:
+            return
+        summary = self.summary().drop(columns=["peak_rss_scope"])
+        summary = summary.astype(object).where(summary.notna(), "-")
+        print("\n▶ 処理段階ごとの計測結果")
+        print(summary.to_string(index=False))
+
+    # 計測結果をJSONのトレースとして保存する（戻り値: 保存先）
+    def save(self, output_dir, info=None):
+        os.makedirs(output_dir, exist_ok=True)
+        path = os.path.join(output_dir, f"trace_{self.created.strftime('%Y%m%d_%H%M%S')}.json")
+        trace = {"created": self.created.isoformat(timespec="seconds"), "pid": os.getpid(),
+                 "info": info or {}, "stages": self.records}
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(trace, f, ensure_ascii=False, indent=1, default=str)
+        print(f"計測結果のトレースを {path} に保存しました。")
+        return path
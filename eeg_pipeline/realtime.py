@@ -0,0 +1,250 @@
+#######################################################################################################
+#  2026/10/18 作成
+#
+# 【概要】リアルタイムErrP解析（ロボット迷路課題の閉ループ実験用）
+# 計測中のデータをサンプルの塊（ブロック）ごとに受け取り、リングバッファに保持する。
+# TTLから +2000ms までのデータが届いた時点でエポックを切り出してベースライン補正し、
+# Correct/Error試行の加算平均を逐次更新する。計測後にCSVを書き出す必要はない。
+#
+# 【処理内容】
+# 1. FileReplaySource: 記録済みのICA処理済みデータ（.csv）をブロックごとに再生するデータ源（動作確認用）
+# 2. SocketSource    : ローカルのソケットからサンプルとマーカーを受信するデータ源
+# 3. serve_replay    : FileReplaySource の内容をソケットで送信する（計測装置の代わり）
+# 4. RealtimeErrP    : エポックの切り出し、ベースライン補正、加算平均の逐次更新
+#
+# 【注意】
+# - ベースラインはエポックごとに補正する（電極ごとに全エポックの平均を使う従来の方法は計測中には使えない）
+# - 1エポックあたりの処理時間（遅延）は latencies に記録する。データが届くまでの待ち時間はブロック長以下
+# - ソケットのレコードは float64（リトルエンディアン）の [時刻 [ms], マーカー, チャンネル1, ..., チャンネルN]
+#   TTLの時刻はマーカーが付いたサンプルの時刻となる（1024Hzでは再生時と最大1サンプルずれる）
+#######################################################################################################
+
+import bisect
+import socket
+import time
+from math import ceil
+
+import numpy as np
+
+from eeg_pipeline.accumulator import Accumulator
+from eeg_pipeline.baseline import BASELINE_WINDOW, apply_baseline
+from eeg_pipeline.epoching import EPOCH_START, EPOCH_END, linear_interp
+from eeg_pipeline.streaming import CHUNK_SIZE, RingBuffer, iter_csv_chunks
+
+# 1回に受け取るサンプル数の初期設定（1000Hzで32ms）
+BLOCK_SIZE = 32
+
+# ソケット通信の初期設定
+HOST = "127.0.0.1"
+PORT = 5005
+
+# マーカーの値とラベルの対応（0: マーカーなし, その他の値: ラベルなしのTTL）
+MARKER_LABELS = {1: "correct", 2: "error"}
+LABEL_MARKERS = {label: marker for marker, label in MARKER_LABELS.items()}
+TTL_MARKER = 3
+
+
+# 記録済みのCSVをブロックごとに再生するデータ源
+# events: (TTL時刻 [ms], ラベル) のリスト。TTLは、その時刻を含むブロックと一緒に渡す
+# time_column が None の場合は、1行目 = 1[ms], 2行目 = 2[ms], ... の時間軸とする
+# realtime=True の場合は、計測と同じ速さ（speed 倍）で再生する
+class FileReplaySource:
+    def __init__(self, file_path, columns, events, time_column=None, header=None, time_scale=1.0,
+                 block_size=BLOCK_SIZE, realtime=False, speed=1.0):
+        self.file_path = file_path
+        self.columns = list(columns)
+        self.events = sorted(events, key=lambda event: event[0])
+        self.time_column = time_column
+        self.header = header
+        self.time_scale = time_scale
+        self.block_size = block_size
+        self.realtime = realtime
+        self.speed = speed
+
+    # (時刻 [ms], (チャンネル, サンプル) のデータ, [(TTL時刻, ラベル), ...]) をブロックごとに返す
+    def __iter__(self):
+        read_columns = self.columns if self.time_column is None else [self.time_column] + self.columns
+        event_times = np.array([event[0] for event in self.events], dtype=float)
+        next_event = 0
+        total = 0
+        start_clock = first_time = None
+        for chunk in iter_csv_chunks(self.file_path, read_columns, CHUNK_SIZE, self.header):
+            if self.time_column is None:
+                chunk_times, chunk_data = total + np.arange(1, chunk.shape[1] + 1, dtype=float), chunk
+            else:
+                chunk_times, chunk_data = chunk[0] * self.time_scale, chunk[1:]
+            total += chunk.shape[1]
+
+            for offset in range(0, chunk.shape[1], self.block_size):
+                times = chunk_times[offset:offset + self.block_size]
+                end = np.searchsorted(event_times, times[-1], side="right")
+                events, next_event = self.events[next_event:end], max(next_event, end)
+
+                if self.realtime:
+                    # ブロックの最後のサンプルが計測される時刻まで待つ
+                    if start_clock is None:
+                        start_clock, first_time = time.perf_counter(), times[0]
+                    delay = start_clock + (times[-1] - first_time) / 1000 / self.speed - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                yield times, chunk_data[:, offset:offset + self.block_size], events
+
+
+# ローカルのソケットからサンプルを受信するデータ源
+# 送信側（計測装置または serve_replay）に接続し、受信したレコードをブロックごとに返す
+class SocketSource:
+    def __init__(self, n_channels, host=HOST, port=PORT, block_size=BLOCK_SIZE, timeout=10.0):
+        self.n_channels = n_channels
+        self.host = host
+        self.port = port
+        self.block_size = block_size
+        self.timeout = timeout
+
+    def __iter__(self):
+        record_size = (self.n_channels + 2) * 8
+        pending = b""
+        with socket.create_connection((self.host, self.port), timeout=self.timeout) as connection:
+            while True:
+                received = connection.recv(record_size * self.block_size)
+                if not received:
+                    break
+                pending += received
+                n_records = len(pending) // record_size
+                if not n_records:
+                    continue
+                records = np.frombuffer(pending[:n_records * record_size], dtype="<f8").reshape(n_records, -1).T
+                pending = pending[n_records * record_size:]
+
+                times, markers = records[0], records[1]
+                events = [(times[i], MARKER_LABELS.get(int(markers[i]))) for i in np.flatnonzero(markers)]
+                yield times, records[2:], events
+
+
+# データ源の内容をソケットで送信する関数（計測装置の代わりとして、1回の接続のみ受け付ける）
+def serve_replay(source, host=HOST, port=PORT):
+    with socket.create_server((host, port)) as server:
+        print(f"📡 {host}:{port} で接続を待っています...")
+        connection, address = server.accept()
+        with connection:
+            print(f"{address[0]}:{address[1]} にデータを送信します。")
+            for times, data, events in source:
+                markers = np.zeros(len(times))
+                for event_time, label in events:
+                    markers[min(np.searchsorted(times, event_time), len(times) - 1)] = LABEL_MARKERS.get(label, TTL_MARKER)
+                records = np.vstack([times, markers, data]).T
+                connection.sendall(records.astype("<f8").tobytes())
+    print("データの送信が完了しました。")
+
+
+# リアルタイムのエポック切り出しと加算平均の更新を行うクラス
+# 時刻は step 間隔の格子（最初のサンプルの時刻が基準）に揃え、エポック範囲のみを補間する
+# （1000Hzのデータでは補間の重みが0になり、元のサンプルがそのまま使われる）
+# labels: ラベルが付いていないTTLのラベルを、エポック番号から決めるための辞書（例: combined_data.csv）
+# on_epoch: エポックが切り出されるたびに呼び出す関数（例: ロボットへのフィードバック）
+class RealtimeErrP:
+    def __init__(self, channels, sfreq, labels=None, groups=("correct", "error"), epoch_start=EPOCH_START,
+                 epoch_end=EPOCH_END, step=1.0, baseline_window=BASELINE_WINDOW, first_id=0, on_epoch=None):
+        self.channels = list(channels)
+        self.labels = labels or {}
+        self.relative_times = np.arange(epoch_start, epoch_end) * step
+        self.step = step
+        self.baseline_window = baseline_window
+        self.on_epoch = on_epoch
+
+        # エポック範囲の前後に2サンプルの余白を付けた長さを1つの単位として、その2倍をバッファに保持する
+        samples_per_step = step * sfreq / 1000
+        self.span = int(ceil(-epoch_start * samples_per_step)) + int(ceil(epoch_end * samples_per_step)) + 4
+        self.times = RingBuffer(1, 2 * self.span)
+        self.data = RingBuffer(len(self.channels), 2 * self.span)
+        self.first_time = None
+
+        self.pending = []  # (TTL時刻, 受信順, ラベル) を時刻順に保持
+        self.n_events = 0
+        self.first_id = first_id  # エポック番号 = first_id + TTLの受信順（除外したTTLの番号は欠番）
+        self.accumulators = {group: Accumulator(self.channels, self.relative_times) for group in groups}
+        self.records = []  # 切り出したエポックの記録（波形は保持しない）
+
+    # TTLを登録する
+    def add_event(self, time_ms, label=None):
+        bisect.insort(self.pending, (float(time_ms), self.n_events, label))
+        self.n_events += 1
+
+    # ブロックのデータを追加し、エポック範囲が揃ったTTLのエポックを返す
+    # received: ブロックを受け取った時刻（time.perf_counter(), 省略時は現在）
+    def push(self, times, data, events=(), received=None):
+        received = time.perf_counter() if received is None else received
+        for event_time, label in events:
+            self.add_event(event_time, label)
+
+        times = np.asarray(times, dtype=float)
+        data = np.asarray(data, dtype=float)
+        if self.first_time is None and len(times):
+            self.first_time = times[0]
+
+        # バッファ容量を超えないように、エポック長ごとに分割して追加
+        emitted = []
+        for offset in range(0, len(times), self.span):
+            self.times.append(times[None, offset:offset + self.span])
+            self.data.append(data[:, offset:offset + self.span])
+            emitted.extend(self.emit_ready(received))
+        return emitted
+
+    # エポック範囲の最後のサンプルまで届いたTTLのエポックを切り出す
+    def emit_ready(self, received):
+        n_buffered = min(self.times.total, self.times.capacity)
+        buffer_start = self.times.total - n_buffered
+        buffer_times = self.times.window(buffer_start, n_buffered)[0]
+
+        emitted = []
+        while self.pending:
+            event_time, order, label = self.pending[0]
+            grid_time = self.first_time + np.rint((event_time - self.first_time) / self.step) * self.step
+            new_times = grid_time + self.relative_times
+            if new_times[-1] > buffer_times[-1]:
+                break
+            self.pending.pop(0)
+
+            # エポック範囲の最初のサンプルがバッファにない（データの先頭より前または上書き済み）場合は除外
+            if new_times[0] < buffer_times[0]:
+                print(f"TTL {event_time} はエポック範囲がバッファ外のため除外しました。")
+                continue
+
+            first = np.searchsorted(buffer_times, new_times[0], side="right") - 1
+            last = max(np.searchsorted(buffer_times, new_times[-1], side="left") + 1, first + 2)
+            epoch = linear_interp(buffer_times[first:last], self.data.window(buffer_start + first, last - first),
+                                  new_times)
+            epoch, values = apply_baseline(epoch[:, None, :], self.relative_times, "epoch", self.baseline_window,
+                                           inplace=True)
+            epoch = epoch[:, 0, :]
+
+            epoch_id = self.first_id + order
+            label = label or self.labels.get(epoch_id)
+            if label in self.accumulators:
+                self.accumulators[label].update(epoch[:, None, :], [epoch_id])
+
+            record = {"epoch_id": epoch_id, "time_ms": event_time, "label": label, "data": epoch,
+                      "baseline": values[:, 0, 0], "latency_ms": (time.perf_counter() - received) * 1000}
+            self.records.append({key: value for key, value in record.items() if key != "data"})
+            emitted.append(record)
+            if self.on_epoch is not None:
+                self.on_epoch(record, self)
+        return emitted
+
+    # データ源からの受信が終わるまでエポックの切り出しを続ける
+    def run(self, source):
+        for times, data, events in source:
+            self.push(times, data, events)
+        if self.pending:
+            print(f"エポック範囲のデータが届かなかったTTLが {len(self.pending)} 件ありました。")
+        return self
+
+    # ラベルごとの加算平均（電極, サンプル）と試行数
+    def mean(self, group):
+        return self.accumulators[group].mean
+
+    def counts(self):
+        return {group: accumulator.count for group, accumulator in self.accumulators.items()}
+
+    # 1エポックあたりの処理時間 [ms]（ブロックを受け取ってから、加算平均を更新するまで）
+    def latencies(self):
+        return np.array([record["latency_ms"] for record in self.records])
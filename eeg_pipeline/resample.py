@@ -0,0 +1,141 @@
+#######################################################################################################
+#  2026/10/18 作成
+#
+# 【概要】連続データの全チャンネル一括再サンプリング
+# 0_before_10.py の前処理（1024Hzデータを1ms間隔に変換）を、全チャンネルを2次元配列のまま
+# チャンク単位で処理し、結果をバイナリ形式（store.ContinuousWriter）で保存する。
+#
+# 【処理内容】
+# - linear   : 線形補間（従来の np.interp と同じ結果）。時間列の値をそのまま使う
+# - polyphase: アンチエイリアスフィルタ付きのポリフェーズ再サンプリング（1024Hz → 1000Hz = 125/128倍）
+#
+# 【注意】
+# - polyphase には scipy が必要
+# - いずれもチャンク境界の前後のサンプルを引き継ぐため、一括処理と同じ結果になる
+#######################################################################################################
+
+from fractions import Fraction
+from math import ceil
+
+import numpy as np
+
+from eeg_pipeline.epoching import linear_interp
+from eeg_pipeline.store import ContinuousWriter
+from eeg_pipeline.streaming import CHUNK_SIZE, iter_csv_chunks
+
+# 再サンプリング後のサンプリング周波数の初期設定 [Hz]
+TARGET_SFREQ = 1000
+
+
+# チャンク単位で等間隔の時間軸へ線形補間するクラス
+# 補間先の時間軸は np.arange(最初の時刻, 最後の時刻, step) と同じ点になる
+class LinearResampler:
+    def __init__(self, step):
+        self.step = step
+        self.t0 = None
+        self.next_k = 0
+        self.prev_time = None
+        self.prev_data = None
+
+    # 新しいチャンク（時間軸, (チャンネル, サンプル)）を受け取り、補間済みの (時間軸, データ) を返す
+    def process(self, times, data):
+        if self.t0 is None:
+            self.t0 = times[0]
+        if self.prev_time is not None:
+            times = np.concatenate([[self.prev_time], times])
+            data = np.concatenate([self.prev_data, data], axis=1)
+        self.prev_time, self.prev_data = times[-1], data[:, -1:]
+
+        # チャンクの最後の時刻より前の補間点のみ確定する
+        k_end = int(ceil((times[-1] - self.t0) / self.step))
+        new_time = self.t0 + np.arange(self.next_k, k_end) * self.step
+        self.next_k = max(self.next_k, k_end)
+        if len(times) < 2 or not len(new_time):
+            return new_time, np.empty((data.shape[0], 0))
+        return new_time, linear_interp(times, data, new_time)
+
+
+# チャンク単位でポリフェーズ再サンプリングを行うクラス
+# 各区間の前後に pad サンプルの実データを付けて処理し、フィルタの端の影響を受ける部分を捨てる
+class PolyphaseResampler:
+    def __init__(self, sfreq, target_sfreq=TARGET_SFREQ):
+        try:
+            from scipy.signal import resample_poly
+        except ImportError as e:
+            raise ImportError("polyphase 法の再サンプリングには scipy が必要です（pip install scipy）。") from e
+
+        ratio = Fraction(target_sfreq, 1) / Fraction(sfreq).limit_denominator(1000)
+        self.resample_poly = resample_poly
+        self.up, self.down = ratio.numerator, ratio.denominator
+        # フィルタの片側の長さ（入力サンプル数）以上で、down の倍数の余白
+        half_length = ceil(10 * max(self.up, self.down) / self.up) + 1
+        self.pad = self.down * ceil(half_length / self.down)
+        self.left = 0  # pending の先頭にある、処理済み区間の余白のサンプル数
+        self.pending = None
+
+    def _resample(self, segment, keep_samples=None):
+        output = self.resample_poly(segment, self.up, self.down, axis=1)
+        start = self.left * self.up // self.down
+        return output[:, start:] if keep_samples is None else output[:, start:start + keep_samples * self.up // self.down]
+
+    # 新しいチャンク (チャンネル, サンプル) を受け取り、確定した出力を返す
+    def process(self, data):
+        self.pending = data if self.pending is None else np.concatenate([self.pending, data], axis=1)
+        block = (self.pending.shape[1] - self.left - self.pad) // self.down * self.down
+        if block <= 0:
+            return np.empty((data.shape[0], 0))
+
+        output = self._resample(self.pending[:, :self.left + block + self.pad], block)
+        new_left = min(self.pad, self.left + block)
+        self.pending = self.pending[:, self.left + block - new_left:]
+        self.left = new_left
+        return output
+
+    # 残りのサンプルをすべて処理する
+    def flush(self):
+        if self.pending is None or self.pending.shape[1] <= self.left:
+            return np.empty((0 if self.pending is None else self.pending.shape[0], 0))
+        output = self._resample(self.pending)
+        self.pending = None
+        return output
+
+
+# ICA処理済みデータ（1列目: Time [s], 2列目以降: 各電極）をチャンク単位で再サンプリングし、
+# バイナリ形式で保存する関数
+def resample_csv(ica_data_file, output_path, method="linear", sfreq=1024, target_sfreq=TARGET_SFREQ,
+                 chunk_size=CHUNK_SIZE):
+    import pandas as pd
+
+    columns = list(pd.read_csv(ica_data_file, nrows=0).columns)
+    writer = None
+    resampler = LinearResampler(1 / target_sfreq) if method == "linear" else PolyphaseResampler(sfreq, target_sfreq)
+
+    try:
+        for chunk in iter_csv_chunks(ica_data_file, columns, chunk_size, header=0):
+            if writer is None:
+                writer = ContinuousWriter(output_path, columns[1:], target_sfreq, t0=chunk[0, 0])
+            if method == "linear":
+                _, resampled = resampler.process(chunk[0], chunk[1:])
+            else:
+                resampled = resampler.process(chunk[1:])
+            writer.write(resampled)
+        if writer is not None and method != "linear":
+            writer.write(resampler.flush())
+    finally:
+        if writer is not None:
+            writer.close()
+    return output_path
+
+
+# 連続データを従来形式のCSV（1列目: Time [s]）としてチャンク単位で出力する関数（任意の副出力）
+def export_continuous_csv(continuous_set, output_file, chunk_size=CHUNK_SIZE):
+    import pandas as pd
+
+    n_samples = continuous_set.data.shape[1]
+    for start in range(0, max(n_samples, 1), chunk_size):
+        stop = min(start + chunk_size, n_samples)
+        frame = pd.DataFrame(np.asarray(continuous_set.data[:, start:stop]).T, columns=continuous_set.channels)
+        frame.insert(0, "Time [s]", continuous_set.t0 + np.arange(start, stop) / continuous_set.sfreq)
+        frame.to_csv(output_file, mode="w" if start == 0 else "a", header=start == 0, index=False,
+                     encoding='utf-8-sig' if start == 0 else 'utf-8')
+    print(f"1ms間隔の補間データを {output_file} に保存しました。")
@@ -0,0 +1,234 @@
+#######################################################################################################
+#  2026/10/18 作成
+#
+# 【概要】時間周波数解析
+# - 短時間フーリエ変換（STFT）: eeg_analyze.m のスペクトログラム出力の置き換え。全電極・全エポックの窓を
+#   まとめて1回のFFTで計算し、ベースライン補正した振幅を周波数軸・時間軸と一緒にバイナリ形式で保存する。
+# - Morletウェーブレット: 全電極・全エポックとウェーブレット群の畳み込みをFFTでまとめて計算し、
+#   条件（Correct/Error）ごとの事象関連スペクトル摂動（ERSP）と試行間位相一致度（ITC）を求める。
+#
+# 【処理内容】
+# 1. stft_power     : 窓長512サンプル, 50%オーバーラップのSTFTを一括計算
+# 2. baseline_frames: 窓全体がベースライン区間（初期設定: -1000ms〜0ms）に収まるフレームの平均を減算
+#                     （1000Hz・初期設定の窓長では先頭の2フレーム: -1000〜-489ms, -744〜-233ms）
+# 3. save_spectrum / load_spectrum: "{パス}.npy"（float32）と "{パス}.json"（ヘッダ）で保存・読み込み
+# 4. ersp_itc       : 周波数をいくつかずつまとめて畳み込み、条件ごとの ERSP [dB] と ITC を計算
+# 5. save_ersp_itc / load_ersp_itc: "{パス}.npy"（[ERSP, ITC] の float32）と "{パス}.json"（ヘッダ）
+#
+# 【注意】
+# - STFTの窓関数は MATLAB の spectrogram と同じハミング窓（対称）
+# - quantity="magnitude" は eeg_analyze.m と同じ abs(S)、"power" は abs(S)^2
+# - STFTの時間軸は各フレームの中心の時刻 [ms]（エポックの時間軸と同じ基準, eeg_analyze.m の T - 1.0 に相当）
+# - eeg_analyze.m との違い: eeg_analyze.m は1024Hzに再サンプリングして窓長1024サンプル（1秒）で計算し、
+#   先頭の2フレームをベースラインとする。同じ設定をこのパイプラインのエポック（1000Hz, -1000〜2000ms）に使うと
+#   フレームは4個のみで、2フレーム目（-488〜+535ms）が刺激後の区間を含むため、窓長を512サンプルとし、
+#   ベースラインはフレーム数ではなく時間の区間で指定する（窓長1024サンプルでは刺激前に収まるフレームがない）
+# - ERSP は条件ごとの平均パワーを、ベースライン区間（初期設定: -1000ms〜0ms）の平均パワーとの比 [dB] で表す
+#######################################################################################################
+
+import json
+import os
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from eeg_pipeline.baseline import BASELINE_WINDOW
+
+# STFTの初期設定（50%オーバーラップは eeg_analyze.m の spectrogram(x, FFT_Fs, FFT_Fs/2, FFT_Fs, FFT_Fs) と同じ,
+# 窓長は刺激前の1秒に2フレームが収まるように eeg_analyze.m の半分）
+WINDOW_LENGTH = 512
+OVERLAP = 256
+
+QUANTITIES = ("magnitude", "power")
+
+# Morletウェーブレットの初期設定（θ帯域を含む 2〜30Hz）
+WAVELET_FREQS = np.arange(2.0, 31.0)
+N_CYCLES = 3.0  # ウェーブレットの周期数（周波数ごとの配列も可）
+
+# 畳み込みの途中結果に使うメモリの上限 [バイト]（周波数をいくつかずつまとめて計算する）
+WAVELET_MEMORY = 256 * 1024 ** 2
+
+
+# 時間周波数データと付随情報をまとめて扱うクラス
+# data: (電極, エポック, 周波数, フレーム) の配列
+class SpectrumSet:
+    def __init__(self, data, electrodes, epoch_ids, freqs, times, meta=None):
+        self.data = data
+        self.electrodes = list(electrodes)
+        self.epoch_ids = np.asarray(epoch_ids, dtype=int)
+        self.freqs = np.asarray(freqs, dtype=float)
+        self.times = np.asarray(times, dtype=float)
+        self.meta = dict(meta or {})
+
+        if data.shape != (len(self.electrodes), len(self.epoch_ids), len(self.freqs), len(self.times)):
+            raise ValueError(f"時間周波数データの形状 {data.shape} がヘッダ情報と一致しません。")
+
+
+# (..., サンプル) の配列のSTFTを一括計算する関数
+# 全ての窓を (..., フレーム, 窓長) のビューとして切り出し、窓関数を掛けて1回のFFTで計算する
+# 戻り値: (..., 周波数, フレーム) の振幅（またはパワー）, 周波数 [Hz], フレーム中心のサンプル位置
+def stft_power(data, sfreq, window_length=WINDOW_LENGTH, overlap=OVERLAP, nfft=None, quantity="magnitude"):
+    if quantity not in QUANTITIES:
+        raise ValueError(f"quantity は {QUANTITIES} のいずれかを指定してください: {quantity}")
+    data = np.asarray(data, dtype=float)
+    nfft = nfft or window_length
+    step = window_length - overlap
+    if data.shape[-1] < window_length:
+        raise ValueError(f"データ長 {data.shape[-1]} サンプルが窓長 {window_length} サンプルより短いです。")
+
+    frames = sliding_window_view(data, window_length, axis=-1)[..., ::step, :]
+    spectrum = np.fft.rfft(frames * np.hamming(window_length), n=nfft, axis=-1)
+    values = np.abs(spectrum)
+    if quantity == "power":
+        values **= 2
+
+    freqs = np.fft.rfftfreq(nfft, d=1 / sfreq)
+    centers = window_length / 2 + np.arange(frames.shape[-2]) * step
+    return np.swapaxes(values, -1, -2), freqs, centers
+
+
+# 窓全体がベースライン区間 [開始, 終了] [ms] に収まるフレームの番号を返す関数
+# starts: 各フレームの窓の先頭の時刻 [ms], duration: 窓長 [ms]
+def baseline_frame_indices(starts, duration, window=BASELINE_WINDOW):
+    starts = np.asarray(starts, dtype=float)
+    return np.flatnonzero((starts >= window[0]) & (starts + duration <= window[1]))
+
+
+# 指定したフレームの平均をベースラインとして減算する関数（フレームは最後の軸）
+# 戻り値: 補正後の配列と、ベースライン値
+def baseline_frames(values, frames):
+    baseline = values[..., frames].mean(axis=-1, keepdims=True)
+    return values - baseline, baseline
+
+
+# EpochSet の全電極・全エポックの時間周波数データを計算する関数
+# baseline_window: ベースライン区間 [ms]（窓全体がこの区間に収まるフレームの平均を減算, None の場合は補正しない）
+# fmax: 保存する最大周波数 [Hz]（None の場合は全周波数）
+def compute_spectrum(epoch_set, window_length=WINDOW_LENGTH, overlap=OVERLAP, nfft=None, quantity="magnitude",
+                     baseline_window=BASELINE_WINDOW, fmax=None):
+    values, freqs, centers = stft_power(epoch_set.data, epoch_set.sfreq, window_length, overlap, nfft, quantity)
+    times = epoch_set.times[0] + centers * 1000 / epoch_set.sfreq
+
+    frames = []
+    if baseline_window is not None:
+        duration = window_length * 1000 / epoch_set.sfreq
+        frames = baseline_frame_indices(times - duration / 2, duration, baseline_window)
+        if not len(frames):
+            raise ValueError(f"窓全体がベースライン区間 {list(baseline_window)} ms に収まるフレームがありません"
+                             f"（窓長 {duration:g}ms）。窓長を短くするか、ベースライン区間を広げてください。")
+        values, _ = baseline_frames(values, frames)
+    if fmax is not None:
+        keep = freqs <= fmax
+        values, freqs = values[..., keep, :], freqs[keep]
+
+    meta = {"sfreq": epoch_set.sfreq, "window_length": window_length, "overlap": overlap,
+            "nfft": nfft or window_length, "quantity": quantity,
+            "baseline_window": None if baseline_window is None else list(baseline_window),
+            "baseline_frames": [int(frame) for frame in frames]}
+    return SpectrumSet(values.astype(np.float32), epoch_set.electrodes, epoch_set.epoch_ids, freqs, times, meta)
+
+
+# 時間周波数データを保存する関数
+def save_spectrum(path, spectrum_set):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    header = {
+        "electrodes": spectrum_set.electrodes,
+        "epoch_ids": spectrum_set.epoch_ids.tolist(),
+        "freqs": spectrum_set.freqs.tolist(),
+        "times": spectrum_set.times.tolist(),
+        "meta": spectrum_set.meta,
+    }
+    np.save(path + ".npy", np.ascontiguousarray(spectrum_set.data))
+    with open(path + ".json", "w", encoding="utf-8") as f:
+        json.dump(header, f, ensure_ascii=False, indent=1)
+    print(f"時間周波数データを {path}.npy に保存しました。")
+
+
+# 時間周波数データを読み込む関数（mmap=True の場合はコピーせずにファイルを参照する）
+def load_spectrum(path, mmap=True):
+    with open(path + ".json", encoding="utf-8") as f:
+        header = json.load(f)
+    data = np.load(path + ".npy", mmap_mode="r" if mmap else None)
+    return SpectrumSet(data, header["electrodes"], header["epoch_ids"], header["freqs"], header["times"],
+                       header.get("meta"))
+
+
+# Morletウェーブレット群を作成する関数（各ウェーブレットのエネルギーは1に正規化）
+# 長さは最も低い周波数のウェーブレットの ±3.5σ（全周波数で共通）
+# 戻り値: (周波数, サンプル) の複素数の配列
+def morlet_family(freqs, sfreq, n_cycles=N_CYCLES):
+    freqs = np.asarray(freqs, dtype=float)
+    sigmas = np.broadcast_to(np.asarray(n_cycles, dtype=float), freqs.shape) / (2 * np.pi * freqs)
+    half = int(np.ceil(3.5 * sigmas.max() * sfreq))
+    t = np.arange(-half, half + 1) / sfreq
+    wavelets = np.exp(2j * np.pi * freqs[:, None] * t) * np.exp(-t ** 2 / (2 * sigmas[:, None] ** 2))
+    return wavelets / np.linalg.norm(wavelets, axis=1, keepdims=True)
+
+
+# 全電極・全エポックの Morlet ウェーブレット変換から、条件ごとの ERSP [dB] と ITC を計算する関数
+# data: (電極, エポック, サンプル) の配列, conditions: {条件名: エポックの番号（data の2軸目の位置）}
+# データのFFTは1回だけ計算し、周波数は memory_limit に収まる数ずつまとめて畳み込む
+# decim: 時間方向の間引き（例: 4 で4サンプルごと）
+# 戻り値: {条件名: (ERSP, ITC)}（いずれも (電極, 周波数, サンプル) の配列）と、間引き後の時間軸
+def ersp_itc(data, times, sfreq, conditions, freqs=WAVELET_FREQS, n_cycles=N_CYCLES,
+             baseline_window=BASELINE_WINDOW, decim=1, memory_limit=WAVELET_MEMORY):
+    data = np.asarray(data, dtype=float)
+    times = np.asarray(times, dtype=float)
+    freqs = np.asarray(freqs, dtype=float)
+    n_electrodes, n_epochs, n_times = data.shape
+    wavelets = morlet_family(freqs, sfreq, n_cycles)
+
+    # 線形畳み込みになるFFT長（2のべき乗）で、データのFFTを1回だけ計算する
+    n_conv = n_times + wavelets.shape[1] - 1
+    n_fft = 1 << (n_conv - 1).bit_length()
+    data_fft = np.fft.fft(data, n=n_fft, axis=-1)[:, :, None, :]
+    wavelet_fft = np.fft.fft(wavelets, n=n_fft, axis=-1)
+    offset = (wavelets.shape[1] - 1) // 2  # 畳み込み結果のうち、元の時刻に対応する位置
+
+    kept = np.arange(0, n_times, decim)
+    baseline = (times[kept] >= baseline_window[0]) & (times[kept] < baseline_window[1])
+    if not baseline.any():
+        raise ValueError(f"ベースライン区間 {baseline_window[0]}〜{baseline_window[1]}ms にサンプルがありません。")
+
+    results = {label: (np.empty((n_electrodes, len(freqs), len(kept)), dtype=np.float32),
+                       np.empty((n_electrodes, len(freqs), len(kept)), dtype=np.float32)) for label in conditions}
+
+    # 1周波数あたりの途中結果（複素数の畳み込み結果）の大きさから、まとめて計算する周波数の数を決める
+    chunk = max(1, int(memory_limit // (n_electrodes * n_epochs * n_fft * 16)))
+    for start in range(0, len(freqs), chunk):
+        band = slice(start, start + chunk)
+        coefficients = np.fft.ifft(data_fft * wavelet_fft[band], axis=-1)[..., offset + kept]
+        power = np.abs(coefficients) ** 2
+        with np.errstate(invalid="ignore", divide="ignore"):
+            phase = coefficients / np.abs(coefficients)
+        for label, epochs in conditions.items():
+            mean_power = power[:, epochs].mean(axis=1)
+            baseline_power = mean_power[..., baseline].mean(axis=-1, keepdims=True)
+            results[label][0][:, band] = 10 * np.log10(mean_power / baseline_power)
+            results[label][1][:, band] = np.abs(np.nanmean(phase[:, epochs], axis=1))
+    return results, times[kept]
+
+
+# 条件ごとの ERSP と ITC を保存する関数
+def save_ersp_itc(path, ersp, itc, electrodes, freqs, times, meta=None):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    header = {
+        "measures": ["ersp", "itc"],
+        "electrodes": list(electrodes),
+        "freqs": np.asarray(freqs, dtype=float).tolist(),
+        "times": np.asarray(times, dtype=float).tolist(),
+        "meta": dict(meta or {}),
+    }
+    np.save(path + ".npy", np.stack([ersp, itc]).astype(np.float32))
+    with open(path + ".json", "w", encoding="utf-8") as f:
+        json.dump(header, f, ensure_ascii=False, indent=1)
+    print(f"ERSP と ITC を {path}.npy に保存しました。")
+
+
+# 条件ごとの ERSP と ITC を読み込む関数
+# 戻り値: (ERSP, ITC, ヘッダ)
+def load_ersp_itc(path, mmap=True):
+    with open(path + ".json", encoding="utf-8") as f:
+        header = json.load(f)
+    ersp, itc = np.load(path + ".npy", mmap_mode="r" if mmap else None)
+    return ersp, itc, header
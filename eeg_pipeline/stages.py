@@ -0,0 +1,1117 @@
+#######################################################################################################
+#  2026/10/18 作成
+#
+# 【概要】解析パイプラインの各処理段階
+# 番号付きスクリプト（0_before_10.py 〜 5_plot.py）の処理本体を関数としてまとめたもの。
+# GUI（番号付きスクリプト）とコマンドライン（python -m eeg_pipeline）の両方から呼び出す。
+#
+# 【処理段階】
+# - run_before     : 0_before_10.py  1024Hzデータを1ms間隔に補間
+# - run_filter     : 連続データのバンドパスフィルタ（2-40Hz, 2-10Hz などの複数帯域を1回の読み込みで出力）
+# - run_epoch      : 1_epoch*.py     TTL信号を基準にエポックを切り出す
+# - run_epoch_plot : 1_plot.py       エポック波形のプロット
+# - run_baseline   : 2_baseline.py   ベースライン補正
+# - run_sort       : 3_sort*.py      Correct試行とError試行の分類
+# - run_colave     : 4_colave.py     加算平均と差分波形の計算
+# - run_result_plot: 5_plot*.py      加算平均波形のプロット
+# - run_fused      : 1_epoch → 2_baseline → 3_sort → 4_colave をメモリ上でまとめて実行（融合モード）
+# - run_spectrum   : 全電極・全エポックの短時間フーリエ変換（eeg_analyze.m のスペクトログラム出力）
+# - run_ersp       : Morletウェーブレットによる条件ごとの ERSP（事象関連スペクトル摂動）と ITC（試行間位相一致度）
+# - run_stats      : Error試行とCorrect試行の差のクラスタベース置換検定
+# - run_realtime   : 計測中のデータからエポックを逐次切り出し、加算平均を更新（閉ループ実験用）
+#
+# 【注意】
+# - clean=True はエラーなしセッション（*_clean.py）に対応する
+# - sfreq=1024 は 2-10Hz フィルタ版（*_10.py）に対応する。ICA処理済みデータ（1024Hz）をそのまま入力すると
+#   エポック範囲のみを1ms間隔に補間する。0_before_10.py の出力（バイナリ形式またはCSV）も入力できる
+#######################################################################################################
+
+import json
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from eeg_pipeline.accumulator import (CONFIDENCE_LEVEL, Accumulator, difference_interval, has_accumulator,
+                                      load_accumulator, save_accumulator)
+from eeg_pipeline.baseline import BASELINE_WINDOW, apply_baseline, baseline_table
+from eeg_pipeline.cache import run_cached
+from eeg_pipeline.epoching import (EPOCH_START, EPOCH_END, extract_epochs,
+                                   extract_epochs_resampled)
+from eeg_pipeline.events import EVENT_COLUMN, load_event_table, load_event_times
+from eeg_pipeline.filtering import FILTER_BANDS, FILTER_ORDER, FilterBank
+from eeg_pipeline.permutation import N_PERMUTATIONS, CLUSTER_ALPHA, ALPHA, SEED, cluster_test
+from eeg_pipeline.plotting import EPOCH_PLOT_DPI, plot_epochs, plot_epoch_overviews
+from eeg_pipeline.profiling import PROFILE_DIR, Profiler, count
+from eeg_pipeline.realtime import BLOCK_SIZE, HOST, PORT, FileReplaySource, SocketSource, RealtimeErrP
+from eeg_pipeline.resample import LinearResampler, resample_csv, export_continuous_csv
+from eeg_pipeline.spectral import (WINDOW_LENGTH, OVERLAP, WAVELET_FREQS, N_CYCLES, compute_spectrum,
+                                   ersp_itc, save_ersp_itc, save_spectrum)
+from eeg_pipeline.streaming import CHUNK_SIZE, iter_csv_chunks, stream_epochs, stream_epochs_resampled
+from eeg_pipeline.store import (EpochSet, EPOCH_STORE, BASELINE_STORE, CORRECT_STORE, ERROR_STORE, LABEL_STORE,
+                                ContinuousWriter, has_epochs, load_epochs, save_epochs, export_csv, continuous_path,
+                                load_continuous, has_labels, label_views, save_labels)
+
+# 電極リスト
+ELECTRODES = ["F3", "Fz", "F4", "FCz", "Cz"]
+
+# 1000Hzデータにおける電極と対応するICAデータの列番号
+ICA_COLUMNS = {"F3": 1, "Fz": 2, "F4": 3, "FCz": 4, "Cz": 5}
+ICA_COLUMNS_CLEAN = {"F3": 0, "Fz": 1, "F4": 2, "FCz": 3, "Cz": 4}
+
+# 試行の種類ごとの Accumulator の保存名（calc/ave 以下）
+ACCUMULATOR_NAME = "{}_accumulator"
+
+# TTL信号の行範囲（None: 生データの "Event Time" 列で値のある行をすべて使う（自動検出）,
+# slice(5, 61) などを指定するとその行範囲のTTLのみを使う）
+# エポック番号は検出したTTLの順番（1000Hz: 0始まり, 1024Hz: 1始まり）のため、試行以外のイベントがある場合は指定する
+# （TTLの数が combined_data.csv の試行数と一致しない場合はエラーにする）
+TTL_ROWS = None
+
+
+# ラベル情報（combined_data.csv）のパス
+def label_file_path(root_dir, clean=False):
+    log_dir_name = "pkl_analysis_noerror" if clean else "pkl_analysis"
+    return os.path.join(root_dir, "log", log_dir_name, "combined_data.csv")
+
+
+# 生データからTTL信号の行と時刻 [ms] を取得する関数（"Event Time" 列のみを読み込み, 生データごとにキャッシュ）
+# 戻り値: (生データの行番号, TTL時刻 [ms])（TTL_ROWS を指定した場合はその行範囲のみ）
+def load_ttl_events(raw_data_file):
+    rows, times_ms = load_event_times(raw_data_file)
+    if TTL_ROWS is not None:
+        keep = (rows >= TTL_ROWS.start) & (rows < TTL_ROWS.stop)
+        rows, times_ms = rows[keep], times_ms[keep]
+    return rows, times_ms
+
+
+# 生データからTTL信号の時刻 [ms] を取得する関数
+def load_ttl_times_ms(raw_data_file):
+    return load_ttl_events(raw_data_file)[1]
+
+
+# 検出したTTLの数とラベル（combined_data.csv）の試行数を比べる関数（一致しない場合は ValueError）
+# エポック番号はTTLの順番のため、試行以外のイベントがあるとラベルがずれる（ずれたまま加算平均しないよう中断する）
+def check_ttl_count(ttl_rows, label_path):
+    if label_path is None or not os.path.isfile(label_path):
+        return
+    n_labels = len(pd.read_csv(label_path, usecols=["Epoch"]))
+    if n_labels != len(ttl_rows):
+        rows = f"（{ttl_rows[0]}〜{ttl_rows[-1]}行目）" if len(ttl_rows) else ""
+        raise ValueError(f"検出したTTL信号 {len(ttl_rows)} 個{rows}と {label_path} の試行 {n_labels} 件の数が一致しません。"
+                         f"試行以外のイベントが含まれている場合は eeg_pipeline/stages.py の TTL_ROWS で"
+                         f"試行のTTLの行範囲（例: slice(5, 61)）を指定してください。")
+
+
+# ICA処理済みデータ（1列目: Time [s]）の先頭部分からサンプル間隔 [ms] を求める関数
+def sample_interval_ms(ica_data_file, n_rows=1000):
+    time_data = pd.read_csv(ica_data_file, nrows=n_rows).iloc[:, 0].to_numpy(dtype=float)
+    return float(np.median(np.diff(time_data))) * 1000
+
+
+# 0_before_10.py: ICA処理済みデータ（1024Hz）を1ms間隔に変換する
+# 全チャンネルをチャンク単位で一括処理し、バイナリ形式（"*_1ms.dat" / "*_1ms.json"）で保存する
+# method: "linear"（従来の線形補間）または "polyphase"（アンチエイリアスフィルタ付き）
+def run_before(ica_data_file, output_path=None, method="linear", chunk_size=CHUNK_SIZE, write_csv=False):
+    if output_path is None:
+        output_path = os.path.splitext(ica_data_file)[0] + "_1ms"
+
+    try:
+        resample_csv(ica_data_file, output_path, method=method, chunk_size=chunk_size)
+    except Exception as e:
+        print(f"データ読み込み中にエラーが発生しました: {e}")
+        raise
+
+    if write_csv:
+        export_continuous_csv(load_continuous(output_path), output_path + ".csv", chunk_size)
+    return output_path
+
+
+# 連続データのバンドパスフィルタ: ICA処理済みデータを1回だけ読み込み、帯域ごとの連続データをバイナリ形式で保存する
+# mode: "zero_phase"（記録全体にゼロ位相フィルタ, オフライン用）, "causal"（チャンクごとの因果的フィルタ, 省メモリ）
+# 出力先: "{ICAデータ名}_{帯域名}"（例: ica_2-10Hz）。1024Hzデータは 0_before_10.py と同様に1ms間隔に補間し、
+# "_1ms" を付けて保存する。出力は 1_epoch*.py（epoch --ica）の入力にそのまま使用できる
+# 戻り値: {帯域名: 出力先（拡張子なし）}
+def run_filter(ica_data_file, bands=FILTER_BANDS, mode="zero_phase", clean=False, sfreq=1000, order=FILTER_ORDER,
+               chunk_size=CHUNK_SIZE, output_prefix=None):
+    if output_prefix is None:
+        output_prefix = os.path.splitext(ica_data_file)[0]
+
+    if sfreq == 1024:
+        # 1列目: Time [s], 2列目以降: 各電極（ヘッダあり）。1ms間隔でなければフィルタ後に補間する
+        read_columns = list(pd.read_csv(ica_data_file, nrows=0).columns)
+        channels, header = read_columns[1:], 0
+        interval_ms = sample_interval_ms(ica_data_file)
+    else:
+        # 1行目 = 1[ms], 2行目 = 2[ms], ... の時間軸（ヘッダなし）
+        columns = ICA_COLUMNS_CLEAN if clean else ICA_COLUMNS
+        read_columns = [columns[electrode] for electrode in ELECTRODES]
+        channels, header = ELECTRODES, None
+        interval_ms = 1.0
+    resample = not np.isclose(interval_ms, 1.0)
+    bank = FilterBank(bands, 1000 / interval_ms, order)
+    suffix = "_1ms" if resample else ""
+    paths = {name: f"{output_prefix}_{name}{suffix}" for name in bands}
+
+    writers, resamplers = {}, {}
+    total = 0
+
+    # フィルタ後の (時間軸 [s], {帯域名: データ}) を帯域ごとに保存する
+    def write(times, filtered):
+        for name, data in filtered.items():
+            if name not in writers:
+                writers[name] = ContinuousWriter(paths[name], channels, 1000, t0=times[0])
+                resamplers[name] = LinearResampler(0.001)
+            if resample:
+                _, data = resamplers[name].process(times, data)
+            writers[name].write(data)
+
+    start = time.perf_counter()
+    try:
+        chunks = []
+        for chunk in iter_csv_chunks(ica_data_file, read_columns, chunk_size, header):
+            if sfreq == 1024:
+                times, data = chunk[0], chunk[1:]
+            else:
+                times, data = (total + np.arange(1, chunk.shape[1] + 1)) / 1000, chunk
+            total += chunk.shape[1]
+            if mode == "causal":
+                write(times, bank.process(data))
+            else:
+                chunks.append((times, data))
+        if mode != "causal" and chunks:
+            times = np.concatenate([chunk_times for chunk_times, _ in chunks])
+            data = np.concatenate([chunk_data for _, chunk_data in chunks], axis=1)
+            write(times, bank.filtfilt(data))
+    except Exception as e:
+        print(f"データ読み込み中にエラーが発生しました: {e}")
+        raise
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+    print(f"✅ {total} サンプル × {len(channels)} チャンネルに {len(bands)} 帯域のフィルタを適用しました"
+          f"（{mode}, {time.perf_counter() - start:.2f}秒）。")
+    return paths
+
+
+# 1_epoch.py / 1_epoch_clean.py / 1_epoch_10.py: エポックの切り出し
+# 切り出したエポックを calc/epoch_summary に保存する（切り出し処理は extract_epoch_set）
+def run_epoch(root_dir, raw_data_file, ica_data_file, clean=False, sfreq=1000, write_csv=False, stream=False,
+              chunk_size=CHUNK_SIZE):
+    summary_output_dir = os.path.join(root_dir, "calc", "epoch_summary")
+    os.makedirs(summary_output_dir, exist_ok=True)
+
+    epoch_set = extract_epoch_set(raw_data_file, ica_data_file, clean=clean, sfreq=sfreq, stream=stream,
+                                  chunk_size=chunk_size, label_path=label_file_path(root_dir, clean))
+    if epoch_set is None:
+        return None
+
+    save_epochs(os.path.join(root_dir, "calc", EPOCH_STORE), epoch_set)
+    if write_csv:
+        export_csv(epoch_set, summary_output_dir, "epoch_summary", time_column=epoch_set.meta["time_column"])
+    return epoch_set
+
+
+# 生データとICA処理済みデータから、全電極・全エポックを EpochSet として切り出す関数（ファイルには保存しない）
+# baseline_mode を指定した場合は、切り出した配列をそのままベースライン補正する（データの読み書きは1回のみ）
+# その場合、補正の方法・区間・ベースライン値は meta["baseline"] に記録する
+# sfreq=1024 で1ms間隔でないデータ（ICA処理済みデータそのもの）の場合は、元のサンプルから
+# エポック範囲のみを1ms間隔に補間する（0_before_10.py による連続データ全体の補間は不要）
+# stream=True の場合はICA処理済みデータを chunk_size 行ずつ読み込み、使用メモリを計測時間に依存させない
+# エポック番号は検出したTTLの順番（除外したTTLの番号は欠番）, 各エポックのTTLの行番号は meta["ttl_rows"]
+# label_path を指定した場合は、TTLの数とラベルの試行数が一致しないときに警告する
+def extract_epoch_set(raw_data_file, ica_data_file, clean=False, sfreq=1000, stream=False, chunk_size=CHUNK_SIZE,
+                      baseline_mode=None, baseline_window=BASELINE_WINDOW, label_path=None):
+    # 0_before_10.py の出力がバイナリ形式の場合は memmap で参照する（ストリーミング不要）
+    store_path = continuous_path(ica_data_file)
+    stream = stream and store_path is None
+
+    # 1ms間隔でない1024Hzデータは、エポック範囲のみを補間する
+    interval_ms = sample_interval_ms(ica_data_file) if sfreq == 1024 and store_path is None else 1.0
+    native = not np.isclose(interval_ms, 1.0)
+
+    # データの読み込み（ストリーミング時はICAデータを読み込まない）
+    try:
+        ttl_rows, ttl_times_ms = load_ttl_events(raw_data_file)
+        if store_path is not None:
+            continuous_set = load_continuous(store_path)
+            count(samples=continuous_set.data.shape[1])
+        elif not stream:
+            ica_data = pd.read_csv(ica_data_file, header=0 if sfreq == 1024 else None)
+            count(samples=len(ica_data))
+        print("✅ 生データとICA処理済みデータが正常に読み込まれました。")
+    except Exception as e:
+        print(f"データ読み込み中にエラーが発生しました: {e}")
+        raise
+    check_ttl_count(ttl_rows, label_path)
+
+    if sfreq == 1024:
+        # ICA処理済みデータ（1024Hz）または 0_before_10.py で1ms間隔に補間したデータ（1列目: Time [s]）
+        ttl_times_ms = np.round(ttl_times_ms, decimals=6)
+        time_column, column_format, first_id = "Time [ms]", "Epoch {}", 1
+    else:
+        ttl_times_ms = np.round(ttl_times_ms)
+        columns = ICA_COLUMNS_CLEAN if clean else ICA_COLUMNS
+        ica_columns = [columns[electrode] for electrode in ELECTRODES]
+        time_column, column_format, first_id = "TIME", "{}", 0  # 従来のCSV列名（0始まり）と同じ番号
+
+    if stream:
+        # チャンクごとに読み込み、エポック範囲が揃ったTTLから順に切り出す
+        if native:
+            ica_time_column = pd.read_csv(ica_data_file, nrows=0).columns[0]
+            epochs, kept_ttl = stream_epochs_resampled(ica_data_file, ttl_times_ms, ELECTRODES, ica_time_column,
+                                                       sfreq=1000 / interval_ms, chunk_size=chunk_size)
+        elif sfreq == 1024:
+            ica_time_column = pd.read_csv(ica_data_file, nrows=0).columns[0]
+            epochs, kept_ttl = stream_epochs(ica_data_file, ttl_times_ms, ELECTRODES, time_column=ica_time_column,
+                                             header=0, time_scale=1000, tolerance=1, chunk_size=chunk_size)
+        else:
+            epochs, kept_ttl = stream_epochs(ica_data_file, ttl_times_ms, ica_columns, chunk_size=chunk_size)
+        print(f"有効なTTL信号の数: {int(kept_ttl.sum())}")
+    elif native:
+        # 元のサンプリング周波数のまま、エポック範囲の時刻のみを1ms間隔に補間して一括で切り出す
+        time_data = ica_data.iloc[:, 0].to_numpy(dtype=float) * 1000
+        electrode_data = ica_data[ELECTRODES].to_numpy(dtype=float).T
+        epochs, kept_ttl = extract_epochs_resampled(electrode_data, time_data, ttl_times_ms, EPOCH_START, EPOCH_END)
+        print(f"有効なTTL信号の数: {int(kept_ttl.sum())}")
+    else:
+        electrode_rows = None
+        if store_path is not None:
+            # 全チャンネルのまま切り出し、切り出したエポックから電極を選ぶ（連続データはコピーしない）
+            events = load_event_table(raw_data_file, ttl_times_ms, continuous_set.times_ms, ttl_rows, tolerance=1)
+            electrode_data = continuous_set.data
+            electrode_rows = [continuous_set.channels.index(electrode) for electrode in ELECTRODES]
+        elif sfreq == 1024:
+            time_data = np.round(ica_data.iloc[:, 0].values * 1000, decimals=6)
+            events = load_event_table(raw_data_file, ttl_times_ms, time_data, ttl_rows, tolerance=1)
+            electrode_data = np.ascontiguousarray(ica_data[ELECTRODES].to_numpy(dtype=float).T)
+        else:
+            # 時間データの生成（1行目 = 1[ms], 2行目 = 2[ms], ...）
+            events = load_event_table(raw_data_file, ttl_times_ms, np.arange(1, len(ica_data) + 1), ttl_rows)
+            electrode_data = np.ascontiguousarray(ica_data.iloc[:, ica_columns].to_numpy(dtype=float).T)
+        ttl_indices, valid_ttl = events["Sample"].to_numpy(), events["Valid"].to_numpy()
+        print(f"有効なTTL信号の数: {int(valid_ttl.sum())}")
+
+        # 全電極のデータを (電極, サンプル) の配列にまとめ、全エポックを一括で切り出す
+        epochs, kept_ttl = extract_epochs(electrode_data, ttl_indices, EPOCH_START, EPOCH_END, valid=valid_ttl)
+        if electrode_rows is not None:
+            epochs = epochs[electrode_rows]
+        for ttl in ttl_times_ms[events["Matched"].to_numpy() & ~valid_ttl]:
+            print(f"TTL {ttl} はエポック範囲がデータ範囲外のため除外しました。")
+
+    # 統合データの保存処理
+    if not epochs.shape[1]:
+        print("統合データが空です。")
+        return None
+
+    # エポック番号はTTLの順番から付ける（範囲外などで除外したTTLがあっても、後のエポックの番号はずれない）
+    epoch_set = EpochSet(epochs, ELECTRODES, np.arange(EPOCH_START, EPOCH_END), 1000,
+                         epoch_ids=first_id + np.flatnonzero(kept_ttl),
+                         meta={"column_format": column_format, "time_column": time_column,
+                               "ttl_rows": ttl_rows[kept_ttl].tolist()})
+    count(epochs=epoch_set.n_epochs)
+    if baseline_mode is not None:
+        epoch_set, _ = baseline_correct(epoch_set, baseline_mode, baseline_window, inplace=True)
+    return epoch_set
+
+
+# 1_plot.py: 各エポックのオリジナル波形とズームイン波形をプロット
+# 図を使い回し、電極・エポック範囲ごとにプロセスプールで並列に描画する（workers=1 で逐次描画）
+# mode: "epochs"（エポックごとのPNG）, "erp_image"（ERPイメージ）, "grid"（格子表示）, "overview"（ERPイメージと格子表示）
+# sort_by_label=True の場合、一覧表示のエポックを combined_data.csv のラベル（Correct/Error）順に並べる
+# epoch_set を指定した場合は、ファイルを読み込まずにメモリ上のエポックデータを描画する（融合モード）
+def run_epoch_plot(root_dir, electrodes=None, show_ttl=False, workers=None, dpi=EPOCH_PLOT_DPI, mode="epochs",
+                   sort_by_label=False, clean=False, epoch_set=None):
+    calc_dir = os.path.join(root_dir, "calc")
+    summary_output_dir = os.path.join(calc_dir, "epoch_summary")
+
+    # バイナリ形式のエポックデータがあれば読み込み（memmap）
+    epoch_store_path = os.path.join(calc_dir, EPOCH_STORE)
+    if epoch_set is None and has_epochs(epoch_store_path):
+        epoch_set = load_epochs(epoch_store_path)
+
+    # 各電極の統合データを読み込み、描画する内容をまとめる
+    jobs = []
+    for electrode in electrodes or ELECTRODES:
+        summary_csv_path = os.path.join(summary_output_dir, f"{electrode}_epoch_summary.csv")
+
+        if epoch_set is not None and electrode in epoch_set.electrodes:
+            time = epoch_set.times
+            epoch_data = epoch_set.electrode(electrode)
+            epoch_ids = epoch_set.epoch_ids
+        elif os.path.exists(summary_csv_path):
+            data = pd.read_csv(summary_csv_path)
+            time = data["TIME"]
+            epoch_data = data.iloc[:, 1:].to_numpy().T
+            epoch_ids = [int(str(column).replace("Epoch ", "")) for column in data.columns[1:]]
+        else:
+            print(f"{summary_csv_path} が見つかりませんでした。")
+            continue
+
+        jobs.append((electrode, time, epoch_data, epoch_ids, os.path.join(calc_dir, "plots", electrode)))
+
+    if mode == "epochs":
+        plot_epochs([(electrode, time, epoch_data, plot_dir) for electrode, time, epoch_data, _, plot_dir in jobs],
+                    workers=workers, show_ttl=show_ttl, dpi=dpi)
+        return
+
+    # 一覧表示: 電極ごとに1枚（calc/plots/{電極名}/erp_image.png, grid.png）
+    labels = None
+    if sort_by_label:
+        combined_data_path = label_file_path(root_dir, clean)
+        if os.path.isfile(combined_data_path):
+            combined_df = pd.read_csv(combined_data_path)
+            labels = dict(zip(combined_df["Epoch"].astype(int), combined_df["ErrP"].astype(int)))
+        else:
+            print(f"combined_data.csv が見つからないため、エポック番号順に表示します: {combined_data_path}")
+    modes = ("erp_image", "grid") if mode == "overview" else (mode,)
+    plot_epoch_overviews(jobs, modes=modes, labels=labels, workers=workers, dpi=dpi)
+
+
+# 2_baseline.py: -1000msから0msまでの平均値によるベースライン補正
+def run_baseline(root_dir, write_csv=False, mode="electrode", window=BASELINE_WINDOW):
+    calc_dir = os.path.join(root_dir, "calc")
+    input_dir = os.path.join(calc_dir, "epoch_summary")
+    output_dir = os.path.join(calc_dir, "baseline")
+    os.makedirs(output_dir, exist_ok=True)
+
+    corrected_set = None
+
+    epoch_store_path = os.path.join(calc_dir, EPOCH_STORE)
+    if has_epochs(epoch_store_path):
+        # バイナリ形式のエポックデータを読み込み（memmap）
+        epoch_set = load_epochs(epoch_store_path)
+
+        corrected_set, table = baseline_correct(epoch_set, mode, window)
+        count(epochs=corrected_set.n_epochs)
+        save_epochs(os.path.join(calc_dir, BASELINE_STORE), corrected_set)
+        if write_csv:
+            export_csv(corrected_set, output_dir, "base")
+    else:
+        # "calc/epoch_summary" 内のCSVファイルを取得
+        csv_files = [f for f in os.listdir(input_dir) if f.endswith("_epoch_summary.csv")]
+
+        tables = []
+        for file_name in csv_files:
+            file_path = os.path.join(input_dir, file_name)
+
+            # CSVファイルをロード
+            data = pd.read_csv(file_path)
+
+            # "Time [ms]"列を除外し、エポックデータを (1, エポック, サンプル) の配列としてベースライン補正
+            epochs_data = data.iloc[:, 1:]
+            electrode_name = file_name.replace("_epoch_summary.csv", "")
+            corrected, values = apply_baseline(epochs_data.to_numpy(dtype=float).T[None], data["Time [ms]"], mode,
+                                               window)
+
+            # ベースライン補正値を記録
+            tables.append(baseline_table(values, [electrode_name], list(epochs_data.columns), mode))
+            if mode == "electrode":
+                print(f"{file_name} のベースライン補正値: {values.item()}")
+
+            # 補正後のデータを保存
+            baseline_corrected_data = pd.DataFrame(corrected[0].T, columns=epochs_data.columns)
+            baseline_corrected_data.insert(0, "Time [ms]", data["Time [ms]"])  # "Time [ms]"列を復元
+            output_file_path = os.path.join(output_dir, f"{electrode_name}_base.csv")
+            baseline_corrected_data.to_csv(output_file_path, index=False, encoding='utf-8-sig')
+
+            print(f"{file_name} のベースライン補正後のデータを保存しました: {output_file_path}")
+        table = pd.concat(tables, ignore_index=True) if tables else baseline_table([], [])
+
+    save_baseline_values(output_dir, table)
+    return corrected_set
+
+
+# ベースライン補正値の一覧表をCSV（baseline_values.csv）に保存する関数
+def save_baseline_values(output_dir, table):
+    os.makedirs(output_dir, exist_ok=True)
+    baseline_values_file_path = os.path.join(output_dir, "baseline_values.csv")
+    table.to_csv(baseline_values_file_path, index=False, encoding='utf-8-sig')
+    print(f"ベースライン補正値を保存しました: {baseline_values_file_path}")
+
+
+# ベースライン区間の平均値を一括計算し、全電極・全エポックから一括で減算する関数
+# mode: "electrode"（電極ごと, 従来と同じ）または "epoch"（電極・エポックごと）, window: ベースライン区間 [ms]
+# 戻り値: 補正後の EpochSet と、ベースライン値の一覧表
+def baseline_correct(epoch_set, mode="electrode", window=BASELINE_WINDOW, inplace=False):
+    corrected, values = apply_baseline(epoch_set.data, epoch_set.times, mode, window, inplace=inplace)
+    table = baseline_table(values, epoch_set.electrodes, epoch_set.epoch_ids, mode)
+    if mode == "electrode":
+        for electrode_name, baseline_value in zip(table["Electrode"], table["Baseline Value"]):
+            print(f"{electrode_name} のベースライン補正値: {baseline_value}")
+    else:
+        print(f"エポックごとのベースライン補正値を計算しました（{window[0]}〜{window[1]}ms）。")
+
+    meta = dict(epoch_set.meta, baseline={"mode": mode, "window": list(window),
+                                          "values": values.reshape(len(epoch_set.electrodes), -1).tolist()})
+    corrected_set = EpochSet(corrected, epoch_set.electrodes, epoch_set.times, epoch_set.sfreq, epoch_set.epoch_ids,
+                             meta)
+    return corrected_set, table
+
+
+# ラベル情報（combined_data.csv）から、試行の種類ごとのエポック番号を取得する関数
+# 戻り値: {"correct": [エポック番号, ...], "error": [...]}（エラーなしセッションは "correct" のみ）
+def load_label_groups(root_dir, clean=False):
+    combined_data_path = label_file_path(root_dir, clean)
+
+    # ファイル存在チェック
+    if not os.path.isfile(combined_data_path):
+        raise FileNotFoundError(f"combined_data.csv が見つかりません: {combined_data_path}")
+
+    combined_df = pd.read_csv(combined_data_path)
+
+    # Correct試行とError試行のエポックを分類（エラーなしセッションはCorrect試行のみ）
+    groups = {"correct": combined_df[combined_df["ErrP"] == 0]["Epoch"].astype(int).tolist()}
+    if not clean:
+        groups["error"] = combined_df[combined_df["ErrP"] == 1]["Epoch"].astype(int).tolist()
+    return groups
+
+
+# 3_sort*.py: ErrPラベルに基づくCorrect試行とError試行の分類
+# エポックデータはコピーせず、エポック軸に沿ったラベルの索引（calc/labels）のみを保存する
+def run_sort(root_dir, clean=False, sfreq=1000, write_csv=False):
+    # ベースライン補正後のエポックデータのディレクトリ設定
+    epoch_dir = os.path.join(root_dir, "calc", "baseline")
+
+    # 出力先ディレクトリの設定（従来のCSVの場合のみ）
+    output_error_dir = os.path.join(root_dir, "calc", "error")
+    output_correct_dir = os.path.join(root_dir, "calc", "correct")
+
+    # ラベル情報の読み込み
+    groups = load_label_groups(root_dir, clean)
+    output_dirs = {"correct": output_correct_dir, "error": output_error_dir}
+
+    # バイナリ形式のエポックデータがあれば、エポック番号からラベルの索引を作成する（エポックデータはコピーしない）
+    baseline_store_path = os.path.join(root_dir, "calc", BASELINE_STORE)
+    if has_epochs(baseline_store_path):
+        epoch_set = load_epochs(baseline_store_path)
+        save_labels(os.path.join(root_dir, "calc", LABEL_STORE), epoch_set.epoch_ids, groups)
+        count(epochs=epoch_set.n_epochs)
+        remove_label_copies(root_dir)
+        if write_csv:
+            for label, epochs in groups.items():
+                export_csv(epoch_set.view(epochs), output_dirs[label], label, time_as_index=True)
+    else:
+        os.makedirs(output_correct_dir, exist_ok=True)
+        if not clean:
+            os.makedirs(output_error_dir, exist_ok=True)
+
+        # 1024Hz版のCSVは列名が "Epoch {番号}" 形式
+        column_format = "Epoch {}" if sfreq == 1024 else "{}"
+
+        # 各電極のエポックデータを分類して保存
+        for electrode in sorted(ELECTRODES):
+            try:
+                # エポックデータの読み込み
+                electrode_file = os.path.join(epoch_dir, f"{electrode}_epoch_base.csv")
+                if not os.path.isfile(electrode_file):
+                    print(f"{electrode} のエポックデータが見つかりません: {electrode_file}")
+                    continue
+
+                electrode_data = pd.read_csv(electrode_file, index_col=0)
+
+                for label, epochs in groups.items():
+                    # 存在するエポック番号のみ抽出
+                    valid_epochs = [column_format.format(epoch) for epoch in epochs
+                                    if column_format.format(epoch) in electrode_data.columns]
+
+                    # 試行データの抽出と保存
+                    label_data = electrode_data.loc[:, valid_epochs]
+                    label_file = os.path.join(output_dirs[label], f"{electrode}_{label}.csv")
+                    label_data.to_csv(label_file, index=True, encoding='utf-8-sig')
+                    print(f"{electrode} の {label.capitalize()} 試行データを保存しました: {label_file}")
+
+            except Exception as e:
+                print(f"{electrode} のデータ処理中にエラーが発生しました: {e}")
+
+    print("すべてのエポックデータを分類して保存しました。")
+
+
+# 以前の 3_sort*.py が保存した試行の種類ごとのエポックデータ（コピー）を削除する関数
+# （ラベルの索引と内容が異なる古いデータが使われないようにする）
+def remove_label_copies(root_dir):
+    for store in (CORRECT_STORE, ERROR_STORE):
+        store_path = os.path.join(root_dir, "calc", store)
+        if has_epochs(store_path):
+            os.remove(store_path + ".npy")
+            os.remove(store_path + ".json")
+            print(f"ラベルの索引に置き換えたため、{store_path}.npy を削除しました。")
+
+
+# 試行の種類ごとのエポックデータを読み込む関数
+# ラベルの索引（calc/labels）があれば、ベースライン補正後のエポックデータ（calc/baseline）のビューを返す
+# （データはコピーしない）。索引がない場合は従来の calc/correct, calc/error のエポックデータを読み込む
+# 戻り値: {試行の種類: EpochSet}（見つからない試行の種類は含まない）
+def load_label_sets(root_dir):
+    calc_dir = os.path.join(root_dir, "calc")
+    label_path = os.path.join(calc_dir, LABEL_STORE)
+    baseline_store_path = os.path.join(calc_dir, BASELINE_STORE)
+    if has_labels(label_path) and has_epochs(baseline_store_path):
+        return label_views(label_path, load_epochs(baseline_store_path))
+
+    label_sets = {}
+    for label, store in [("correct", CORRECT_STORE), ("error", ERROR_STORE)]:
+        store_path = os.path.join(calc_dir, store)
+        if has_epochs(store_path):
+            label_sets[label] = load_epochs(store_path)
+    return label_sets
+
+
+# 4_colave.py: Correct試行とError試行の加算平均と差分波形の計算
+# 試行の種類ごとに試行数・平均・偏差平方和（Accumulator）を求め、calc/ave に保存する
+# update=True の場合は、保存済みの Accumulator にまだ含まれていないエポックのみを追加する
+def run_colave(root_dir, update=False):
+    # CorrectデータとErrorデータのディレクトリ設定
+    correct_dir = os.path.join(root_dir, "calc", "correct")
+    error_dir = os.path.join(root_dir, "calc", "error")
+
+    # 試行の種類ごとの Accumulator
+    accumulators = {}
+    label_sets = load_label_sets(root_dir)
+    if label_sets:
+        # ラベルの索引（またはバイナリ形式のエポックデータ）から、全電極の加算平均を一括で計算
+        if update:
+            accumulators = update_accumulators(root_dir, label_sets)
+        else:
+            accumulators = compute_accumulators(label_sets)
+    else:
+        # 従来のCSVから読み込む（各ファイルは1回だけ読み込む）
+        for label, input_dir in [("correct", correct_dir), ("error", error_dir)]:
+            if not os.path.isdir(input_dir):
+                print(f"{input_dir} が見つかりませんでした。")
+                continue
+            frames = {file_name.split("_")[0]: pd.read_csv(os.path.join(input_dir, file_name), index_col=0)
+                      for file_name in sorted(os.listdir(input_dir)) if file_name.endswith(".csv")}
+            if not frames:
+                continue
+            first = next(iter(frames.values()))
+            accumulators[label] = Accumulator(list(frames), first.index).update(
+                np.stack([frame.to_numpy(dtype=float).T for frame in frames.values()]), first.columns)
+
+    count(epochs=sum(accumulator.count for accumulator in accumulators.values()))
+    write_averages(root_dir, accumulators)
+    return accumulators
+
+
+# 試行の種類ごとの EpochSet から、全電極の Accumulator を一括で計算する関数
+# 戻り値: {試行の種類: Accumulator}
+def compute_accumulators(label_sets):
+    return {label: Accumulator.from_epochs(epoch_set) for label, epoch_set in label_sets.items()}
+
+
+# 保存済みの Accumulator に、まだ含まれていないエポックのみを追加する関数
+# 保存済みのエポックが分類結果から外れた場合（ラベルの変更など）は、全エポックから計算し直す
+def update_accumulators(root_dir, label_sets):
+    accumulators = {}
+    for label, epoch_set in label_sets.items():
+        path = os.path.join(root_dir, "calc", "ave", ACCUMULATOR_NAME.format(label))
+        accumulator = load_accumulator(path) if has_accumulator(path) else None
+        epoch_keys = [str(epoch_id) for epoch_id in epoch_set.epoch_ids]
+        known_keys = set() if accumulator is None else set(accumulator.keys)
+        if (accumulator is None or accumulator.electrodes != epoch_set.electrodes
+                or not np.array_equal(accumulator.times, epoch_set.times)
+                or not known_keys <= set(epoch_keys)):
+            print(f"{label} 試行は全エポックから加算平均を計算します。")
+            accumulators[label] = Accumulator.from_epochs(epoch_set)
+            continue
+        new_ids = [epoch_id for epoch_id, key in zip(epoch_set.epoch_ids, epoch_keys)
+                   if key not in known_keys]
+        print(f"{label} 試行: {len(new_ids)} エポックを追加します（計 {accumulator.count + len(new_ids)} 試行）。")
+        new_set = epoch_set.select(new_ids)
+        accumulators[label] = accumulator.update(new_set.data, new_set.epoch_ids)
+    return accumulators
+
+
+# 加算平均（calc/ave）と比較用CSV（calc/comp）を保存する関数
+# 比較用CSVには、各条件の標準偏差・標準誤差・信頼区間と、差分波形の標準誤差・信頼区間も出力する
+# output_dir: ave, comp の保存先（省略時は calc）
+def write_averages(root_dir, accumulators, output_dir=None, level=CONFIDENCE_LEVEL):
+    # 出力先ディレクトリ
+    output_dir = output_dir or os.path.join(root_dir, "calc")
+    ave_output_dir = os.path.join(output_dir, "ave")
+    comp_output_dir = os.path.join(output_dir, "comp")
+    os.makedirs(ave_output_dir, exist_ok=True)
+    os.makedirs(comp_output_dir, exist_ok=True)
+
+    # 各電極の子ディレクトリ作成（比較用CSV用）
+    electrodes = sorted(ELECTRODES)
+    for electrode in electrodes:
+        os.makedirs(os.path.join(comp_output_dir, electrode), exist_ok=True)
+
+    # 加算平均と Accumulator の保存
+    time_index = {}
+    for label, accumulator in accumulators.items():
+        time_index[label] = pd.Index(accumulator.times, name="Time [ms]")
+        for i, electrode in enumerate(accumulator.electrodes):
+            output_file = os.path.join(ave_output_dir, f"{electrode}_{label}_ave.csv")
+            grand_average = pd.Series(accumulator.mean[i], index=time_index[label])
+            grand_average.to_csv(output_file, header=["Amplitude [μV]"], index_label="Time [ms]", encoding='utf-8-sig')
+            print(f"{electrode} の {label} 試行の加算平均を {output_file} に保存しました。")
+        save_accumulator(os.path.join(ave_output_dir, ACCUMULATOR_NAME.format(label)), accumulator)
+
+    # 比較用CSV作成
+    correct, error = accumulators.get("correct"), accumulators.get("error")
+    if correct is not None and error is not None:
+        difference_sem, difference_lower, difference_upper = difference_interval(error, correct, level)
+        dispersion = {label: (accumulator.sd, accumulator.sem, *accumulator.confidence_interval(level))
+                      for label, accumulator in [("Error", error), ("Correct", correct)]}
+    for electrode in electrodes:
+        if correct is not None and error is not None and electrode in correct.electrodes \
+                and electrode in error.electrodes:
+            e, c = error.electrodes.index(electrode), correct.electrodes.index(electrode)
+            combined_data = pd.DataFrame({
+                "Time [ms]": time_index["correct"],
+                "Error Average [μV]": error.mean[e],
+                "Correct Average [μV]": correct.mean[c],
+                "Difference [μV]": error.mean[e] - correct.mean[c]
+            })
+            # ばらつきの指標（平均の信頼区間は level の両側区間）
+            for label, row in [("Error", e), ("Correct", c)]:
+                sd, sem, lower, upper = dispersion[label]
+                combined_data[f"{label} SD [μV]"] = sd[row]
+                combined_data[f"{label} SEM [μV]"] = sem[row]
+                combined_data[f"{label} CI Lower [μV]"] = lower[row]
+                combined_data[f"{label} CI Upper [μV]"] = upper[row]
+            combined_data["Difference SEM [μV]"] = difference_sem[e]
+            combined_data["Difference CI Lower [μV]"] = difference_lower[e]
+            combined_data["Difference CI Upper [μV]"] = difference_upper[e]
+
+            output_file = os.path.join(comp_output_dir, electrode, f"{electrode}_comp.csv")
+            combined_data.to_csv(output_file, index=False, encoding='utf-8-sig')
+            print(f"{electrode} の比較用CSVを保存しました: {output_file}")
+        else:
+            print(f"{electrode} のデータが見つかりませんでした。")
+
+    print("全ての加算平均と比較CSVの作成が完了しました。")
+
+
+# 1_epoch → 2_baseline → 3_sort → 4_colave を1つのプロセス内でまとめて実行する（融合モード）
+# エポックデータはメモリ上で受け渡し、加算平均（calc/ave, calc/comp）のみを保存する
+# write_intermediates=True の場合は、各段階のエポックデータ（バイナリ形式）も従来と同じ場所に保存する
+# keep_epochs=True の場合は、補正前のエポックデータも戻り値に残す（エポック波形のプロット用）
+def run_fused(root_dir, raw_data_file, ica_data_file, clean=False, sfreq=1000, write_intermediates=False,
+              write_csv=False, stream=False, chunk_size=CHUNK_SIZE, baseline_mode="electrode",
+              baseline_window=BASELINE_WINDOW, keep_epochs=False):
+    calc_dir = os.path.join(root_dir, "calc")
+
+    if write_intermediates or keep_epochs:
+        # 補正前のエポックデータも使うため、補正後のデータは別の配列とする
+        epoch_set = extract_epoch_set(raw_data_file, ica_data_file, clean=clean, sfreq=sfreq, stream=stream,
+                                      chunk_size=chunk_size, label_path=label_file_path(root_dir, clean))
+        if epoch_set is None:
+            return None
+        corrected_set, table = baseline_correct(epoch_set, baseline_mode, baseline_window)
+    else:
+        # 切り出した配列をそのままベースライン補正する（補正前のデータは保持しない）
+        epoch_set = None
+        corrected_set = extract_epoch_set(raw_data_file, ica_data_file, clean=clean, sfreq=sfreq, stream=stream,
+                                          chunk_size=chunk_size, baseline_mode=baseline_mode,
+                                          baseline_window=baseline_window, label_path=label_file_path(root_dir, clean))
+        if corrected_set is None:
+            return None
+        table = baseline_table(corrected_set.meta["baseline"]["values"], corrected_set.electrodes,
+                               corrected_set.epoch_ids, baseline_mode)
+
+    # エポック番号で Correct/Error 試行を選択（データはコピーせず、加算平均の計算時に読み込む）
+    groups = load_label_groups(root_dir, clean)
+    label_sets = {label: corrected_set.view(epochs) for label, epochs in groups.items()}
+    accumulators = compute_accumulators(label_sets)
+
+    if write_intermediates:
+        save_epochs(os.path.join(calc_dir, EPOCH_STORE), epoch_set)
+        save_epochs(os.path.join(calc_dir, BASELINE_STORE), corrected_set)
+        save_labels(os.path.join(calc_dir, LABEL_STORE), corrected_set.epoch_ids, groups)
+        remove_label_copies(root_dir)
+        if write_csv:
+            export_csv(epoch_set, os.path.join(calc_dir, "epoch_summary"), "epoch_summary",
+                       time_column=epoch_set.meta["time_column"])
+            export_csv(corrected_set, os.path.join(calc_dir, "baseline"), "base")
+            for label, label_set in label_sets.items():
+                export_csv(label_set, os.path.join(calc_dir, label), label, time_as_index=True)
+
+    save_baseline_values(os.path.join(calc_dir, "baseline"), table)
+    write_averages(root_dir, accumulators)
+    return {"epochs": epoch_set, "baseline": corrected_set, **label_sets, "accumulators": accumulators}
+
+
+# 時間周波数解析: eeg_analyze.m のスペクトログラム出力（チャンネルごとに Excel へ保存）の置き換え
+# calc/epoch_summary のエポックデータ（1_epoch*.py の出力）の全電極・全エポックのSTFTをまとめて計算し、
+# 刺激前のフレームでベースライン補正した結果を calc/spectrum/stft.npy（ヘッダ: stft.json）に保存する
+def run_spectrum(root_dir, window_length=WINDOW_LENGTH, overlap=OVERLAP, nfft=None, quantity="magnitude",
+                 baseline_window=BASELINE_WINDOW, fmax=None):
+    store_path = os.path.join(root_dir, "calc", EPOCH_STORE)
+    if not has_epochs(store_path):
+        raise FileNotFoundError(f"{store_path}.npy が見つかりません（1_epoch*.py を先に実行してください）。")
+    epoch_set = load_epochs(store_path)
+
+    start = time.perf_counter()
+    spectrum_set = compute_spectrum(epoch_set, window_length, overlap, nfft, quantity, baseline_window, fmax)
+    print(f"{len(spectrum_set.electrodes)} 電極 × {len(spectrum_set.epoch_ids)} エポックのSTFTを計算しました"
+          f"（周波数 {len(spectrum_set.freqs)} 点 × フレーム {len(spectrum_set.times)} 個, "
+          f"{time.perf_counter() - start:.2f}秒）。")
+    save_spectrum(os.path.join(root_dir, "calc", "spectrum", "stft"), spectrum_set)
+    return spectrum_set
+
+
+# 時間周波数解析: Correct試行とError試行の ERSP [dB] と ITC（Morletウェーブレット）
+# Correct試行とError試行のエポックデータ（3_sort*.py のラベルの索引によるビュー）をまとめて1回で変換し、
+# 条件ごとの結果を calc/spectrum/{correct,error}_ersp_itc に保存する
+def run_ersp(root_dir, freqs=WAVELET_FREQS, n_cycles=N_CYCLES, baseline_window=BASELINE_WINDOW, decim=1):
+    calc_dir = os.path.join(root_dir, "calc")
+    label_sets = load_label_sets(root_dir)
+    if "correct" not in label_sets or "error" not in label_sets:
+        raise FileNotFoundError(f"{calc_dir} に Correct/Error 試行の分類結果が見つかりません（3_sort*.py を先に実行してください）。")
+
+    # 両条件のエポックを (電極, エポック, サンプル) の1つの配列にまとめ、条件はエポックの位置で区別する
+    conditions, offset = {}, 0
+    for label, epoch_set in label_sets.items():
+        conditions[label] = np.arange(offset, offset + epoch_set.n_epochs)
+        offset += epoch_set.n_epochs
+    reference = label_sets["correct"]
+    data = np.concatenate([epoch_set.data for epoch_set in label_sets.values()], axis=1)
+
+    start = time.perf_counter()
+    results, times = ersp_itc(data, reference.times, reference.sfreq, conditions, freqs, n_cycles, baseline_window,
+                              decim)
+    print(f"{len(reference.electrodes)} 電極 × {data.shape[1]} エポックのウェーブレット変換を計算しました"
+          f"（周波数 {len(freqs)} 点, {time.perf_counter() - start:.2f}秒）。")
+
+    for label, (ersp, itc) in results.items():
+        meta = {"label": label, "n_epochs": len(conditions[label]),
+                "n_cycles": np.broadcast_to(n_cycles, len(freqs)).tolist(),
+                "baseline_window": list(baseline_window), "sfreq": reference.sfreq}
+        save_ersp_itc(os.path.join(calc_dir, "spectrum", f"{label}_ersp_itc"), ersp, itc, reference.electrodes, freqs,
+                      times, meta)
+    return results
+
+
+# 統計検定: Error試行とCorrect試行の差（calc/comp の Difference）のクラスタベース置換検定
+# Correct試行とError試行のエポックデータ（3_sort*.py のラベルの索引によるビュー）を使い、結果を calc/stats に保存する
+# cluster_alpha: クラスタを作る点の閾値（t 検定の有意水準）, alpha: クラスタの有意水準（クラスタの p 値と比較）
+# tail: 0（両側）, 1（Error > Correct）, -1（Error < Correct）, workers=1 の場合は逐次計算
+def run_stats(root_dir, n_permutations=N_PERMUTATIONS, cluster_alpha=CLUSTER_ALPHA, alpha=ALPHA, tail=0, seed=SEED,
+              workers=None):
+    calc_dir = os.path.join(root_dir, "calc")
+    label_sets = load_label_sets(root_dir)
+    if "correct" not in label_sets or "error" not in label_sets:
+        raise FileNotFoundError(f"{calc_dir} に Correct/Error 試行の分類結果が見つかりません（3_sort*.py を先に実行してください）。")
+    correct, error = label_sets["correct"], label_sets["error"]
+
+    print(f"▶ クラスタベースの置換検定を開始します（置換 {n_permutations} 回, "
+          f"Error {error.n_epochs} 試行, Correct {correct.n_epochs} 試行）。")
+    start = time.perf_counter()
+    result = cluster_test(error.data, correct.data, error.electrodes, n_permutations=n_permutations,
+                          cluster_alpha=cluster_alpha, tail=tail, seed=seed, workers=workers)
+    print(f"置換検定が完了しました（{time.perf_counter() - start:.1f}秒）。")
+
+    output_dir = os.path.join(calc_dir, "stats")
+    os.makedirs(output_dir, exist_ok=True)
+
+    # クラスタの一覧（クラスタ質量の絶対値の大きい順）
+    rows = []
+    point_p = np.full(result["t"].shape, np.nan)
+    for number, cluster in enumerate(result["clusters"], start=1):
+        mask = cluster["mask"]
+        times = error.times[mask.any(axis=0)]
+        rows.append({
+            "Cluster": number,
+            "Sign": "Error > Correct" if cluster["sign"] > 0 else "Error < Correct",
+            "Electrodes": " ".join(electrode for electrode, row in zip(error.electrodes, mask) if row.any()),
+            "Start [ms]": times.min(),
+            "End [ms]": times.max(),
+            "Points": int(mask.sum()),
+            "Mass": cluster["mass"],
+            "p": cluster["p"],
+        })
+        point_p[mask] = cluster["p"]
+    clusters = pd.DataFrame(rows, columns=["Cluster", "Sign", "Electrodes", "Start [ms]", "End [ms]", "Points",
+                                           "Mass", "p"])
+    clusters.to_csv(os.path.join(output_dir, "clusters.csv"), index=False, encoding='utf-8-sig')
+
+    # 各点の t 値と、その点を含むクラスタの p 値
+    t_table = pd.DataFrame({"Time [ms]": error.times})
+    for i, electrode in enumerate(error.electrodes):
+        t_table[f"{electrode} t"] = result["t"][i]
+        t_table[f"{electrode} Cluster p"] = point_p[i]
+    t_table.to_csv(os.path.join(output_dir, "t_values.csv"), index=False, encoding='utf-8-sig')
+
+    with open(os.path.join(output_dir, "cluster_test.json"), "w", encoding="utf-8") as f:
+        json.dump({"n_permutations": n_permutations, "cluster_alpha": cluster_alpha, "alpha": alpha, "tail": tail, "seed": seed,
+                   "threshold": float(result["threshold"]), "n_error": error.n_epochs,
+                   "n_correct": correct.n_epochs}, f, ensure_ascii=False, indent=1)
+
+    significant = clusters[clusters["p"] < alpha]
+    print(f"✅ クラスタ {len(clusters)} 個のうち、p < {alpha} のクラスタは {len(significant)} 個でした。"
+          f"結果を {output_dir} に保存しました。")
+    for _, row in significant.iterrows():
+        print(f"  {row['Sign']}: {row['Electrodes']}, {row['Start [ms]']:g}〜{row['End [ms]']:g}ms, p = {row['p']:.4f}")
+    return result
+
+
+# リアルタイムErrP解析: 計測中のデータからエポックを逐次切り出し、Correct/Error試行の加算平均を更新する
+# source: "replay"（記録済みのICA処理済みデータを再生）または "socket"（host:port から受信）
+# 受信の終了後に、加算平均を calc/realtime/ave, calc/realtime/comp に、各エポックの記録を
+# calc/realtime/epochs.csv に保存する
+def run_realtime(root_dir, raw_data_file=None, ica_data_file=None, clean=False, sfreq=1000, source="replay",
+                 host=HOST, port=PORT, block_size=BLOCK_SIZE, realtime=False, speed=1.0,
+                 baseline_window=BASELINE_WINDOW):
+    # ラベル情報があれば、ラベルの付いていないTTLはエポック番号からラベルを決める
+    labels = {}
+    if os.path.isfile(label_file_path(root_dir, clean)):
+        for label, epochs in load_label_groups(root_dir, clean).items():
+            labels.update(dict.fromkeys(epochs, label))
+
+    if source == "socket":
+        data_source = SocketSource(len(ELECTRODES), host, port, block_size)
+        channel_sfreq = sfreq
+    else:
+        check_ttl_count(load_ttl_events(raw_data_file)[0], label_file_path(root_dir, clean))
+        data_source, channel_sfreq = replay_source(raw_data_file, ica_data_file, clean, sfreq, block_size,
+                                                   realtime, speed)
+
+    # エポックごとに試行数と処理時間を表示
+    def report(record, engine):
+        counts = ", ".join(f"{group} {count}試行" for group, count in engine.counts().items())
+        print(f"エポック {record['epoch_id']}（{record['label'] or 'ラベルなし'}）: "
+              f"処理時間 {record['latency_ms']:.2f}ms, {counts}")
+
+    groups = ("correct",) if clean else ("correct", "error")
+    engine = RealtimeErrP(ELECTRODES, channel_sfreq, labels=labels, groups=groups,
+                          baseline_window=baseline_window, first_id=1 if sfreq == 1024 else 0, on_epoch=report)
+    print("▶ リアルタイム解析を開始します。")
+    engine.run(data_source)
+
+    if not engine.records:
+        print("エポックが1つも切り出されませんでした。")
+        return engine
+
+    # 加算平均と各エポックの記録を保存
+    output_dir = os.path.join(root_dir, "calc", "realtime")
+    write_averages(root_dir, {group: accumulator for group, accumulator in engine.accumulators.items()
+                              if accumulator.count}, output_dir)
+
+    records = pd.DataFrame({
+        "Epoch": [record["epoch_id"] for record in engine.records],
+        "TTL [ms]": [record["time_ms"] for record in engine.records],
+        "Label": [record["label"] for record in engine.records],
+        "Latency [ms]": engine.latencies(),
+    })
+    records.to_csv(os.path.join(output_dir, "epochs.csv"), index=False, encoding='utf-8-sig')
+
+    latencies = engine.latencies()
+    print(f"✅ {len(latencies)} エポックを処理しました（処理時間: 中央値 {np.median(latencies):.2f}ms, "
+          f"最大 {latencies.max():.2f}ms）。結果を {output_dir} に保存しました。")
+    return engine
+
+
+# 記録済みのICA処理済みデータを再生するデータ源を作成する関数
+# 戻り値: (データ源, データのサンプリング周波数)
+def replay_source(raw_data_file, ica_data_file, clean=False, sfreq=1000, block_size=BLOCK_SIZE, realtime=False,
+                  speed=1.0):
+    ttl_times_ms = load_ttl_times_ms(raw_data_file)
+    if sfreq == 1024:
+        # ICA処理済みデータ（1024Hz）または 0_before_10.py で1ms間隔に補間したCSV（1列目: Time [s]）
+        events = [(ttl, None) for ttl in np.round(ttl_times_ms, decimals=6) if np.isfinite(ttl)]
+        time_column = pd.read_csv(ica_data_file, nrows=0).columns[0]
+        source = FileReplaySource(ica_data_file, ELECTRODES, events, time_column=time_column, header=0,
+                                  time_scale=1000, block_size=block_size, realtime=realtime, speed=speed)
+        return source, 1000 / sample_interval_ms(ica_data_file)
+
+    events = [(ttl, None) for ttl in np.round(ttl_times_ms) if np.isfinite(ttl)]
+    columns = ICA_COLUMNS_CLEAN if clean else ICA_COLUMNS
+    source = FileReplaySource(ica_data_file, [columns[electrode] for electrode in ELECTRODES], events,
+                              block_size=block_size, realtime=realtime, speed=speed)
+    return source, 1000
+
+
+# 5_plot.py / 5_plot_clean.py: Correct試行, Error試行, 差分波形のプロット
+def run_result_plot(root_dir, clean=False, show_ttl=False):
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    # 比較用CSVファイルのディレクトリ設定
+    comp_dir = os.path.join(root_dir, "calc", "comp")
+
+    # プロットの出力先ディレクトリ設定
+    result_dir = os.path.join(root_dir, "result")
+    os.makedirs(result_dir, exist_ok=True)
+
+    # プロット作成関数（エラーありセッション）
+    def plot_data(data, electrode, zoom=False):
+        plt.figure(figsize=(16, 9))
+
+        # 線を太くするために linewidth=3 を追加
+        plt.plot(data["Time [ms]"], data["Correct Average [μV]"], label="Correct", color="blue", linewidth=3)
+        plt.plot(data["Time [ms]"], data["Error Average [μV]"], label="Error", color="red", linewidth=3)
+        plt.plot(data["Time [ms]"], data["Difference [μV]"], label="Difference", color="green", linewidth=3)
+
+        if show_ttl:
+            plt.axvline(0, color="brown", linestyle="--", label="TTL Signal", linewidth=2)
+
+        # 基準線も少し太くする
+        plt.axhline(0, color="black", linestyle="--", linewidth=1.5)
+        plt.axvline(0, color="black", linestyle="--", linewidth=1.5)
+        plt.title(f"{electrode}", fontsize=50)
+
+        if zoom:
+            plt.xlabel("Time [ms]", fontsize=40, labelpad=20)
+            plt.xlim(-400, 1000)
+            plt.xticks(ticks=[-400, -200, 0, 200, 400, 600, 800, 1000], fontsize=30)
+        else:
+            plt.xlabel("Time [s]", fontsize=40, labelpad=20)
+            plt.xlim(-1000, 2000)
+            plt.xticks(ticks=[-1000, -500, 0, 500, 1000, 1500, 2000],
+                       labels=["-1", "-0.5", "0", "0.5", "1", "1.5", "2"], fontsize=30)
+
+        plt.ylabel("Amplitude [μV]", fontsize=40, labelpad=20)
+        plt.yticks(fontsize=30)
+        plt.ylim(-7, 7)
+
+        plt.legend(fontsize=30, loc='upper right')
+        plt.tight_layout()
+
+        file_suffix = "zoomed" if zoom else "original"
+        file_path = os.path.join(result_dir, f"{electrode}_{file_suffix}.png")
+        plt.savefig(file_path, dpi=300)
+        plt.close()
+
+    # プロット作成関数（エラーなしセッション）
+    def plot_data_clean(data, electrode, zoom=False):
+        plt.figure(figsize=(10, 6))
+        plt.plot(data["Time [ms]"], data["Correct Average [μV]"], label="Correct", color="blue")
+        if show_ttl:
+            plt.axvline(0, color="brown", linestyle="--", label="TTL Signal")
+        plt.axhline(0, color="black", linestyle="--", linewidth=0.8)
+        plt.axvline(0, color="black", linestyle="--", linewidth=0.8)
+        plt.title(f"{electrode}", fontsize=20)
+        if zoom:
+            plt.xlabel("Time [ms]", fontsize=20)
+            plt.xlim(-400, 1000)
+            plt.xticks(ticks=[-400, -200, 0, 200, 400, 600, 800, 1000], fontsize=16)
+        else:
+            plt.xlabel("Time [s]", fontsize=20)
+            plt.xlim(-1000, 2000)
+            plt.xticks(ticks=[-1000, -500, 0, 500, 1000, 1500, 2000], labels=["-1", "-0.5", "0", "0.5", "1", "1.5", "2"], fontsize=16)
+        plt.ylabel("Amplitude [μV]", fontsize=20)
+        plt.yticks(fontsize=16)
+        plt.ylim(-7, 7)
+        plt.legend(fontsize=18)
+        file_suffix = "zoomed" if zoom else "original"
+        file_path = os.path.join(result_dir, f"{electrode}_{file_suffix}.png")
+        plt.savefig(file_path, dpi=300)
+        plt.close()
+
+    plot = plot_data_clean if clean else plot_data
+
+    # 各電極の比較用CSVファイルを読み込み、プロットを作成
+    for electrode in sorted(ELECTRODES):
+        file_path = os.path.join(comp_dir, electrode, f"{electrode}_comp.csv")
+
+        if os.path.exists(file_path):
+            data = pd.read_csv(file_path)
+            plot(data, electrode, zoom=False)
+            plot(data, electrode, zoom=True)
+            count(figures=2)
+        else:
+            print(f"{file_path} が見つかりませんでした。")
+
+    print("すべてのプロットを作成し、保存しました。")
+
+
+# 一連の処理（事前処理〜加算平均波形のプロット）をまとめて実行する関数
+# 各処理段階の経過時間・CPU時間・ピークRSS・読み書きしたバイト数・処理した件数を最後に一覧表示する
+# trace=True の場合は計測結果を calc/profile/trace_{日時}.json に、profile=True の場合は段階ごとの
+# cProfile の結果を calc/profile/{段階名}.prof に保存する
+# 戻り値: 各処理段階の実行時間 [s]
+def run_all(root_dir, raw_data_file, ica_data_file, clean=False, sfreq=1000, write_csv=False, epoch_plots=True,
+            show_ttl=False, stream=False, chunk_size=CHUNK_SIZE, plot_workers=None, dpi=EPOCH_PLOT_DPI, use_cache=True,
+            force=False, fused=False, write_intermediates=False, baseline_mode="electrode",
+            baseline_window=BASELINE_WINDOW, trace=False, profile=False):
+    start_time = datetime.now()
+    print(f"プログラム開始時刻: {start_time.strftime('%Y-%m-%d %H:%M:%S')}")
+
+    timings = {}
+    calc_dir = os.path.join(root_dir, "calc")
+    profiler = Profiler(os.path.join(calc_dir, PROFILE_DIR) if profile else None)
+
+    # 各処理段階を実行し、処理時間・資源使用量を記録する
+    # use_cache=True の場合、入力ファイルの内容とパラメータが前回と同じ段階は省略する（force=True で常に実行）
+    def timed(name, inputs, outputs, params, func, *args, **kwargs):
+        with profiler.stage(name) as record:
+            if use_cache:
+                result, record["cached"] = run_cached(root_dir, name, func, inputs, outputs, params, *args,
+                                                      force=force, **kwargs)
+            else:
+                result = func(*args, **kwargs)
+        timings[name] = record["wall [s]"]
+        return result
+
+    # 0_before_10.py の出力（バイナリ形式）の場合は、ヘッダとデータの両方を入力とする
+    store_path = continuous_path(ica_data_file)
+    ica_inputs = [store_path + ".json", store_path + ".dat"] if store_path is not None else [ica_data_file]
+    columns = ICA_COLUMNS_CLEAN if clean else ICA_COLUMNS
+    epoch_params = {"epoch": [EPOCH_START, EPOCH_END], "electrodes": ELECTRODES, "sfreq": sfreq,
+                    "ica_columns": None if sfreq == 1024 else columns,
+                    "ttl": {"column": EVENT_COLUMN,
+                            "rows": None if TTL_ROWS is None else [TTL_ROWS.start, TTL_ROWS.stop]},
+                    "write_csv": write_csv}
+    plot_params = {"show_ttl": show_ttl, "dpi": dpi}
+    baseline_params = {"mode": baseline_mode, "window": list(baseline_window)}
+
+    if fused:
+        # 融合モード: エポックの切り出しから加算平均までを1段階として実行（中間データはメモリ上で受け渡す）
+        fused_outputs = [os.path.join(calc_dir, name) for name in ("baseline", "ave", "comp")]
+        if write_intermediates:
+            fused_outputs += [os.path.join(calc_dir, name) for name in ("epoch_summary", "labels")]
+        fused_params = dict(epoch_params, baseline=baseline_params, clean=clean,
+                            write_intermediates=write_intermediates)
+        fused_result = timed("fused", [raw_data_file] + ica_inputs + [label_file_path(root_dir, clean)], fused_outputs,
+                             fused_params, run_fused, root_dir, raw_data_file, ica_data_file, clean=clean, sfreq=sfreq,
+                             write_intermediates=write_intermediates, write_csv=write_csv, stream=stream,
+                             chunk_size=chunk_size, baseline_mode=baseline_mode, baseline_window=baseline_window,
+                             keep_epochs=epoch_plots)
+
+        # エポック波形はメモリ上のデータから描画（融合段階を省略した場合のみ切り出し直す）
+        def plot_fused_epochs():
+            epoch_set = fused_result["epochs"] if fused_result else extract_epoch_set(
+                raw_data_file, ica_data_file, clean=clean, sfreq=sfreq, stream=stream, chunk_size=chunk_size)
+            run_epoch_plot(root_dir, show_ttl=show_ttl, workers=plot_workers, dpi=dpi, epoch_set=epoch_set)
+
+        if epoch_plots:
+            timed("epoch_plot", [raw_data_file] + ica_inputs, [os.path.join(calc_dir, "plots")],
+                  dict(plot_params, epoch=epoch_params), plot_fused_epochs)
+    else:
+        timed("epoch", [raw_data_file] + ica_inputs, [os.path.join(calc_dir, "epoch_summary")], epoch_params,
+              run_epoch, root_dir, raw_data_file, ica_data_file, clean=clean, sfreq=sfreq, write_csv=write_csv,
+              stream=stream, chunk_size=chunk_size)
+        if epoch_plots:
+            timed("epoch_plot", [os.path.join(calc_dir, EPOCH_STORE) + ext for ext in (".npy", ".json")],
+                  [os.path.join(calc_dir, "plots")], plot_params,
+                  run_epoch_plot, root_dir, show_ttl=show_ttl, workers=plot_workers, dpi=dpi)
+        timed("baseline", [os.path.join(calc_dir, "epoch_summary")], [os.path.join(calc_dir, "baseline")],
+              dict(baseline_params, write_csv=write_csv),
+              run_baseline, root_dir, write_csv=write_csv, mode=baseline_mode, window=baseline_window)
+        timed("sort", [os.path.join(calc_dir, "baseline"), label_file_path(root_dir, clean)],
+              [os.path.join(calc_dir, "labels"), os.path.join(calc_dir, "correct"), os.path.join(calc_dir, "error")],
+              {"clean": clean, "sfreq": sfreq, "write_csv": write_csv},
+              run_sort, root_dir, clean=clean, sfreq=sfreq, write_csv=write_csv)
+        timed("colave", [os.path.join(calc_dir, name) for name in ("labels", "baseline", "correct", "error")],
+              [os.path.join(calc_dir, "ave"), os.path.join(calc_dir, "comp")], {"electrodes": ELECTRODES},
+              run_colave, root_dir)
+    timed("result_plot", [os.path.join(calc_dir, "ave"), os.path.join(calc_dir, "comp")],
+          [os.path.join(root_dir, "result")], {"clean": clean, "show_ttl": show_ttl},
+          run_result_plot, root_dir, clean=clean, show_ttl=show_ttl)
+
+    profiler.report()
+    if trace:
+        profiler.save(os.path.join(calc_dir, PROFILE_DIR),
+                      info={"root": root_dir, "raw": raw_data_file, "ica": ica_data_file, "sfreq": sfreq,
+                            "clean": clean, "fused": fused, "stream": stream, "use_cache": use_cache})
+    end_time = datetime.now()
+    print(f"プログラム終了時刻: {end_time.strftime('%Y-%m-%d %H:%M:%S')}")
+    print(f"実行時間: {end_time - start_time}")
+    return timings
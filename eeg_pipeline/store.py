@@ -0,0 +1,243 @@
+#######################################################################################################
+#  2026/10/18 作成
+#
+# 【概要】エポックデータのバイナリ保存形式
+# (電極, エポック, サンプル) のエポック配列を ".npy" に、電極名・時間軸・サンプリング周波数・
+# エポック番号を小さな ".json" ヘッダに保存する。読み込みは memmap で行うため、
+# 後段のスクリプトはCSVを再解析せずにデータへアクセスできる。
+#
+# 【保存形式】
+# - "{パス}.npy" : エポック配列（電極, エポック, サンプル）
+# - "{パス}.json": ヘッダ（electrodes, times, sfreq, epoch_ids, meta）
+#
+# Correct/Error の分類（3_sort*.py）は、エポックデータをコピーせずにエポック軸に沿ったラベルの索引として
+# - "{パス}.npy" : エポックごとのラベル番号（int8, LABEL_CODES, 分類なしは -1）
+# - "{パス}.json": ヘッダ（codes, labels, epoch_ids）
+# として保存し、試行の種類ごとのデータはベースライン補正後のエポックデータのビュー（EpochView）で参照する。
+#
+# 連続データ（0_before_10.py の補間結果など）は、チャンク単位で追記できるように
+# - "{パス}.dat" : float64 の生データ（サンプル, チャンネル の行優先）
+# - "{パス}.json": ヘッダ（channels, sfreq, t0, n_samples）
+# として保存する。
+#
+# 【注意】
+# - CSV出力は export_csv による任意の副出力とする
+#######################################################################################################
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+# 各段階のエポックデータの保存名
+EPOCH_STORE = os.path.join("epoch_summary", "epochs")
+BASELINE_STORE = os.path.join("baseline", "epochs_base")
+CORRECT_STORE = os.path.join("correct", "epochs_correct")
+ERROR_STORE = os.path.join("error", "epochs_error")
+LABEL_STORE = os.path.join("labels", "epoch_labels")
+
+# 試行の種類とラベル番号の対応（分類なしは -1）
+LABEL_CODES = {"correct": 0, "error": 1}
+
+
+# エポック配列の一部のエポックを参照するビュー（データを読み込むのは配列として使われたときのみ）
+# base: (電極, エポック, サンプル) の配列（memmap も可）, indices: 参照するエポックの位置
+class EpochView:
+    ndim = 3
+
+    def __init__(self, base, indices):
+        self.base = base
+        self.indices = np.asarray(indices, dtype=np.intp)
+
+    @property
+    def shape(self):
+        return (self.base.shape[0], len(self.indices), self.base.shape[2])
+
+    @property
+    def dtype(self):
+        return self.base.dtype
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __array__(self, dtype=None, copy=None):
+        data = np.asarray(self.base[:, self.indices, :])
+        return data if dtype is None else data.astype(dtype, copy=False)
+
+    # 電極番号のみの参照は、その電極の (エポック, サンプル) のみを読み込む
+    def __getitem__(self, key):
+        if isinstance(key, (int, np.integer)):
+            return np.asarray(self.base[key][self.indices])
+        return np.asarray(self)[key]
+
+
+# エポックデータと付随情報をまとめて扱うクラス
+class EpochSet:
+    def __init__(self, data, electrodes, times, sfreq, epoch_ids=None, meta=None):
+        self.data = data
+        self.electrodes = list(electrodes)
+        self.times = np.asarray(times)
+        self.sfreq = float(sfreq)
+        if epoch_ids is None:
+            epoch_ids = np.arange(1, data.shape[1] + 1)
+        self.epoch_ids = np.asarray(epoch_ids, dtype=int)
+        self.meta = dict(meta or {})
+
+        if data.shape != (len(self.electrodes), len(self.epoch_ids), len(self.times)):
+            raise ValueError(f"エポック配列の形状 {data.shape} がヘッダ情報と一致しません。")
+
+    @property
+    def n_epochs(self):
+        return len(self.epoch_ids)
+
+    # 電極名から (エポック, サンプル) の配列を取得
+    def electrode(self, name):
+        return self.data[self.electrodes.index(name)]
+
+    # 指定したエポック番号のみを取り出した EpochSet を作成（存在しない番号は無視）
+    def select(self, epoch_ids):
+        mask = np.isin(self.epoch_ids, np.asarray(epoch_ids, dtype=int))
+        return EpochSet(self.data[:, mask, :], self.electrodes, self.times, self.sfreq,
+                        self.epoch_ids[mask], self.meta)
+
+    # 指定したエポック番号のみを参照する EpochSet を作成（データはコピーせず、EpochView で参照する）
+    def view(self, epoch_ids):
+        indices = np.flatnonzero(np.isin(self.epoch_ids, np.asarray(epoch_ids, dtype=int)))
+        return EpochSet(EpochView(self.data, indices), self.electrodes, self.times, self.sfreq,
+                        self.epoch_ids[indices], self.meta)
+
+    # 1電極分を従来のCSVと同じ横長の表（行: 時間, 列: エポック）に変換
+    # 列名の書式を省略した場合はヘッダの meta["column_format"] を使う
+    def to_frame(self, name, time_column="Time [ms]", column_format=None):
+        if column_format is None:
+            column_format = self.meta.get("column_format", "Epoch {}")
+        frame = pd.DataFrame(np.asarray(self.electrode(name)).T,
+                             columns=[column_format.format(i) for i in self.epoch_ids])
+        frame.insert(0, time_column, self.times)
+        return frame
+
+
+# エポックデータの保存先がすでに存在するか確認する関数
+def has_epochs(path):
+    return os.path.isfile(path + ".npy") and os.path.isfile(path + ".json")
+
+
+# エポックデータをバイナリ形式で保存する関数
+def save_epochs(path, epoch_set):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    header = {
+        "electrodes": epoch_set.electrodes,
+        "times": epoch_set.times.tolist(),
+        "sfreq": epoch_set.sfreq,
+        "epoch_ids": epoch_set.epoch_ids.tolist(),
+        "meta": epoch_set.meta,
+    }
+    np.save(path + ".npy", np.ascontiguousarray(epoch_set.data))
+    with open(path + ".json", "w", encoding="utf-8") as f:
+        json.dump(header, f, ensure_ascii=False, indent=1)
+    print(f"エポックデータを {path}.npy に保存しました。")
+
+
+# エポックデータを読み込む関数（mmap=True の場合はコピーせずにファイルを参照する）
+def load_epochs(path, mmap=True):
+    with open(path + ".json", encoding="utf-8") as f:
+        header = json.load(f)
+    data = np.load(path + ".npy", mmap_mode="r" if mmap else None)
+    return EpochSet(data, header["electrodes"], header["times"], header["sfreq"],
+                    header["epoch_ids"], header.get("meta"))
+
+
+# Correct/Error の分類結果をエポック軸に沿ったラベルの索引として保存する関数
+# epoch_ids: エポックデータのエポック番号（この順にラベル番号を並べる）, groups: {試行の種類: エポック番号のリスト}
+def save_labels(path, epoch_ids, groups):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    epoch_ids = np.asarray(epoch_ids, dtype=int)
+    codes = np.full(len(epoch_ids), -1, dtype=np.int8)
+    for label, ids in groups.items():
+        codes[np.isin(epoch_ids, np.asarray(ids, dtype=int))] = LABEL_CODES[label]
+    header = {"codes": LABEL_CODES, "labels": list(groups), "epoch_ids": epoch_ids.tolist()}
+    np.save(path + ".npy", codes)
+    with open(path + ".json", "w", encoding="utf-8") as f:
+        json.dump(header, f, ensure_ascii=False, indent=1)
+    counts = ", ".join(f"{label}: {int(np.count_nonzero(codes == LABEL_CODES[label]))}" for label in groups)
+    print(f"ラベルの索引を {path}.npy に保存しました（{counts}）。")
+
+
+def has_labels(path):
+    return os.path.isfile(path + ".npy") and os.path.isfile(path + ".json")
+
+
+# ラベルの索引を読み込み、EpochSet の試行の種類ごとのビューを作成する関数
+# 戻り値: {試行の種類: EpochSet}（ラベルの索引とエポックデータのエポック番号が異なる場合は ValueError）
+def label_views(path, epoch_set):
+    with open(path + ".json", encoding="utf-8") as f:
+        header = json.load(f)
+    if not np.array_equal(header["epoch_ids"], epoch_set.epoch_ids):
+        raise ValueError(f"{path}.npy のエポック番号がエポックデータと一致しません（3_sort*.py を再実行してください）。")
+    codes = np.load(path + ".npy")
+    return {label: epoch_set.view(epoch_set.epoch_ids[codes == header["codes"][label]]) for label in header["labels"]}
+
+
+# 各電極のエポックデータを従来形式のCSVとして出力する関数（任意の副出力）
+def export_csv(epoch_set, output_dir, file_suffix, time_column="Time [ms]", column_format=None,
+               time_as_index=False):
+    os.makedirs(output_dir, exist_ok=True)
+    for electrode in epoch_set.electrodes:
+        frame = epoch_set.to_frame(electrode, time_column, column_format)
+        if time_as_index:
+            frame = frame.set_index(time_column)
+        csv_path = os.path.join(output_dir, f"{electrode}_{file_suffix}.csv")
+        frame.to_csv(csv_path, index=time_as_index, encoding='utf-8-sig')
+        print(f"{electrode} のデータを {csv_path} に保存しました。")
+
+
+# 連続データ（チャンネル × サンプル）と付随情報をまとめて扱うクラス
+class ContinuousSet:
+    def __init__(self, data, channels, sfreq, t0=0.0):
+        self.data = data
+        self.channels = list(channels)
+        self.sfreq = float(sfreq)
+        self.t0 = float(t0)
+
+    # 時間軸 [ms]
+    @property
+    def times_ms(self):
+        return np.round(self.t0 * 1000 + np.arange(self.data.shape[1]) * 1000 / self.sfreq, decimals=6)
+
+
+# 連続データをチャンク単位で追記保存するクラス
+class ContinuousWriter:
+    def __init__(self, path, channels, sfreq, t0=0.0):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.header = {"channels": list(channels), "sfreq": float(sfreq), "t0": float(t0), "n_samples": 0}
+        self.file = open(path + ".dat", "wb")
+
+    # (チャンネル, サンプル) のデータを追記
+    def write(self, data):
+        np.ascontiguousarray(np.asarray(data, dtype=np.float64).T).tofile(self.file)
+        self.header["n_samples"] += data.shape[1]
+
+    def close(self):
+        self.file.close()
+        with open(self.path + ".json", "w", encoding="utf-8") as f:
+            json.dump(self.header, f, ensure_ascii=False, indent=1)
+        print(f"連続データを {self.path}.dat に保存しました。")
+
+
+# 連続データの保存先のパス（拡張子なし）を返す関数。連続データでなければ None
+def continuous_path(file_path):
+    base, ext = os.path.splitext(file_path)
+    if ext not in (".dat", ".json", ""):
+        return None
+    return base if os.path.isfile(base + ".dat") and os.path.isfile(base + ".json") else None
+
+
+# 連続データを読み込む関数（memmap で参照し、(チャンネル, サンプル) の転置ビューを返す）
+def load_continuous(path):
+    with open(path + ".json", encoding="utf-8") as f:
+        header = json.load(f)
+    shape = (header["n_samples"], len(header["channels"]))
+    data = np.memmap(path + ".dat", dtype=np.float64, mode="r", shape=shape) if shape[0] else np.empty(shape)
+    return ContinuousSet(data.T, header["channels"], header["sfreq"], header["t0"])
@@ -0,0 +1,194 @@
+#######################################################################################################
+#  2026/10/18 作成
+#
+# 【概要】チャンク読み込みによるストリーミング型エポック切り出し
+# ICA処理済みデータを一定行数ずつ読み込み、エポック範囲（-1000ms〜+2000ms）をカバーする
+# リングバッファだけを保持する。各TTLのエポック範囲のデータが揃った時点でエポックを出力するため、
+# 使用メモリは計測時間に依存しない。
+#
+# 【処理内容】
+# 1. iter_csv_chunks: CSVから必要な列だけを一定行数ずつ (チャンネル, サンプル) の配列として読み込む
+# 2. EventLocator   : チャンクごとの時間軸から、各TTLに最も近いサンプル番号を逐次決定する
+# 3. RingBuffer     : 直近のサンプルのみを保持する固定長バッファ
+# 4. StreamingEpocher: データが揃ったエポックから順に出力する
+# 5. stream_epochs_resampled: 1024Hzなどのデータから、エポック範囲のみを1ms間隔に補間して切り出す
+#
+# 【注意】
+# - TTL時刻は昇順であること
+#######################################################################################################
+
+from math import ceil
+
+import numpy as np
+
+from eeg_pipeline.epoching import EPOCH_START, EPOCH_END, linear_interp
+from eeg_pipeline.profiling import count
+
+# 1回に読み込む行数の初期設定
+CHUNK_SIZE = 100_000
+
+
+# CSVから指定列のみを一定行数ずつ読み込む関数
+# columns: 読み込む列（列番号または列名）。戻り値の行順は columns の順に揃える
+def iter_csv_chunks(file_path, columns, chunk_size=CHUNK_SIZE, header=None):
+    import pandas as pd
+
+    reader = pd.read_csv(file_path, header=header, usecols=columns, chunksize=chunk_size)
+    for chunk in reader:
+        count(samples=len(chunk))
+        yield chunk[columns].to_numpy(dtype=float).T
+
+
+# 各イベント時刻に最も近いサンプル番号をチャンク単位で逐次決定するクラス
+# チャンク境界をまたぐ場合に備えて、直前のチャンクの最後のサンプルを保持しておく
+class EventLocator:
+    def __init__(self, event_times, tolerance=None):
+        self.event_times = np.asarray(event_times, dtype=float)
+        self.tolerance = tolerance
+        self.next_event = 0
+        self.last_time = None
+        self.last_index = -1
+
+    # 新しいチャンクの時間軸を受け取り、位置が確定したイベントの (イベント番号, サンプル番号) を返す
+    def locate(self, chunk_times):
+        chunk_times = np.asarray(chunk_times, dtype=float)
+        located = []
+        if not len(chunk_times):
+            return located
+
+        # 直前のチャンクの最後のサンプルを先頭に加えた時間軸で探索
+        if self.last_time is None:
+            times, first_index = chunk_times, self.last_index + 1
+        else:
+            times, first_index = np.concatenate([[self.last_time], chunk_times]), self.last_index
+
+        # チャンクの最後の時刻以前のイベントは位置が確定する
+        end = np.searchsorted(self.event_times, chunk_times[-1], side="right")
+        for event in range(self.next_event, end):
+            event_time = self.event_times[event]
+            if not np.isfinite(event_time):
+                continue
+            right = min(max(np.searchsorted(times, event_time), 1), len(times) - 1) if len(times) > 1 else 0
+            left = max(right - 1, 0)
+            nearest = left if event_time - times[left] <= times[right] - event_time else right
+            if self.tolerance is None or abs(times[nearest] - event_time) < self.tolerance:
+                located.append((event, first_index + nearest))
+        self.next_event = max(self.next_event, end)
+
+        self.last_time = chunk_times[-1]
+        self.last_index += len(chunk_times)
+        return located
+
+
+# 直近のサンプルのみを保持する固定長のリングバッファ
+class RingBuffer:
+    def __init__(self, n_channels, capacity):
+        self.buffer = np.zeros((n_channels, capacity))
+        self.capacity = capacity
+        self.total = 0  # これまでに追加したサンプル数
+
+    # (チャンネル, サンプル) のデータを追加（容量を超える分は古いものから上書き）
+    def append(self, data):
+        data = np.asarray(data, dtype=float)
+        if data.shape[1] > self.capacity:
+            self.total += data.shape[1] - self.capacity
+            data = data[:, -self.capacity:]
+        positions = (self.total + np.arange(data.shape[1])) % self.capacity
+        self.buffer[:, positions] = data
+        self.total += data.shape[1]
+
+    # 絶対サンプル番号 [start, start + length) のデータを取り出す
+    def window(self, start, length):
+        if start < self.total - self.capacity or start + length > self.total:
+            raise IndexError(f"サンプル {start}〜{start + length} はバッファ内にありません。")
+        return self.buffer[:, (start + np.arange(length)) % self.capacity]
+
+
+# TTLごとのエポックを、データが揃った時点で順次出力するクラス
+class StreamingEpocher:
+    def __init__(self, n_channels, epoch_start=EPOCH_START, epoch_end=EPOCH_END):
+        self.epoch_start = epoch_start
+        self.num_samples = epoch_end - epoch_start
+        self.ring = RingBuffer(n_channels, 2 * self.num_samples)
+        self.pending = []  # (イベント番号, 開始サンプル番号)
+
+    # 位置が確定したイベントを登録（開始位置がデータ先頭より前のイベントは除外）
+    def add_events(self, located):
+        for event, index in located:
+            start = index + self.epoch_start
+            if start >= 0:
+                self.pending.append((event, start))
+            else:
+                print(f"イベント {event} はエポック範囲がデータ範囲外のため除外しました。")
+
+    # データを追加し、エポック範囲が揃ったイベントの (イベント番号, エポック) を順に返す
+    def push(self, data):
+        data = np.asarray(data, dtype=float)
+        # バッファ容量を超えないように、エポック長ごとに分割して追加
+        for offset in range(0, data.shape[1], self.num_samples):
+            self.ring.append(data[:, offset:offset + self.num_samples])
+            ready = [item for item in self.pending if item[1] + self.num_samples <= self.ring.total]
+            for event, start in ready:
+                self.pending.remove((event, start))
+                yield event, self.ring.window(start, self.num_samples)
+
+
+# CSVをストリーミングで読み込み、全TTLのエポックを切り出す関数
+# time_column が None の場合は、1行目 = 1[ms], 2行目 = 2[ms], ... の時間軸とする
+# 戻り値: (電極, エポック, サンプル) の配列と、各TTLが採用されたかを示すマスク
+def stream_epochs(file_path, ttl_times_ms, columns, time_column=None, header=None, time_scale=1.0,
+                  tolerance=None, epoch_start=EPOCH_START, epoch_end=EPOCH_END, chunk_size=CHUNK_SIZE):
+    locator = EventLocator(ttl_times_ms, tolerance)
+    epocher = StreamingEpocher(len(columns), epoch_start, epoch_end)
+    read_columns = list(columns) if time_column is None else [time_column] + list(columns)
+
+    epochs = {}
+    for chunk in iter_csv_chunks(file_path, read_columns, chunk_size, header):
+        if time_column is None:
+            chunk_times = epocher.ring.total + np.arange(1, chunk.shape[1] + 1)
+            data = chunk
+        else:
+            chunk_times = np.round(chunk[0] * time_scale, decimals=6)
+            data = chunk[1:]
+        epocher.add_events(locator.locate(chunk_times))
+        for event, epoch in epocher.push(data):
+            epochs[event] = epoch
+
+    return stack_epochs(epochs, len(ttl_times_ms), len(columns), epoch_end - epoch_start)
+
+
+# 任意のサンプリング周波数のCSVをストリーミングで読み込み、エポック範囲のみを step 間隔の時間軸に補間して
+# 切り出す関数（extract_epochs_resampled のストリーミング版）
+# リングバッファには時間列もデータと一緒に保持し、エポックが揃うごとに補間する
+def stream_epochs_resampled(file_path, ttl_times_ms, columns, time_column, sfreq, header=0, time_scale=1000.0,
+                            step=1.0, epoch_start=EPOCH_START, epoch_end=EPOCH_END, chunk_size=CHUNK_SIZE):
+    # 補間に必要な元データのサンプル数（エポック範囲の前後に2サンプルの余白を付ける）
+    samples_per_step = step * sfreq / 1000
+    before = int(ceil(-epoch_start * samples_per_step)) + 2
+    after = int(ceil(epoch_end * samples_per_step)) + 2
+    epocher = StreamingEpocher(len(columns) + 1, -before, after)
+    offsets = np.arange(epoch_start, epoch_end) * step
+
+    locator = None
+    epochs = {}
+    for chunk in iter_csv_chunks(file_path, [time_column] + list(columns), chunk_size, header):
+        chunk[0] *= time_scale
+        if locator is None:
+            # 補間先の格子は先頭の時刻を基準とし、各TTLを最も近い格子点に合わせる
+            t0 = chunk[0, 0]
+            grid_times = t0 + np.rint((np.asarray(ttl_times_ms, dtype=float) - t0) / step) * step
+            locator = EventLocator(grid_times)
+        epocher.add_events(locator.locate(chunk[0]))
+        for event, window in epocher.push(chunk):
+            epochs[event] = linear_interp(window[0], window[1:], grid_times[event] + offsets)
+
+    return stack_epochs(epochs, len(ttl_times_ms), len(columns), epoch_end - epoch_start)
+
+
+# {イベント番号: エポック} を (電極, エポック, サンプル) の配列と採用マスクにまとめる関数
+def stack_epochs(epochs, n_events, n_channels, num_samples):
+    kept = np.zeros(n_events, dtype=bool)
+    kept[list(epochs)] = True
+    if not epochs:
+        return np.empty((n_channels, 0, num_samples)), kept
+    return np.stack([epochs[event] for event in sorted(epochs)], axis=1), kept